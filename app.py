@@ -1,165 +1,523 @@
-from flask import Flask, render_template, request, jsonify, send_file
-import tempfile, os, io, uuid, shutil
-import xml.etree.ElementTree as ET
+from flask import Flask, Request, Response, g, render_template, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
+import tempfile, os, uuid, shutil, time, itertools
+from concurrent.futures import ThreadPoolExecutor
 
 # Importa a lógica do arquivo app.py que está na mesma pasta
-from validador_fiscal import ValidadorFiscal 
+from validador_fiscal import ConteudoXML, ValidadorFiscal
+from paralelo import processar_lote, workers_configurados
+import jobs
+from armazenamento import criar_store
+from base_eventos import aplicar_cancelamentos, chaves_das_notas, criar_base_eventos, reconciliar
+from cache_extracao import criar_cache
+from exportacao import FORMATOS, TABELAS, escrever_excel, escrever_tabela
+from integridade import sem_ocorrencias, verificar_lote
+import paginacao
+import resumo
+from relatorio_pdf import PrazoExcedido, gerar_pdf
+from compactados import ArquivoRejeitado, abrir_compactado, eh_compactado
+from metricas import SEM_METRICAS, Metricas, RegistroMetricas
+from modelo import para_json
+
+
+class RequisicaoUpload(Request):
+    # uploads de pastas inteiras passam facilmente do limite padrão de 1000 partes
+    max_form_parts = int(os.environ.get('VALIDADOR_MAX_FORM_PARTS', '100000'))
+
+
+class ProvedorJSON(DefaultJSONProvider):
+    # notas e produtos (modelo.Nota/Item) saem no formato de dicionário de sempre
+    @staticmethod
+    def default(o):
+        try:
+            return para_json(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
+app.request_class = RequisicaoUpload
+app.json = ProvedorJSON(app)
+# Processos usados na extração (1 = no próprio processo da requisição)
+app.config['VALIDADOR_WORKERS'] = workers_configurados()
+
+# Resultados processados: id -> notas, serializados, com TTL e limite de
+# tamanho; por padrão em SQLite no spool, compartilhado entre os workers
+STORE = criar_store()
+
+# Eventos de todos os uploads, por chave, e as chaves de cada resultado
+# guardado: cancelamentos que chegam depois atualizam os resultados
+EVENTOS = criar_base_eventos(ttl=STORE.ttl)
+
+# Cache de extração por conteúdo (SHA-256 do XML): arquivos reenviados
+# não são parseados de novo; desativável com VALIDADOR_CACHE=0
+CACHE = criar_cache()
+
+# Resumo (/resumo/<id>): DataFrames de notas e itens por resultado, em LRU,
+# conferidos com a versão do STORE a cada acesso
+FRAMES = resumo.CacheFrames(max_itens=int(os.environ.get('VALIDADOR_RESUMO_CACHE', '8')), versao=STORE.versao)
+
+# Consulta paginada (/notas/<id>): notas já desserializadas por resultado, em LRU,
+# conferidas com a versão do STORE a cada acesso
+NOTAS = paginacao.CacheNotas(max_itens=int(os.environ.get('VALIDADOR_NOTAS_CACHE', '4')), versao=STORE.versao)
 
-# In-memory store for processed results: id -> notas list
-STORE = {}
+# Jobs assíncronos: estado em memória ou em SQLite (VALIDADOR_JOBS_DB); os
+# terminados expiram junto com os resultados (VALIDADOR_STORE_TTL)
+JOBS = jobs.criar_registro_jobs(os.environ.get('VALIDADOR_JOBS_DB'), ttl=STORE.ttl)
+EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get('VALIDADOR_JOB_THREADS', '2')),
+                              thread_name_prefix='validador-job')
+
+# Métricas do processo (tempo por etapa, contadores, duração das
+# requisições), expostas em /metrics no formato do Prometheus
+METRICAS = RegistroMetricas()
+METRICAS.medidor('store_resultados', 'Resultados guardados.', lambda: len(STORE))
+METRICAS.medidor('store_bytes', 'Bytes dos resultados guardados (serializados).', lambda: STORE.bytes_usados)
+METRICAS.medidor('resumo_frames', 'Resultados com DataFrames no cache do /resumo.', lambda: len(FRAMES))
+METRICAS.medidor('notas_cache', 'Resultados com notas no cache do /notas.', lambda: len(NOTAS))
+METRICAS.medidor('eventos_base', 'Eventos na base persistente.', lambda: len(EVENTOS))
+METRICAS.medidor('workers', 'Processos de extração configurados.', lambda: app.config['VALIDADOR_WORKERS'])
+if CACHE is not None:
+    METRICAS.medidor('cache_bytes', 'Bytes ocupados pelo cache de extração.', lambda: CACHE.estatisticas()['bytes'])
+    for _campo, _ajuda in (('acertos', 'Acertos do cache de extração.'), ('falhas', 'Falhas do cache de extração.'),
+                           ('gravacoes', 'Entradas gravadas no cache.'), ('descartes', 'Entradas descartadas do cache.')):
+        METRICAS.medidor(f'cache_{_campo}_total', _ajuda, lambda c=_campo: CACHE.estatisticas()[c], tipo='counter')
+
+
+def _pedido_perfil():
+    return request.values.get('perfil', '').lower() in ('1', 'true', 'sim')
+
+
+@app.before_request
+def _iniciar_cronometro():
+    g.inicio = time.perf_counter()
+
+
+@app.after_request
+def _registrar_requisicao(resposta):
+    inicio = g.get('inicio')
+    if inicio is not None:
+        rota = request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+        METRICAS.observar_requisicao(rota, request.method, resposta.status_code, time.perf_counter() - inicio)
+    return resposta
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(METRICAS.texto(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def _aceitar_nota(notas, dados, origem):
+    # Validar que temos dados mínimos
+    if dados.get('Número') and dados.get('Número') != '0.00':
+        notas.append(dados)
+        app.logger.info(f"Nota processada: {dados.get('Número')}")
+    else:
+        app.logger.warning(f'Nota sem número em: {origem}')
+
+
+def processar_arquivos(paths, tipo, streaming=False, ao_progresso=None, total=None, metricas=None):
+    """Extrai as notas de uma lista de arquivos XML.
+
+    Cada arquivo é lido uma única vez (notas e eventos); o índice de
+    eventos de todo o lote é montado antes de decidir o status. Com
+    VALIDADOR_WORKERS > 1 os arquivos são distribuídos em blocos por um
+    pool de processos. No modo streaming os arquivos são lidos de forma
+    incremental, com memória constante e suporte a lotes com várias
+    notas por arquivo. `paths` pode ser qualquer iterável de caminhos e
+    `ConteudoXML` (membros de ZIP/tar), consumido sob demanda.
+    """
+    metricas = metricas or SEM_METRICAS
+    resultados, indice = processar_lote(paths, tipo, workers=app.config['VALIDADOR_WORKERS'],
+                                        streaming=streaming, ao_progresso=ao_progresso, cache=CACHE,
+                                        total=total, metricas=metricas)
+    notas = []
+    for r in resultados:
+        if r.erro:
+            fase, detalhe = r.erro
+            if fase == 'parse':
+                app.logger.error(f'Erro parseando XML: {r.origem}\n{detalhe}')
+            else:
+                app.logger.error(f'Erro extraindo dados de: {r.origem}\n{detalhe}')
+        for dados in r.notas:
+            _aceitar_nota(notas, dados, r.origem)
+    # eventos deste lote valem para os resultados já guardados, e os
+    # cancelamentos recebidos antes valem para as notas deste lote
+    with metricas.etapa('eventos'):
+        registros = [reg for regs in indice.values() for reg in regs]
+        rec = reconciliar(EVENTOS, STORE, registros, ao_atualizar=_descartar_derivados)
+        aplicar_cancelamentos(EVENTOS, notas)
+    if rec['resultados_atualizados']:
+        app.logger.info(f"Eventos do lote atualizaram {rec['notas_atualizadas']} notas em "
+                        f"{len(rec['resultados_atualizados'])} resultados")
+    return notas
+
+
+def _descartar_derivados(key):
+    # as notas do resultado mudaram: caches deste processo montados a partir
+    # delas caem já (nos outros workers, a versão nova no STORE os invalida)
+    FRAMES.descartar(key)
+    NOTAS.descartar(key)
+
+
+def guardar_resultado(key, notas):
+    """Guarda o resultado e vincula as chaves das notas para a reconciliação."""
+    STORE[key] = notas
+    EVENTOS.vincular(key, chaves_das_notas(notas))
+
+
+def _limpar_tmpdir(tmpdir):
+    # cleanup files
+    try:
+        shutil.rmtree(tmpdir)
+    except Exception:
+        app.logger.exception('Erro limpando tmpdir')
+
+
+def _abrir_pacotes(origens):
+    # (nome, caminho|stream) -> PacoteXML; fecha os já abertos se algum falhar
+    pacotes = []
+    try:
+        for nome, fonte in origens:
+            pacotes.append(abrir_compactado(fonte, nome))
+    except Exception:
+        for p in pacotes:
+            p.close()
+        raise
+    return pacotes
+
+
+def _executar_job(key, tmpdir, paths, compactados, tipo, streaming):
+    """Processa um job em segundo plano, publicando o progresso em JOBS."""
+    JOBS.atualizar(key, estado=jobs.PROCESSANDO, iniciado_em=time.time())
+
+    ultima = [0.0]
+    pacotes = []
+    metricas = Metricas()
+
+    try:
+        pacotes = _abrir_pacotes(compactados)
+        total = len(paths) + sum(len(p) for p in pacotes)
+        JOBS.atualizar(key, arquivos_total=total)
+
+        def progresso(feitos, n_notas, n_erros):
+            # no máximo ~4 atualizações por segundo (o registro pode ser SQLite)
+            agora = time.monotonic()
+            if agora - ultima[0] >= 0.25 or feitos == total:
+                ultima[0] = agora
+                JOBS.atualizar(key, arquivos_processados=feitos, notas=n_notas, erros=n_erros)
+
+        notas = processar_arquivos(itertools.chain(paths, *pacotes), tipo, streaming=streaming,
+                                   ao_progresso=progresso, total=total, metricas=metricas)
+        with metricas.etapa('armazenamento'):
+            guardar_resultado(key, notas)
+        with metricas.etapa('integridade'):
+            integ = verificar_lote(notas)
+        JOBS.atualizar(key, estado=jobs.CONCLUIDO, notas=len(notas), integridade=integ['resumo'],
+                       concluido_em=time.time())
+        app.logger.info(f'Job {key} concluído: {len(notas)} notas')
+    except Exception as e:
+        app.logger.exception(f'Erro no job {key}')
+        JOBS.atualizar(key, estado=jobs.ERRO, mensagem=str(e), concluido_em=time.time())
+    finally:
+        for p in pacotes:
+            p.close()
+        _limpar_tmpdir(tmpdir)
+        METRICAS.absorver(metricas)
+
+
+def _conteudos_upload(files, metricas=SEM_METRICAS):
+    # Lê cada upload só quando o lote chega nele: apenas um XML por vez
+    # sai do stream para a memória, sem passar por disco
+    for f in files:
+        with metricas.etapa('upload'):
+            dados = f.stream.read()
+        yield ConteudoXML(f.filename, dados)
+
+
 @app.route('/validate', methods=['POST'])
 def validate():
+    """Valida os XMLs (e ZIP/tar) enviados em `files`.
+
+    Com `resposta=resumo` a resposta traz só o id, as quantidades e os
+    totais do lote (`paginacao.totais`), sem as notas, que são então
+    consultadas em páginas em `/notas/<id>`. Nos dois modos a resposta
+    traz `integridade` (`integridade.verificar_lote`: chaves inválidas ou
+    repetidas e lacunas de numeração do lote, com `ok` verdadeiro se não
+    há nenhuma ocorrência). Com `perfil=1` a resposta
+    traz também a decomposição do tempo da requisição por etapa (upload,
+    leitura, parse, extração, eventos, armazenamento, serialização) e os
+    contadores.
+    """
+    metricas = Metricas()
     try:
-        tipo = request.form.get('tipo', 'NF-e')
-        files = request.files.getlist('files')
+        # o corpo multipart é lido e decodificado no primeiro acesso ao form
+        with metricas.etapa('upload'):
+            tipo = request.form.get('tipo', 'NF-e')
+            files = request.files.getlist('files')
         if not files:
             app.logger.warning('Nenhum arquivo enviado na requisição')
             return jsonify({'error':'Nenhum arquivo enviado'}), 400
 
-        tmpdir = tempfile.mkdtemp(prefix='val_')
-        paths = []
+        assincrono = request.form.get('assincrono', request.args.get('assincrono', '')).lower() in ('1', 'true', 'sim')
+        streaming = request.form.get('modo') == 'streaming'
+        xmls = []
+        # ZIP/tar: os membros vão direto do arquivo compactado para o parser
+        compactados = []
         for f in files:
-            # some browsers send directories with full path, we just save
-            filename = os.path.basename(f.filename) or str(uuid.uuid4()) + '.xml'
-            dest = os.path.join(tmpdir, filename)
-            f.save(dest)
-            paths.append(dest)
-
-        app.logger.info(f'Processando {len(paths)} arquivos')
-        validator = ValidadorFiscal()
-        events_index = validator.build_events_index(paths)
-
-        notas = []
-        for p in paths:
-            try:
-                tree = ET.parse(p)
-                root = tree.getroot()
-                is_nota = any(validator.limpar_tag(el.tag).lower() == 'infnfe' for el in root.iter())
-                if is_nota:
-                    try:
-                        dados = validator.extrair_dados_xml(p, tipo, events_index=events_index)
-                        # Validar que temos dados mínimos
-                        if dados.get('Número') and dados.get('Número') != '0.00':
-                            notas.append(dados)
-                            app.logger.info(f"Nota processada: {dados.get('Número')}")
-                        else:
-                            app.logger.warning(f'Nota sem número em: {p}')
-                    except Exception as e:
-                        app.logger.exception(f'Erro extraindo dados de: {p}')
-                        continue
-            except Exception as e:
-                app.logger.exception(f'Erro parseando XML: {p}')
-                continue
+            # some browsers send directories with full path, we just keep the base name
+            f.filename = os.path.basename(f.filename or '') or str(uuid.uuid4()) + '.xml'
+            if eh_compactado(f.filename, f.stream):
+                compactados.append(f)
+            else:
+                xmls.append(f)
+
+        app.logger.info(f'Processando {len(xmls)} arquivos e {len(compactados)} compactados')
+
+        # modo job: responde já com o id e processa em segundo plano
+        if assincrono:
+            # os streams do upload não sobrevivem à requisição: o job lê os
+            # arquivos salvos (os compactados são salvos sem extrair)
+            tmpdir = tempfile.mkdtemp(prefix='val_')
+            paths = []
+            salvos = []
+            with metricas.etapa('upload'):
+                # o índice separa arquivos de mesmo nome (ex.: de pastas diferentes)
+                for i, f in enumerate(xmls):
+                    dest = os.path.join(tmpdir, f'{i}_{f.filename}')
+                    f.save(dest)
+                    paths.append(dest)
+                for i, f in enumerate(compactados):
+                    dest = os.path.join(tmpdir, f'{i}_{f.filename}')
+                    f.save(dest)
+                    salvos.append((f.filename, dest))
+            key = str(uuid.uuid4())
+            JOBS.criar(key, len(paths))
+            EXECUTOR.submit(_executar_job, key, tmpdir, paths, salvos, tipo, streaming)
+            app.logger.info(f'Job {key} enfileirado com {len(paths)} arquivos e {len(salvos)} compactados')
+            return jsonify({'id': key, 'job': True, 'status_url': f'/status/{key}'}), 202
+
+        pacotes = []
+        try:
+            pacotes = _abrir_pacotes((f.filename, f.stream) for f in compactados)
+            total = len(xmls) + sum(len(p) for p in pacotes)
+            notas = processar_arquivos(itertools.chain(_conteudos_upload(xmls, metricas), *pacotes), tipo,
+                                       streaming=streaming, total=total, metricas=metricas)
+        except ArquivoRejeitado as e:
+            app.logger.warning(f'Arquivo compactado recusado: {e}')
+            return jsonify({'error': str(e)}), 400
+        finally:
+            for p in pacotes:
+                p.close()
 
         # store and return id
         key = str(uuid.uuid4())
-        STORE[key] = notas
+        with metricas.etapa('armazenamento'):
+            guardar_resultado(key, notas)
         app.logger.info(f'Stored {len(notas)} notas with key: {key}')
+        with metricas.etapa('integridade'):
+            integ = verificar_lote(notas)
 
-        # cleanup files
-        try:
-            shutil.rmtree(tmpdir)
-        except Exception:
-            app.logger.exception('Erro limpando tmpdir')
-
-        return jsonify({'id': key, 'count': len(notas), 'notas': notas})
+        if request.values.get('resposta') == 'resumo':
+            # a primeira página não precisa desserializar o resultado de novo
+            NOTAS.obter(key, lambda: notas)
+            corpo = {'id': key, 'count': len(notas), 'resumo': paginacao.totais(notas), 'notas_url': f'/notas/{key}'}
+        else:
+            corpo = {'id': key, 'count': len(notas), 'notas': notas}
+        corpo['integridade'] = dict(integ, ok=sem_ocorrencias(integ))
+        with metricas.etapa('serializacao'):
+            resposta = jsonify(corpo)
+        if _pedido_perfil():
+            # serializa de novo, agora com a decomposição (só no modo perfil)
+            resposta = jsonify(dict(corpo, perfil=metricas.resumo()))
+        return resposta
     except Exception as e:
         app.logger.exception('Erro na rota /validate')
         return jsonify({'error': 'Erro interno no servidor', 'detail': str(e)}), 500
+    finally:
+        METRICAS.absorver(metricas)
 
-def build_excel_bytes(notas):
-    # Build an Excel in memory similar to desktop exporter
-    import xlsxwriter
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    worksheet = workbook.add_worksheet('Notas')
-    header_format = workbook.add_format({'bold': True, 'bg_color': '#DCE6F1'})
-    money_fmt = workbook.add_format({'num_format': '#,##0.00'})
-
-    headers = ['Tipo','Data','Número','Natureza de Operação','Status','Frete','Impostos','Total','Código Produto','Produto','CFOP','Valor Produto','Imposto Produto']
-    for c, h in enumerate(headers):
-        worksheet.write(0, c, h, header_format)
-
-    row_idx = 1
-    rows = []
-    for nota in notas:
-        rows.append({'row': {
-            'Tipo': nota.get('Tipo',''),
-            'Data': nota.get('Data',''),
-            'Número': nota.get('Número',''),
-            'Natureza de Operação': nota.get('Natureza',''),
-            'Status': nota.get('Status',''),
-            'Frete': nota.get('Frete (R$)',0.0),
-            'Impostos': nota.get('Impostos (R$)',0.0),
-            'Total': nota.get('Total (R$)',0.0),
-            'Código Produto': '',
-            'Produto': '',
-            'CFOP': '',
-            'Valor Produto': '',
-            'Imposto Produto': ''
-        }, 'level': 0})
-        for p in nota.get('Produtos', []):
-            rows.append({'row': {
-                'Tipo': '', 'Data': '', 'Número': '', 'Natureza de Operação': '', 'Status':'', 'Frete':'', 'Impostos':'', 'Total':'',
-                'Código Produto': p.get('codigo',''), 'Produto': p.get('descricao',''), 'CFOP': p.get('cfop',''), 'Valor Produto': p.get('vProd',0.0), 'Imposto Produto': p.get('imposto',0.0)
-            }, 'level': 1})
-
-    for item in rows:
-        r = item['row']; lvl = item['level']
-        worksheet.write(row_idx, 0, r.get('Tipo',''))
-        worksheet.write(row_idx, 1, r.get('Data',''))
-        worksheet.write(row_idx, 2, r.get('Número',''))
-        worksheet.write(row_idx, 3, r.get('Natureza de Operação',''))
-        worksheet.write(row_idx, 4, r.get('Status',''))
-        if r.get('Frete','') != '':
-            worksheet.write_number(row_idx, 5, float(r.get('Frete',0.0)), money_fmt)
-        if r.get('Impostos','') != '':
-            worksheet.write_number(row_idx, 6, float(r.get('Impostos',0.0)), money_fmt)
-        if r.get('Total','') != '':
-            worksheet.write_number(row_idx, 7, float(r.get('Total',0.0)), money_fmt)
-        worksheet.write(row_idx, 8, r.get('Código Produto',''))
-        worksheet.write(row_idx, 9, r.get('Produto',''))
-        worksheet.write(row_idx, 10, r.get('CFOP',''))
-        if r.get('Valor Produto','') != '':
-            worksheet.write_number(row_idx, 11, float(r.get('Valor Produto',0.0)), money_fmt)
-        if r.get('Imposto Produto','') != '':
-            worksheet.write_number(row_idx, 12, float(r.get('Imposto Produto',0.0)), money_fmt)
-
-        if lvl == 1:
-            worksheet.set_row(row_idx, None, None, {'level': lvl, 'hidden': True})
-        else:
-            worksheet.set_row(row_idx, None, None, {'level': lvl, 'collapsed': True})
-        row_idx += 1
+@app.route('/eventos', methods=['POST'])
+def receber_eventos():
+    """Upload só de eventos (XMLs avulsos ou ZIP/tar).
 
-    # total authorized
-    total_autorizadas = 0.0
-    for nota in notas:
-        try:
-            if nota.get('Status') != 'Cancelado':
-                total_autorizadas += float(nota.get('Total (R$)', nota.get('Total', 0.0) or 0.0))
-        except:
-            pass
-    worksheet.write(row_idx, 6, 'TOTAL AUTORIZADAS', header_format)
-    worksheet.write_number(row_idx, 7, total_autorizadas, money_fmt)
-
-    workbook.close()
+    Os eventos vão para a base persistente e o status das notas já
+    guardadas é atualizado pela chave de acesso, sem reprocessar nenhum
+    XML de nota. Documentos que não são eventos são ignorados.
+    """
+    metricas = Metricas()
+    with metricas.etapa('upload'):
+        files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+    streaming = request.form.get('modo') == 'streaming'
+    xmls, compactados = [], []
+    for f in files:
+        f.filename = os.path.basename(f.filename or '') or str(uuid.uuid4()) + '.xml'
+        (compactados if eh_compactado(f.filename, f.stream) else xmls).append(f)
+    pacotes = []
+    try:
+        pacotes = _abrir_pacotes((f.filename, f.stream) for f in compactados)
+        with metricas.etapa('parse'):
+            indice = ValidadorFiscal().build_events_index(
+                itertools.chain(_conteudos_upload(xmls, metricas), *pacotes), streaming=streaming)
+    except ArquivoRejeitado as e:
+        app.logger.warning(f'Arquivo compactado recusado: {e}')
+        return jsonify({'error': str(e)}), 400
+    finally:
+        for p in pacotes:
+            p.close()
+    registros = [reg for regs in indice.values() for reg in regs]
+    with metricas.etapa('eventos'):
+        rec = reconciliar(EVENTOS, STORE, registros, ao_atualizar=_descartar_derivados)
+    metricas.contar('eventos', len(registros))
+    METRICAS.absorver(metricas)
+    app.logger.info(f"/eventos: {len(registros)} eventos ({rec['eventos_novos']} novos), "
+                    f"{rec['notas_atualizadas']} notas atualizadas")
+    return jsonify(dict(rec, eventos=len(registros)))
+
+def build_excel_bytes(notas):
+    # Planilha gerada pelo motor compartilhado (constant_memory) em um
+    # arquivo temporário anônimo, devolvido já posicionado no início
+    output = tempfile.TemporaryFile(prefix='val_xlsx_')
+    escrever_excel(notas, output, integridade=verificar_lote(notas))
     output.seek(0)
     return output
 
+@app.route('/status/<key>')
+def status(key):
+    job = jobs.resumo_job(JOBS.obter(key))
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job)
+
+@app.route('/cache/stats')
+def cache_stats():
+    # contadores do processo que atendeu a requisição
+    if CACHE is None:
+        return jsonify({'ativo': False})
+    return jsonify(dict(CACHE.estatisticas(), ativo=True))
+
 @app.route('/download/<key>')
 def download(key):
     notas = STORE.get(key)
     if notas is None:
         return 'ID não encontrado', 404
-    bio = build_excel_bytes(notas)
-    return send_file(bio, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name='notas.xlsx')
+    # enviado em blocos a partir do arquivo temporário, fechado ao fim da resposta
+    arquivo = build_excel_bytes(notas)
+    return send_file(arquivo, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name='notas.xlsx')
+
+@app.route('/resumo/<key>')
+def resumo_resultado(key):
+    """Totais e agrupamentos (status, data, natureza, CFOP) de um resultado.
+
+    `?por=cfop,data` limita os agrupamentos calculados.
+    """
+    frames = FRAMES.obter(key, lambda: STORE.get(key))
+    if frames is None:
+        return jsonify({'error': 'ID não encontrado'}), 404
+    por = request.args.get('por')
+    por = [p.strip().lower() for p in por.split(',')] if por else resumo.AGRUPAMENTOS
+    return jsonify(dict(resumo.resumir(frames, por), id=key))
+
+@app.route('/integridade/<key>')
+def integridade_resultado(key):
+    """Verificação de integridade do lote (`integridade.verificar_lote`).
+
+    Por padrão lista até 1000 ocorrências de cada tipo; `?completo=1`
+    lista todas. `ok` é verdadeiro se o lote não tem nenhuma ocorrência.
+    """
+    resultado = NOTAS.obter(key, lambda: STORE.get(key))
+    if resultado is None:
+        return jsonify({'error': 'ID não encontrado'}), 404
+    completo = request.args.get('completo', '').lower() in ('1', 'true', 'sim')
+    relatorio = verificar_lote(resultado.notas, max_ocorrencias=None) if completo else verificar_lote(resultado.notas)
+    return jsonify(dict(relatorio, id=key, ok=sem_ocorrencias(relatorio)))
+
+def _filtro_status():
+    return request.args.get('status') or None
+
+
+@app.route('/notas/<key>')
+def notas_resultado(key):
+    """Notas de um resultado em páginas.
+
+    `?offset=0&limit=100` (limit até 1000), `status=Cancelado` filtra pelo
+    Status e `itens=1` inclui os produtos de cada nota (por padrão só
+    `n_itens`). Com `formato=ndjson` a resposta é enviada em streaming,
+    uma nota por linha (sem `limit`, todas a partir de `offset`), com o
+    total no cabeçalho X-Total-Notas.
+    """
+    resultado = NOTAS.obter(key, lambda: STORE.get(key))
+    if resultado is None:
+        return jsonify({'error': 'ID não encontrado'}), 404
+    offset = request.args.get('offset', 0, type=int)
+    status = _filtro_status()
+    itens = request.args.get('itens', '').lower() in ('1', 'true', 'sim')
+    if request.args.get('formato') == 'ndjson':
+        limit = request.args.get('limit', type=int)
+        return Response(paginacao.linhas_ndjson(resultado, offset, limit, status, itens),
+                        mimetype='application/x-ndjson',
+                        headers={'X-Total-Notas': str(len(resultado.posicoes(status)))})
+    limit = request.args.get('limit', paginacao.LIMITE_PADRAO, type=int)
+    return jsonify(dict(paginacao.pagina_notas(resultado, offset, limit, status, itens), id=key))
+
+@app.route('/notas/<key>/itens')
+def itens_resultado(key):
+    """Itens (produtos) de um resultado em páginas.
+
+    Aceita `offset`, `limit` e `status` como `/notas/<id>`; `nota=N`
+    limita aos itens da nota na posição N (o `indice` das notas).
+    """
+    resultado = NOTAS.obter(key, lambda: STORE.get(key))
+    if resultado is None:
+        return jsonify({'error': 'ID não encontrado'}), 404
+    pagina = paginacao.pagina_itens(resultado, request.args.get('offset', 0, type=int),
+                                    request.args.get('limit', paginacao.LIMITE_PADRAO, type=int),
+                                    _filtro_status(), request.args.get('nota', type=int))
+    return jsonify(dict(pagina, id=key))
+
+@app.route('/pdf/<key>')
+def pdf(key):
+    """Relatório PDF do resultado, desenhado em blocos no pool de processos.
+
+    `?pagina=N&por_pagina=M` gera só a N-ésima página de M notas. O tempo
+    de geração é limitado por VALIDADOR_PDF_PRAZO (segundos, padrão 120).
+    """
+    notas = STORE.get(key)
+    if notas is None:
+        return 'ID não encontrado', 404
+    por_pagina = request.args.get('por_pagina', type=int)
+    if por_pagina:
+        pagina = max(1, request.args.get('pagina', 1, type=int))
+        notas = notas[(pagina - 1) * por_pagina:pagina * por_pagina]
+    prazo = float(os.environ.get('VALIDADOR_PDF_PRAZO', '120'))
+    arquivo = tempfile.TemporaryFile(prefix='val_pdf_')
+    try:
+        gerar_pdf(notas, arquivo, workers=app.config['VALIDADOR_WORKERS'], prazo=prazo)
+    except PrazoExcedido as e:
+        arquivo.close()
+        app.logger.warning(f'PDF de {key} ({len(notas)} notas): {e}')
+        return jsonify({'error': str(e), 'notas': len(notas),
+                        'dica': 'use ?pagina=N&por_pagina=M para gerar em partes'}), 504
+    arquivo.seek(0)
+    return send_file(arquivo, mimetype='application/pdf', as_attachment=True, download_name='notas.pdf')
+
+@app.route('/export/<key>/<tabela>.<formato>')
+def exportar(key, tabela, formato):
+    """Tabela normalizada ('notas', 'itens' ou 'integridade') em Parquet, Arrow IPC ou CSV."""
+    if tabela not in TABELAS or formato not in FORMATOS:
+        return jsonify({'error': 'Use /export/<id>/<notas|itens|integridade>.<parquet|arrow|csv>'}), 404
+    notas = STORE.get(key)
+    if notas is None:
+        return 'ID não encontrado', 404
+    arquivo = tempfile.TemporaryFile(prefix='val_export_')
+    escrever_tabela(notas, tabela, formato, arquivo)
+    arquivo.seek(0)
+    return send_file(arquivo, mimetype=FORMATOS[formato], as_attachment=True,
+                     download_name=f'{tabela}.{formato}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,241 @@
+"""armazenamento
+=============
+
+Armazenamento dos resultados do `/validate` (id -> lista de notas).
+
+Os resultados são guardados serializados de forma compacta (JSON
+compactado com zlib, cada nota como a lista posicional de
+`modelo.Nota.como_linha`), nunca como objetos vivos, e o armazenamento é
+limitado por tempo de vida (TTL) e por tamanho total, com descarte do
+menos usado recentemente (LRU). Há dois backends:
+
+- `StoreMemoria`: no próprio processo;
+- `StoreSQLite`: arquivo SQLite em disco, compartilhado por todos os
+  workers do gunicorn que apontarem para o mesmo caminho — assim o
+  `/download/<id>` funciona em qualquer worker.
+
+Ambos se comportam como um dicionário (`store[id] = notas`,
+`store.get(id)`, `id in store`); `get` devolve uma lista de `Nota`.
+Cada gravação recebe uma versão nova: `store.versao(id)` a consulta sem
+ler as notas (None se o resultado expirou ou não existe), para os caches
+de notas já desserializadas conferirem se ainda valem. Use
+`criar_store()` para montar o backend a partir da configuração
+(variáveis VALIDADOR_STORE*).
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+from modelo import como_nota
+
+TTL_PADRAO = 6 * 3600
+MAX_BYTES_PADRAO = 256 * 1024 * 1024
+
+
+def serializar(valor):
+    """Serializa um valor JSON em bytes compactos (JSON + zlib)."""
+    bruto = json.dumps(valor, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return zlib.compress(bruto, 1)
+
+
+def desserializar(dados):
+    return json.loads(zlib.decompress(dados).decode('utf-8'))
+
+
+def serializar_notas(notas):
+    """Serializa uma lista de notas (`Nota` ou dicionários) em linhas posicionais."""
+    return serializar([como_nota(n).como_linha() for n in notas])
+
+
+def desserializar_notas(dados):
+    """Inverso de `serializar_notas` (aceita também resultados antigos, em dicionários)."""
+    return [como_nota(n) for n in desserializar(dados)]
+
+
+class StoreMemoria:
+    """Resultados em memória, com TTL e limite de tamanho (LRU).
+
+    Args:
+        max_bytes (int): soma máxima dos resultados serializados.
+        ttl (float): segundos até um resultado expirar.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES_PADRAO, ttl=TTL_PADRAO):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._itens = OrderedDict()  # id -> (bytes, expira_em, versão)
+        self._bytes = 0
+        self._versoes = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _remover(self, key):
+        dados = self._itens.pop(key)[0]
+        self._bytes -= len(dados)
+
+    def _expurgar(self, agora):
+        vencidos = [k for k, (_, expira, _) in self._itens.items() if expira <= agora]
+        for k in vencidos:
+            self._remover(k)
+
+    def __setitem__(self, key, notas):
+        dados = serializar_notas(notas)
+        with self._lock:
+            agora = time.time()
+            if key in self._itens:
+                self._remover(key)
+            self._itens[key] = (dados, agora + self.ttl, next(self._versoes))
+            self._bytes += len(dados)
+            self._expurgar(agora)
+            # descarta os menos usados até caber (o recém-inserido fica)
+            while self._bytes > self.max_bytes and len(self._itens) > 1:
+                self._remover(next(iter(self._itens)))
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._itens.get(key)
+            if item is None:
+                return default
+            dados, expira, _ = item
+            if expira <= time.time():
+                self._remover(key)
+                return default
+            self._itens.move_to_end(key)
+        return desserializar_notas(dados)
+
+    def versao(self, key):
+        """Versão da gravação atual de `key` (None se expirou ou não existe)."""
+        with self._lock:
+            item = self._itens.get(key)
+            return item[2] if item is not None and item[1] > time.time() else None
+
+    def __contains__(self, key):
+        return self.versao(key) is not None
+
+    def __delitem__(self, key):
+        with self._lock:
+            if key in self._itens:
+                self._remover(key)
+
+    def __len__(self):
+        return len(self._itens)
+
+    @property
+    def bytes_usados(self):
+        return self._bytes
+
+
+class StoreSQLite:
+    """Resultados em um arquivo SQLite compartilhado entre processos.
+
+    Args:
+        caminho (str): arquivo do banco; criado se não existir.
+        max_bytes (int): soma máxima dos resultados serializados.
+        ttl (float): segundos até um resultado expirar.
+    """
+
+    def __init__(self, caminho, max_bytes=MAX_BYTES_PADRAO, ttl=TTL_PADRAO):
+        self.caminho = caminho
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conexao() as con:
+            con.execute('CREATE TABLE IF NOT EXISTS resultados ('
+                        'id TEXT PRIMARY KEY, dados BLOB NOT NULL, tamanho INTEGER NOT NULL, '
+                        'expira_em REAL NOT NULL, acessado_em REAL NOT NULL, versao TEXT)')
+            # bancos criados antes da coluna de versão
+            if 'versao' not in {c[1] for c in con.execute('PRAGMA table_info(resultados)')}:
+                con.execute('ALTER TABLE resultados ADD COLUMN versao TEXT')
+            con.execute('CREATE INDEX IF NOT EXISTS resultados_acesso ON resultados (acessado_em)')
+
+    def _conexao(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=30)
+            con.execute('PRAGMA journal_mode=WAL')
+            self._local.con = con
+        return con
+
+    def __setitem__(self, key, notas):
+        dados = serializar_notas(notas)
+        agora = time.time()
+        con = self._conexao()
+        with con:
+            con.execute('BEGIN IMMEDIATE')
+            con.execute('INSERT OR REPLACE INTO resultados (id, dados, tamanho, expira_em, acessado_em, versao) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', (key, dados, len(dados), agora + self.ttl, agora,
+                                                      uuid.uuid4().hex))
+            con.execute('DELETE FROM resultados WHERE expira_em <= ?', (agora,))
+            total = con.execute('SELECT COALESCE(SUM(tamanho), 0) FROM resultados').fetchone()[0]
+            if total > self.max_bytes:
+                # descarta os menos usados até caber (o recém-inserido fica)
+                for rid, tamanho in con.execute('SELECT id, tamanho FROM resultados WHERE id != ? '
+                                                'ORDER BY acessado_em', (key,)).fetchall():
+                    con.execute('DELETE FROM resultados WHERE id = ?', (rid,))
+                    total -= tamanho
+                    if total <= self.max_bytes:
+                        break
+
+    def get(self, key, default=None):
+        con = self._conexao()
+        agora = time.time()
+        linha = con.execute('SELECT dados, expira_em FROM resultados WHERE id = ?', (key,)).fetchone()
+        if linha is None:
+            return default
+        dados, expira = linha
+        with con:
+            if expira <= agora:
+                con.execute('DELETE FROM resultados WHERE id = ?', (key,))
+                return default
+            con.execute('UPDATE resultados SET acessado_em = ? WHERE id = ?', (agora, key))
+        return desserializar_notas(dados)
+
+    def versao(self, key):
+        """Versão da gravação atual de `key` (None se expirou ou não existe)."""
+        linha = self._conexao().execute("SELECT COALESCE(versao, '') FROM resultados "
+                                        'WHERE id = ? AND expira_em > ?', (key, time.time())).fetchone()
+        return None if linha is None else linha[0]
+
+    def __contains__(self, key):
+        return self.versao(key) is not None
+
+    def __delitem__(self, key):
+        with self._conexao() as con:
+            con.execute('DELETE FROM resultados WHERE id = ?', (key,))
+
+    def __len__(self):
+        return self._conexao().execute('SELECT COUNT(*) FROM resultados').fetchone()[0]
+
+    @property
+    def bytes_usados(self):
+        return self._conexao().execute('SELECT COALESCE(SUM(tamanho), 0) FROM resultados').fetchone()[0]
+
+
+def diretorio_spool():
+    """Diretório de trabalho compartilhado (VALIDADOR_SPOOL_DIR), criado se preciso."""
+    caminho = os.environ.get('VALIDADOR_SPOOL_DIR') or os.path.join(tempfile.gettempdir(), 'validador')
+    os.makedirs(caminho, exist_ok=True)
+    return caminho
+
+
+def criar_store():
+    """Cria o armazenamento de resultados a partir das variáveis de ambiente.
+
+    - VALIDADOR_STORE: 'sqlite' (padrão) ou 'memoria';
+    - VALIDADOR_STORE_DB: arquivo SQLite (padrão: resultados.db no spool);
+    - VALIDADOR_STORE_TTL: segundos de vida de cada resultado;
+    - VALIDADOR_STORE_MAX_MB: tamanho máximo total.
+    """
+    ttl = float(os.environ.get('VALIDADOR_STORE_TTL', TTL_PADRAO))
+    max_bytes = int(float(os.environ.get('VALIDADOR_STORE_MAX_MB', MAX_BYTES_PADRAO / (1024 * 1024))) * 1024 * 1024)
+    if os.environ.get('VALIDADOR_STORE', 'sqlite').lower() == 'memoria':
+        return StoreMemoria(max_bytes=max_bytes, ttl=ttl)
+    caminho = os.environ.get('VALIDADOR_STORE_DB') or os.path.join(diretorio_spool(), 'resultados.db')
+    return StoreSQLite(caminho, max_bytes=max_bytes, ttl=ttl)
@@ -0,0 +1,327 @@
+"""base_eventos
+============
+
+Base persistente de eventos fiscais e reconciliação dos resultados guardados.
+
+Os eventos (cancelamento, carta de correção...) costumam chegar dias
+depois da nota. Cada `RegistroEvento` recebido — em um `/validate` ou
+no upload só de eventos (`/eventos`) — é gravado na base, indexado pela
+chave de acesso. A base também guarda, para cada resultado do
+armazenamento (`armazenamento`), as chaves das notas que ele contém
+(vínculos chave -> id do resultado, com o mesmo TTL dos resultados).
+
+Com isso a reconciliação (`reconciliar`) custa O(eventos): as chaves
+que passaram a estar canceladas levam direto aos resultados afetados,
+e só esses são relidos do armazenamento, têm o Status das notas
+atualizado e são regravados — nenhum XML de nota é lido de novo. O
+status só muda de Autorizada para Cancelado, então reaplicar uma
+reconciliação é inofensivo.
+
+Há dois backends, como no armazenamento de resultados:
+
+- `EventosMemoria`: no próprio processo;
+- `EventosSQLite`: arquivo SQLite compartilhado pelos workers do gunicorn.
+
+Use `criar_base_eventos()` para montar o backend a partir da
+configuração (variáveis VALIDADOR_EVENTOS*).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from armazenamento import TTL_PADRAO, diretorio_spool
+from eventos import CANCELADO, IndiceEventos
+
+# parâmetros por consulta `IN (...)` (o SQLite antigo aceita até 999)
+_LOTE_SQL = 500
+
+
+def _identidade(registro):
+    # eventos repetidos (o mesmo XML enviado de novo, ou o mesmo evento
+    # lido com ou sem o retEvento) não são duplicados; a data do
+    # protocolo é dado do evento, não parte da identidade
+    return (registro.chave, registro.tp_evento or '', registro.n_seq or '')
+
+
+class EventosMemoria:
+    """Base de eventos e vínculos no próprio processo.
+
+    Args:
+        ttl (float): segundos de vida de um vínculo chave -> resultado.
+    """
+
+    def __init__(self, ttl=TTL_PADRAO):
+        self.ttl = ttl
+        self._indice = IndiceEventos()
+        self._vistos = set()
+        self._chaves_resultado = OrderedDict()  # id -> (chaves, expira_em)
+        self._resultados_chave = {}  # chave -> {ids}
+        self._lock = threading.Lock()
+
+    def registrar(self, registros):
+        """Grava os eventos ainda não vistos.
+
+        Returns:
+            tuple[int, set[str]]: quantidade de eventos novos e as chaves
+                que passaram a estar canceladas com eles.
+        """
+        novos, canceladas = 0, set()
+        with self._lock:
+            for registro in registros:
+                identidade = _identidade(registro)
+                if identidade in self._vistos:
+                    continue
+                self._vistos.add(identidade)
+                novos += 1
+                if registro.status == CANCELADO and self._indice.status(registro.chave) != CANCELADO:
+                    canceladas.add(registro.chave)
+                self._indice.adicionar(registro)
+        return novos, canceladas
+
+    def cancelados(self, chaves):
+        """Subconjunto de `chaves` com algum evento de cancelamento."""
+        with self._lock:
+            return {c for c in chaves if self._indice.status(c) == CANCELADO}
+
+    def _expurgar(self, agora):
+        # vínculos entram em ordem de expiração (TTL fixo)
+        while self._chaves_resultado:
+            rid, (chaves, expira) = next(iter(self._chaves_resultado.items()))
+            if expira > agora:
+                break
+            self._remover(rid)
+
+    def _remover(self, resultado_id):
+        chaves, _ = self._chaves_resultado.pop(resultado_id)
+        for c in chaves:
+            ids = self._resultados_chave.get(c)
+            if ids is not None:
+                ids.discard(resultado_id)
+                if not ids:
+                    del self._resultados_chave[c]
+
+    def vincular(self, resultado_id, chaves):
+        """Registra (ou renova) as chaves das notas de um resultado guardado."""
+        with self._lock:
+            agora = time.time()
+            if resultado_id in self._chaves_resultado:
+                self._remover(resultado_id)
+            chaves = frozenset(chaves)
+            self._chaves_resultado[resultado_id] = (chaves, agora + self.ttl)
+            for c in chaves:
+                self._resultados_chave.setdefault(c, set()).add(resultado_id)
+            self._expurgar(agora)
+
+    def resultados_com(self, chaves):
+        """Resultados que contêm notas com as chaves informadas (id -> chaves)."""
+        afetados = {}
+        with self._lock:
+            self._expurgar(time.time())
+            for c in chaves:
+                for rid in self._resultados_chave.get(c, ()):
+                    afetados.setdefault(rid, set()).add(c)
+        return afetados
+
+    def __len__(self):
+        return len(self._vistos)
+
+
+class EventosSQLite:
+    """Base de eventos e vínculos em um arquivo SQLite compartilhado entre processos.
+
+    Args:
+        caminho (str): arquivo do banco; criado se não existir.
+        ttl (float): segundos de vida de um vínculo chave -> resultado.
+    """
+
+    def __init__(self, caminho, ttl=TTL_PADRAO):
+        self.caminho = caminho
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conexao() as con:
+            con.execute('CREATE TABLE IF NOT EXISTS eventos ('
+                        'chave TEXT NOT NULL, tp_evento TEXT NOT NULL, n_seq TEXT NOT NULL, '
+                        'dh_registro TEXT NOT NULL, status TEXT NOT NULL, recebido_em REAL NOT NULL, '
+                        'PRIMARY KEY (chave, tp_evento, n_seq))')
+            # bancos criados com a data do protocolo na chave primária
+            if self._identidade_com_data(con):
+                self._migrar_identidade(con)
+            con.execute('CREATE TABLE IF NOT EXISTS vinculos ('
+                        'chave TEXT NOT NULL, resultado TEXT NOT NULL, expira_em REAL NOT NULL, '
+                        'PRIMARY KEY (chave, resultado))')
+            con.execute('CREATE INDEX IF NOT EXISTS vinculos_resultado ON vinculos (resultado)')
+            con.execute('CREATE INDEX IF NOT EXISTS vinculos_expira ON vinculos (expira_em)')
+
+    def _conexao(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=30)
+            con.execute('PRAGMA journal_mode=WAL')
+            self._local.con = con
+        return con
+
+    @staticmethod
+    def _identidade_com_data(con):
+        return any(c[1] == 'dh_registro' and c[5] for c in con.execute('PRAGMA table_info(eventos)'))
+
+    @classmethod
+    def _migrar_identidade(cls, con):
+        # a chave primária não pode ser alterada: a tabela é refeita e,
+        # entre eventos repetidos, fica o primeiro recebido
+        con.execute('BEGIN IMMEDIATE')
+        if not cls._identidade_com_data(con):
+            return  # outro processo já migrou
+        con.execute('ALTER TABLE eventos RENAME TO eventos_antigos')
+        con.execute('CREATE TABLE eventos ('
+                    'chave TEXT NOT NULL, tp_evento TEXT NOT NULL, n_seq TEXT NOT NULL, '
+                    'dh_registro TEXT NOT NULL, status TEXT NOT NULL, recebido_em REAL NOT NULL, '
+                    'PRIMARY KEY (chave, tp_evento, n_seq))')
+        con.execute('INSERT OR IGNORE INTO eventos SELECT chave, tp_evento, n_seq, dh_registro, status, '
+                    'recebido_em FROM eventos_antigos ORDER BY recebido_em')
+        con.execute('DROP TABLE eventos_antigos')
+
+    def _consultar_em_lotes(self, con, sql, chaves, *parametros):
+        # `sql` tem um marcador {} para a lista `IN (...)`
+        chaves = list(chaves)
+        for i in range(0, len(chaves), _LOTE_SQL):
+            lote = chaves[i:i + _LOTE_SQL]
+            yield from con.execute(sql.format(','.join('?' * len(lote))), (*parametros, *lote))
+
+    def registrar(self, registros):
+        """Grava os eventos ainda não vistos.
+
+        Returns:
+            tuple[int, set[str]]: quantidade de eventos novos e as chaves
+                que passaram a estar canceladas com eles.
+        """
+        agora = time.time()
+        linhas = {}
+        for r in registros:
+            linhas.setdefault(_identidade(r), (r.dh_registro or '', r.status))
+        if not linhas:
+            return 0, set()
+        con = self._conexao()
+        with con:
+            # BEGIN IMMEDIATE serializa a decisão "já estava cancelada?" entre processos
+            con.execute('BEGIN IMMEDIATE')
+            candidatas = {ident[0] for ident, (_, status) in linhas.items() if status == CANCELADO}
+            ja_canceladas = {c for (c,) in self._consultar_em_lotes(
+                con, 'SELECT DISTINCT chave FROM eventos WHERE status = ? AND chave IN ({})',
+                candidatas, CANCELADO)}
+            antes = con.total_changes
+            con.executemany('INSERT OR IGNORE INTO eventos (chave, tp_evento, n_seq, dh_registro, status, '
+                            'recebido_em) VALUES (?, ?, ?, ?, ?, ?)',
+                            [(*ident, dh, status, agora) for ident, (dh, status) in linhas.items()])
+            novos = con.total_changes - antes
+        return novos, candidatas - ja_canceladas
+
+    def cancelados(self, chaves):
+        """Subconjunto de `chaves` com algum evento de cancelamento."""
+        return {c for (c,) in self._consultar_em_lotes(
+            self._conexao(), 'SELECT DISTINCT chave FROM eventos WHERE status = ? AND chave IN ({})',
+            set(chaves), CANCELADO)}
+
+    def vincular(self, resultado_id, chaves):
+        """Registra (ou renova) as chaves das notas de um resultado guardado."""
+        agora = time.time()
+        with self._conexao() as con:
+            con.execute('DELETE FROM vinculos WHERE resultado = ?', (resultado_id,))
+            con.executemany('INSERT OR REPLACE INTO vinculos (chave, resultado, expira_em) VALUES (?, ?, ?)',
+                            [(c, resultado_id, agora + self.ttl) for c in set(chaves)])
+            con.execute('DELETE FROM vinculos WHERE expira_em <= ?', (agora,))
+
+    def resultados_com(self, chaves):
+        """Resultados que contêm notas com as chaves informadas (id -> chaves)."""
+        afetados = {}
+        for rid, c in self._consultar_em_lotes(
+                self._conexao(), 'SELECT resultado, chave FROM vinculos WHERE expira_em > ? AND chave IN ({})',
+                set(chaves), time.time()):
+            afetados.setdefault(rid, set()).add(c)
+        return afetados
+
+    def __len__(self):
+        return self._conexao().execute('SELECT COUNT(*) FROM eventos').fetchone()[0]
+
+
+def chaves_das_notas(notas):
+    """Chaves de acesso (não vazias) de uma lista de notas."""
+    return {d.get('Chave') for d in notas if d.get('Chave')}
+
+
+def aplicar_cancelamentos(base, notas):
+    """Marca como Cancelado as notas cujas chaves têm cancelamento na base.
+
+    Returns:
+        int: quantidade de notas alteradas.
+    """
+    canceladas = base.cancelados(chaves_das_notas(notas))
+    alteradas = 0
+    for dados in notas:
+        if dados.get('Chave') in canceladas and dados.get('Status') != CANCELADO:
+            dados['Status'] = CANCELADO
+            alteradas += 1
+    return alteradas
+
+
+def reconciliar(base, store, registros, ao_atualizar=None):
+    """Grava eventos na base e atualiza o status dos resultados já guardados.
+
+    Só os resultados vinculados às chaves que passaram a estar canceladas
+    são relidos e regravados. O status de cada um é reconferido com a
+    base inteira, de modo que reconciliações simultâneas do mesmo
+    resultado não se perdem uma à outra.
+
+    Args:
+        base (EventosMemoria|EventosSQLite): base de eventos.
+        store: armazenamento de resultados (id -> notas).
+        registros (iterable[RegistroEvento]): eventos recebidos.
+        ao_atualizar (callable, opcional): chamado com o id de cada
+            resultado regravado (ex.: para descartar caches derivados).
+
+    Returns:
+        dict: eventos novos, chaves canceladas agora, ids dos resultados
+            atualizados e quantidade de notas alteradas.
+    """
+    # notas com protocolo também geram registro (chNFe sem tpEvento); só
+    # eventos de fato ou cancelamentos interessam à base
+    novos, canceladas = base.registrar(r for r in registros if r.tp_evento or r.status == CANCELADO)
+    atualizados, notas_alteradas = [], 0
+    if canceladas:
+        for rid in base.resultados_com(canceladas):
+            notas = store.get(rid)
+            if notas is None:
+                # resultado expirado: o vínculo expira junto
+                continue
+            alteradas = aplicar_cancelamentos(base, notas)
+            if not alteradas:
+                continue
+            store[rid] = notas
+            # regravar renova o TTL do resultado; o dos vínculos acompanha
+            base.vincular(rid, chaves_das_notas(notas))
+            atualizados.append(rid)
+            notas_alteradas += alteradas
+            if ao_atualizar is not None:
+                ao_atualizar(rid)
+    return {'eventos_novos': novos, 'cancelamentos': len(canceladas),
+            'resultados_atualizados': atualizados, 'notas_atualizadas': notas_alteradas}
+
+
+def criar_base_eventos(ttl=None):
+    """Cria a base de eventos a partir das variáveis de ambiente.
+
+    - VALIDADOR_EVENTOS: 'sqlite' (padrão) ou 'memoria';
+    - VALIDADOR_EVENTOS_DB: arquivo SQLite (padrão: eventos.db no spool).
+
+    Args:
+        ttl (float, opcional): vida dos vínculos; use o TTL do
+            armazenamento de resultados (padrão VALIDADOR_STORE_TTL).
+    """
+    if ttl is None:
+        ttl = float(os.environ.get('VALIDADOR_STORE_TTL', TTL_PADRAO))
+    if os.environ.get('VALIDADOR_EVENTOS', 'sqlite').lower() == 'memoria':
+        return EventosMemoria(ttl=ttl)
+    caminho = os.environ.get('VALIDADOR_EVENTOS_DB') or os.path.join(diretorio_spool(), 'eventos.db')
+    return EventosSQLite(caminho, ttl=ttl)
@@ -0,0 +1,47 @@
+"""Benchmark: lote reprocessado com e sem o cache de extração.
+
+Processa o mesmo lote três vezes: sem cache, com o cache vazio (todas
+as consultas falham e as entradas são gravadas) e com o cache quente
+(nenhum arquivo é parseado), conferindo que os resultados são iguais.
+
+Uso::
+
+    python -m benchmarks.bench_cache [--arquivos 2000] [--itens 20]
+"""
+
+import argparse
+import tempfile
+import time
+
+from benchmarks.bench_paralelo import preparar_lote
+from cache_extracao import CacheExtracao
+from paralelo import processar_lote
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--arquivos', type=int, default=2000, help='quantidade de notas')
+    parser.add_argument('--itens', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as d, tempfile.TemporaryDirectory() as dir_cache:
+        caminhos = preparar_lote(d, args.arquivos, args.itens)
+        cache = CacheExtracao(dir_cache)
+        referencia = None
+        print(f"{'execução':>10} {'tempo (s)':>10} {'arquivos/s':>11} {'acertos':>8} {'falhas':>7}")
+        for nome, c in (('sem cache', None), ('frio', cache), ('quente', cache)):
+            t0 = time.perf_counter()
+            resultados, _ = processar_lote(caminhos, 'NF-e', workers=1, cache=c)
+            dt = time.perf_counter() - t0
+            notas = [n for r in resultados for n in r.notas]
+            if referencia is None:
+                referencia = notas
+            elif notas != referencia:
+                raise SystemExit(f'Resultado divergente na execução {nome}')
+            est = cache.estatisticas()
+            print(f'{nome:>10} {dt:>10.2f} {len(caminhos) / dt:>11.0f} {est["acertos"]:>8} {est["falhas"]:>7}')
+        print(f'cache em disco: {cache.estatisticas()["bytes"] / 1024:.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
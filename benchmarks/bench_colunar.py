@@ -0,0 +1,47 @@
+"""Benchmark: exportação colunar (Parquet, Arrow IPC, CSV) x Excel.
+
+Exporta as tabelas `notas` e `itens` de um mês sintético em cada formato
+com `exportacao.escrever_tabela` e, para comparação, a planilha com
+`exportacao.escrever_excel`, medindo tempo, linhas/s e tamanho.
+
+Uso::
+
+    python -m benchmarks.bench_colunar [--notas 20000] [--itens 20]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_excel import gerar_notas
+from exportacao import FORMATOS, escrever_excel, escrever_tabela
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notas', type=int, default=20000)
+    parser.add_argument('--itens', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    notas = list(gerar_notas(args.notas, args.itens))
+    print(f"{'saída':>16} {'linhas':>9} {'tempo (s)':>10} {'linhas/s':>10} {'tamanho (MB)':>13}")
+    with tempfile.TemporaryDirectory() as d:
+        medidas = []
+        for formato in FORMATOS:
+            for tabela in ('notas', 'itens'):
+                caminho = os.path.join(d, f'{tabela}.{formato}')
+                t0 = time.perf_counter()
+                linhas = escrever_tabela(notas, tabela, formato, caminho)
+                medidas.append((f'{tabela}.{formato}', linhas, time.perf_counter() - t0, caminho))
+        caminho = os.path.join(d, 'notas.xlsx')
+        t0 = time.perf_counter()
+        linhas = escrever_excel(notas, caminho)
+        medidas.append(('notas.xlsx', linhas, time.perf_counter() - t0, caminho))
+        for nome, linhas, dt, caminho in medidas:
+            print(f'{nome:>16} {linhas:>9} {dt:>10.2f} {linhas / dt:>10.0f} '
+                  f'{os.path.getsize(caminho) / (1024 * 1024):>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
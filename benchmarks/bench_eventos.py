@@ -0,0 +1,93 @@
+"""Benchmark: índice de eventos compacto x índice com árvores retidas.
+
+Monta o índice para N eventos de cancelamento com o formato anterior
+(dict com a árvore do documento, status decidido juntando o texto de
+todos os elementos a cada consulta) e com `build_events_index`
+(`RegistroEvento` com status já decidido). Mede a memória retida pelo
+índice e o tempo de consulta do status de todas as chaves.
+
+Uso::
+
+    python -m benchmarks.bench_eventos [--eventos 1000 10000]
+"""
+
+import argparse
+import io
+import random
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from benchmarks.gerador import gerar_chave, gerar_evento
+from validador_fiscal import ValidadorFiscal
+
+
+def indice_legado(v, documentos):
+    index = {}
+    for xml in documentos:
+        root = ET.parse(io.BytesIO(xml)).getroot()
+        chave = tp = xev = None
+        for el in root.iter():
+            tag = v.limpar_tag(el.tag).lower()
+            if tag == 'chnfe' and el.text:
+                chave = el.text.strip()
+            if tag == 'tpevento' and el.text:
+                tp = el.text.strip()
+            if tag == 'xevento' and el.text:
+                xev = el.text.strip()
+        if chave:
+            index.setdefault(chave, []).append({'tpEvento': tp, 'xEvento': xev, 'root': root})
+    return index
+
+
+def status_legado(index, chave):
+    for ev in index.get(chave, []):
+        if ev['tpEvento'] == '110111':
+            return 'Cancelado'
+        txt = (ev['xEvento'] or '').lower() + ''.join((el.text or '').lower() for el in ev['root'].iter())
+        if 'cancel' in txt or '110111' in txt:
+            return 'Cancelado'
+    return 'Autorizada'
+
+
+def _medir(construir):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    indice = construir()
+    dt = time.perf_counter() - t0
+    retido = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return indice, dt, retido
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--eventos', type=int, nargs='+', default=[1000, 10000])
+    args = parser.parse_args(argv)
+
+    v = ValidadorFiscal()
+    print(f"{'eventos':>8} {'legado (MB)':>12} {'compacto (MB)':>14} {'consulta legado (ms)':>21} {'consulta compacto (ms)':>23}")
+    for n in args.eventos:
+        rng = random.Random(n)
+        chaves = [gerar_chave(rng, numero=i) for i in range(n)]
+        # metade cancelamentos, metade cartas de correção
+        documentos = [gerar_evento(ch, *(('110111', 'Cancelamento') if i % 2 else ('110110', 'Carta de Correcao')))
+                      for i, ch in enumerate(chaves)]
+        legado, _, mem_legado = _medir(lambda: indice_legado(v, documentos))
+        compacto, _, mem_compacto = _medir(lambda: v.build_events_index([io.BytesIO(d) for d in documentos]))
+
+        t0 = time.perf_counter()
+        esperado = [status_legado(legado, ch) for ch in chaves]
+        t_legado = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        obtido = [compacto.status(ch) for ch in chaves]
+        t_compacto = time.perf_counter() - t0
+        if esperado != obtido:
+            raise SystemExit('Divergência de status entre os índices')
+        mb = 1024 * 1024
+        print(f"{n:>8} {mem_legado / mb:>12.2f} {mem_compacto / mb:>14.2f} "
+              f"{t_legado * 1000:>21.2f} {t_compacto * 1000:>23.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark: exportação Excel (linhas/s e pico de RSS).
+
+Compara a exportação original (`excel_legado`: lista intermediária de
+linhas e workbook `in_memory`) com o motor compartilhado
+`exportacao.escrever_excel` (modo `constant_memory`, escrita direta a
+partir das notas). Cada variante roda em um subprocesso próprio para
+que o pico de RSS (`ru_maxrss`) de uma não contamine a outra.
+
+Uso::
+
+    python -m benchmarks.bench_excel [--notas 10000] [--itens 20]
+"""
+
+import argparse
+import io
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import xlsxwriter
+
+from exportacao import escrever_excel
+
+
+def gerar_notas(n_notas, n_itens, semente=0):
+    """Notas já extraídas (dicts), no formato de `extrair_dados_xml`."""
+    rng = random.Random(semente)
+    for i in range(1, n_notas + 1):
+        produtos = [{
+            'descricao': f'PRODUTO {i}-{j}', 'codigo': f'P{j:05d}', 'cfop': rng.choice(['5102', '6102', '5405']),
+            'vProd': round(rng.uniform(1, 500), 2), 'imposto': round(rng.uniform(0, 50), 2),
+        } for j in range(n_itens)]
+        yield {
+            'Tipo': 'NF-e', 'Número': str(i), 'Data': '2026-01-15', 'Frete (R$)': 10.0,
+            'Impostos (R$)': round(sum(p['imposto'] for p in produtos), 2),
+            'Total (R$)': round(sum(p['vProd'] for p in produtos), 2), 'Natureza': 'VENDA',
+            'Chave': f'{i:044d}', 'Status': 'Cancelado' if i % 10 == 0 else 'Autorizada', 'Produtos': produtos,
+        }
+
+
+def excel_legado(notas):
+    # Cópia da exportação original de app.build_excel_bytes (referência)
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    worksheet = workbook.add_worksheet('Notas')
+    header_format = workbook.add_format({'bold': True, 'bg_color': '#DCE6F1'})
+    money_fmt = workbook.add_format({'num_format': '#,##0.00'})
+    headers = ['Tipo', 'Data', 'Número', 'Natureza de Operação', 'Status', 'Frete', 'Impostos', 'Total',
+               'Código Produto', 'Produto', 'CFOP', 'Valor Produto', 'Imposto Produto']
+    for c, h in enumerate(headers):
+        worksheet.write(0, c, h, header_format)
+    rows = []
+    for nota in notas:
+        rows.append({'row': {
+            'Tipo': nota.get('Tipo', ''), 'Data': nota.get('Data', ''), 'Número': nota.get('Número', ''),
+            'Natureza de Operação': nota.get('Natureza', ''), 'Status': nota.get('Status', ''),
+            'Frete': nota.get('Frete (R$)', 0.0), 'Impostos': nota.get('Impostos (R$)', 0.0),
+            'Total': nota.get('Total (R$)', 0.0), 'Código Produto': '', 'Produto': '', 'CFOP': '',
+            'Valor Produto': '', 'Imposto Produto': ''}, 'level': 0})
+        for p in nota.get('Produtos', []):
+            rows.append({'row': {
+                'Tipo': '', 'Data': '', 'Número': '', 'Natureza de Operação': '', 'Status': '', 'Frete': '',
+                'Impostos': '', 'Total': '', 'Código Produto': p.get('codigo', ''), 'Produto': p.get('descricao', ''),
+                'CFOP': p.get('cfop', ''), 'Valor Produto': p.get('vProd', 0.0),
+                'Imposto Produto': p.get('imposto', 0.0)}, 'level': 1})
+    row_idx = 1
+    for item in rows:
+        r = item['row']; lvl = item['level']
+        for c, campo in enumerate(['Tipo', 'Data', 'Número', 'Natureza de Operação', 'Status']):
+            worksheet.write(row_idx, c, r.get(campo, ''))
+        for c, campo in ((5, 'Frete'), (6, 'Impostos'), (7, 'Total')):
+            if r.get(campo, '') != '':
+                worksheet.write_number(row_idx, c, float(r.get(campo, 0.0)), money_fmt)
+        for c, campo in ((8, 'Código Produto'), (9, 'Produto'), (10, 'CFOP')):
+            worksheet.write(row_idx, c, r.get(campo, ''))
+        for c, campo in ((11, 'Valor Produto'), (12, 'Imposto Produto')):
+            if r.get(campo, '') != '':
+                worksheet.write_number(row_idx, c, float(r.get(campo, 0.0)), money_fmt)
+        if lvl == 1:
+            worksheet.set_row(row_idx, None, None, {'level': lvl, 'hidden': True})
+        else:
+            worksheet.set_row(row_idx, None, None, {'level': lvl, 'collapsed': True})
+        row_idx += 1
+    workbook.close()
+    output.seek(0)
+    return output, row_idx - 1
+
+
+def _executar(variante, n_notas, n_itens):
+    # Roda uma variante no processo atual e devolve as medidas
+    t0 = time.perf_counter()
+    if variante == 'legado':
+        # o legado recebe a lista pronta, como no STORE original
+        _, linhas = excel_legado(list(gerar_notas(n_notas, n_itens)))
+    else:
+        with tempfile.TemporaryFile() as fh:
+            linhas = escrever_excel(gerar_notas(n_notas, n_itens), fh)
+    dt = time.perf_counter() - t0
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'linhas': linhas, 'tempo': dt, 'rss_mb': rss_kb / 1024}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notas', type=int, default=10000)
+    parser.add_argument('--itens', type=int, default=20)
+    parser.add_argument('--variante', choices=['legado', 'novo'], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.variante:
+        print(json.dumps(_executar(args.variante, args.notas, args.itens)))
+        return
+
+    print(f"{'variante':>8} {'linhas':>9} {'tempo (s)':>10} {'linhas/s':>10} {'pico RSS (MB)':>14}")
+    for variante in ('legado', 'novo'):
+        saida = subprocess.run([sys.executable, '-m', 'benchmarks.bench_excel', '--variante', variante,
+                                '--notas', str(args.notas), '--itens', str(args.itens)],
+                               check=True, capture_output=True, text=True).stdout
+        m = json.loads(saida)
+        print(f"{variante:>8} {m['linhas']:>9} {m['tempo']:>10.2f} {m['linhas'] / m['tempo']:>10.0f} {m['rss_mb']:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark: extração em passagem única x caminho legado com buscar_valor.
+
+Compara `ValidadorFiscal.extrair_dados_xml` (motor compilado) com a
+implementação anterior, reproduzida aqui como referência, sobre notas
+sintéticas de 1, 100 e 1.000 itens. Antes de medir, confere que os dois
+caminhos produzem o mesmo resultado, exceto o total e os impostos da
+nota: o caminho legado tomava o vProd e o vTotTrib do primeiro item, e
+o perfil da NF-e usa o vNF e os impostos do ICMSTot.
+
+Uso::
+
+    python -m benchmarks.bench_extracao [--repeticoes N]
+"""
+
+import argparse
+import io
+import time
+import xml.etree.ElementTree as ET
+
+from benchmarks.gerador import gerar_nfe
+from validador_fiscal import ValidadorFiscal
+
+
+def extrair_legado(v, root, tipo):
+    """Reprodução do algoritmo anterior (uma varredura por campo)."""
+    numero = v.buscar_valor(root, ['nNF', 'Numero', 'numNota', 'nCT', 'nMDF'])
+    data = v.buscar_valor(root, ['dhEmi', 'DataEmissao', 'dEmi', 'dhEmiS'])
+    v_nota = v.buscar_valor(root, ['vNF', 'vServ', 'vLiquido', 'vProd', 'vTPrest'])
+    v_frete = v.buscar_valor(root, ['vFrete', 'vFreteT'])
+    v_imp = v.buscar_valor(root, ['vTotTrib', 'vICMS', 'vISS', 'vTot'])
+    natureza = v.buscar_valor(root, ['natOp', 'natureza'])
+    chave = None
+    for elemento in root.iter():
+        if v.limpar_tag(elemento.tag).lower() == 'infnfe':
+            chave_attr = elemento.attrib.get('Id') or elemento.attrib.get('ID')
+            if chave_attr:
+                chave = chave_attr.replace('NFe', '').strip()
+                break
+    if not chave:
+        ch = v.buscar_valor(root, ['chNFe', 'chave'])
+        if ch and ch != '0.00':
+            chave = ch.strip()
+
+    def to_float_safe(x):
+        try:
+            return float(str(x).replace(',', '.'))
+        except Exception:
+            return 0.0
+
+    produtos = []
+    for det in root.iter():
+        if v.limpar_tag(det.tag).lower() != 'det':
+            continue
+        prod_el = None
+        for child in det:
+            if v.limpar_tag(child.tag).lower() == 'prod':
+                prod_el = child
+                break
+        if prod_el is None:
+            continue
+        desc = v.buscar_valor(prod_el, ['xProd', 'descr', 'descricao'])
+        codigo = v.buscar_valor(prod_el, ['cProd', 'codigo', 'cProdItem'])
+        cfop = v.buscar_valor(prod_el, ['CFOP', 'cfop'])
+        vprod = v.buscar_valor(prod_el, ['vProd', 'vproduto', 'vProdItem'])
+        imposto_total = 0.0
+        for tag in ['vICMS', 'vIPI', 'vPIS', 'vCOFINS', 'vII', 'vST']:
+            for el in det.iter():
+                if v.limpar_tag(el.tag).lower() == tag.lower() and el.text:
+                    try:
+                        imposto_total += float(el.text.replace(',', '.'))
+                    except Exception:
+                        pass
+        produtos.append({
+            'descricao': desc if desc and desc != '0.00' else '',
+            'codigo': codigo if codigo and codigo != '0.00' else '',
+            'cfop': cfop if cfop and cfop != '0.00' else '',
+            'vProd': float(str(vprod).replace(',', '.')) if vprod and vprod != '0.00' else 0.0,
+            'imposto': imposto_total
+        })
+    return {
+        "Tipo": tipo,
+        "Número": numero,
+        "Data": data[:10] if data and data != '0.00' else "N/A",
+        "Frete (R$)": to_float_safe(v_frete),
+        "Impostos (R$)": to_float_safe(v_imp),
+        "Total (R$)": to_float_safe(v_nota),
+        "Natureza": natureza,
+        "Chave": chave or '',
+        "Status": 'Autorizada',
+        "Produtos": produtos
+    }
+
+
+# campos que o caminho legado lia do primeiro item (ver docstring)
+_CAMPOS_DO_TOTAL = ('Total (R$)', 'Impostos (R$)')
+
+
+def _sem_totais(nota):
+    return {k: v for k, v in dict(nota).items() if k not in _CAMPOS_DO_TOTAL}
+
+
+def _medir(fn, repeticoes):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--itens', type=int, nargs='+', default=[1, 100, 1000])
+    args = parser.parse_args(argv)
+
+    v = ValidadorFiscal()
+    print(f"{'itens':>6} {'legado (ms)':>12} {'compilado (ms)':>15} {'ganho':>7}")
+    for n in args.itens:
+        xml = gerar_nfe(n)
+        root = ET.parse(io.BytesIO(xml)).getroot()
+        esperado = extrair_legado(v, root, 'NF-e')
+        obtido = v.extrair_dados_xml(io.BytesIO(xml), 'NF-e')
+        if _sem_totais(esperado) != _sem_totais(obtido):
+            raise SystemExit(f'Divergência entre caminhos para {n} itens')
+
+        t_legado = _medir(lambda: extrair_legado(v, ET.parse(io.BytesIO(xml)).getroot(), 'NF-e'), args.repeticoes)
+        t_novo = _medir(lambda: v.extrair_dados_xml(io.BytesIO(xml), 'NF-e'), args.repeticoes)
+        print(f"{n:>6} {t_legado * 1000:>12.2f} {t_novo * 1000:>15.2f} {t_legado / t_novo:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
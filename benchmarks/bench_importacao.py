@@ -0,0 +1,57 @@
+"""Benchmark: tempo de importação dos módulos de entrada.
+
+Cada módulo é importado em um subprocesso novo (interpretador limpo),
+`--repeticoes` vezes, e vale o menor tempo medido. Também lista quais
+dependências pesadas (pandas, numpy, fpdf, xlsxwriter, pyarrow, pypdf)
+ficaram carregadas depois da importação — o núcleo de extração
+(`validador_fiscal`) não deve carregar nenhuma delas.
+
+Uso::
+
+    python -m benchmarks.bench_importacao [--repeticoes 5] [modulo ...]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULOS = ('extrator', 'validador_fiscal', 'paralelo', 'exportacao', 'resumo', 'relatorio_pdf', 'app')
+PESADOS = ('pandas', 'numpy', 'fpdf', 'xlsxwriter', 'pyarrow', 'pypdf')
+
+_SONDA = '''
+import json, sys, time
+t0 = time.perf_counter()
+import {modulo}
+dt = time.perf_counter() - t0
+print(json.dumps({{'tempo': dt, 'pesados': [m for m in {pesados!r} if m in sys.modules]}}))
+'''
+
+
+def medir(modulo, repeticoes=5):
+    """(menor tempo em s, dependências pesadas carregadas) de `import modulo`."""
+    melhor, pesados = None, []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', _SONDA.format(modulo=modulo, pesados=PESADOS)],
+                               check=True, capture_output=True, text=True).stdout
+        m = json.loads(saida.splitlines()[-1])
+        if melhor is None or m['tempo'] < melhor:
+            melhor = m['tempo']
+        pesados = m['pesados']
+    return melhor, pesados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modulos', nargs='*', default=MODULOS)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'módulo':>18} {'import (ms)':>12}  dependências pesadas carregadas")
+    for modulo in args.modulos:
+        tempo, pesados = medir(modulo, args.repeticoes)
+        print(f"{modulo:>18} {tempo * 1000:>12.1f}  {', '.join(pesados) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark: memória por nota — dicionários aninhados x `modelo.Nota`.
+
+Extrai um lote sintético de NF-e e compara as duas representações das
+mesmas notas, como o armazenamento as devolve (desserializadas do JSON,
+com textos novos, não compartilhados com o lote de origem):
+
+- memória retida por nota (tracemalloc): a lista de dicionários do
+  formato antigo x a lista de `Nota` (slots + produtos em colunas);
+- bytes serializados por nota (JSON + zlib) no armazenamento;
+- bytes de pickle por nota (transferência entre processos do pool);
+- tempo de desserialização do resultado inteiro.
+
+Uso::
+
+    python -m benchmarks.bench_modelo [--notas 5000] [--itens 1 40]
+"""
+
+import argparse
+import gc
+import pickle
+import time
+import tracemalloc
+
+from armazenamento import desserializar, desserializar_notas, serializar, serializar_notas
+from benchmarks.gerador import gerar_corpus
+from validador_fiscal import ValidadorFiscal
+
+
+def _retido(construir):
+    # memória que o resultado de construir() mantém viva
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    valor = construir()
+    dt = time.perf_counter() - t0
+    gc.collect()
+    retido = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return valor, retido, dt
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notas', type=int, default=5000)
+    parser.add_argument('--itens', type=int, nargs=2, default=(1, 40), metavar=('MIN', 'MAX'))
+    args = parser.parse_args(argv)
+
+    v = ValidadorFiscal()
+    notas = [n for nome, xml in gerar_corpus(args.notas, itens=tuple(args.itens), fracao_cancelada=0)
+             for n in v.processar_arquivo(xml, 'NF-e').notas]
+    n_itens = sum(len(n.itens) for n in notas)
+    dicts = [n.como_dict() for n in notas]
+
+    bruto_antigo = serializar(dicts)
+    bruto_novo = serializar_notas(notas)
+    lidos_antigos, mem_antiga, t_antigo = _retido(lambda: desserializar(bruto_antigo))
+    lidos_novos, mem_nova, t_novo = _retido(lambda: desserializar_notas(bruto_novo))
+    assert lidos_novos == lidos_antigos
+    pickle_antigo = len(pickle.dumps(dicts, pickle.HIGHEST_PROTOCOL))
+    pickle_novo = len(pickle.dumps(notas, pickle.HIGHEST_PROTOCOL))
+
+    n = len(notas)
+    print(f'{n} notas, {n_itens} itens ({n_itens / n:.1f} por nota)')
+    print(f"{'':>24} {'dicts':>10} {'Nota':>10} {'redução':>8}")
+    for rotulo, antigo, novo in (('memória retida (B/nota)', mem_antiga / n, mem_nova / n),
+                                 ('armazenamento (B/nota)', len(bruto_antigo) / n, len(bruto_novo) / n),
+                                 ('pickle (B/nota)', pickle_antigo / n, pickle_novo / n),
+                                 ('desserializar (ms)', t_antigo * 1000, t_novo * 1000)):
+        print(f'{rotulo:>24} {antigo:>10.0f} {novo:>10.0f} {antigo / novo:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
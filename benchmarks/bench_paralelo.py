@@ -0,0 +1,70 @@
+"""Benchmark: escalabilidade de `paralelo.processar_lote` por número de processos.
+
+Gera um lote de notas (com uma fração de cancelamentos em arquivos
+separados) em um diretório temporário e processa o lote com 1, 2, 4 e 8
+processos, conferindo que todas as execuções produzem o mesmo resultado.
+
+Uso::
+
+    python -m benchmarks.bench_paralelo [--arquivos 2000] [--workers 1 2 4 8]
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+
+from benchmarks.gerador import gerar_evento, gerar_nfe
+from paralelo import encerrar_pool, obter_pool, processar_lote
+
+
+def preparar_lote(diretorio, n_notas, n_itens, fracao_cancelada=0.1):
+    caminhos = []
+    passo = max(1, round(1 / fracao_cancelada)) if fracao_cancelada else 0
+    for i in range(1, n_notas + 1):
+        xml = gerar_nfe(n_itens, numero=i)
+        caminho = os.path.join(diretorio, f'nfe_{i:06d}.xml')
+        with open(caminho, 'wb') as fh:
+            fh.write(xml)
+        caminhos.append(caminho)
+        if passo and i % passo == 0:
+            chave = re.search(rb'Id="NFe(\d{44})"', xml).group(1).decode()
+            caminho = os.path.join(diretorio, f'evento_{i:06d}.xml')
+            with open(caminho, 'wb') as fh:
+                fh.write(gerar_evento(chave))
+            caminhos.append(caminho)
+    return caminhos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--arquivos', type=int, default=2000, help='quantidade de notas')
+    parser.add_argument('--itens', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args(argv)
+
+    print(f'CPUs disponíveis: {len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()}')
+    with tempfile.TemporaryDirectory() as d:
+        caminhos = preparar_lote(d, args.arquivos, args.itens)
+        referencia = None
+        base = None
+        print(f"{'workers':>8} {'tempo (s)':>10} {'arquivos/s':>11} {'speedup':>8}")
+        for w in args.workers:
+            if w > 1:
+                obter_pool(w)  # criação do pool fora da medição
+            t0 = time.perf_counter()
+            resultados, _ = processar_lote(caminhos, 'NF-e', workers=w)
+            dt = time.perf_counter() - t0
+            notas = [n for r in resultados for n in r.notas]
+            if referencia is None:
+                referencia = notas
+                base = dt
+            elif notas != referencia:
+                raise SystemExit(f'Resultado divergente com {w} workers')
+            print(f'{w:>8} {dt:>10.2f} {len(caminhos) / dt:>11.0f} {base / dt:>7.2f}x')
+    encerrar_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Benchmark: relatório PDF em blocos paralelos.
+
+Gera o relatório de um lote sintético com `relatorio_pdf.gerar_pdf`
+usando 1, 2 e 4 processos e mostra o tempo total, notas/s e páginas.
+
+Uso::
+
+    python -m benchmarks.bench_pdf [--notas 10000] [--itens 20] [--workers 1 2 4]
+"""
+
+import argparse
+import tempfile
+import time
+
+from benchmarks.bench_excel import gerar_notas
+from paralelo import encerrar_pool, obter_pool
+from relatorio_pdf import gerar_pdf
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notas', type=int, default=10000)
+    parser.add_argument('--itens', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args(argv)
+
+    from pypdf import PdfReader
+    notas = list(gerar_notas(args.notas, args.itens))
+    print(f"{'workers':>8} {'blocos':>7} {'tempo (s)':>10} {'notas/s':>9} {'páginas':>8} {'MB':>6}")
+    for w in args.workers:
+        if w > 1:
+            obter_pool(w)  # criação do pool fora da medição
+        with tempfile.TemporaryFile() as fh:
+            t0 = time.perf_counter()
+            blocos = gerar_pdf(notas, fh, workers=w)
+            dt = time.perf_counter() - t0
+            tamanho = fh.tell()
+            fh.seek(0)
+            paginas = len(PdfReader(fh).pages)
+        print(f'{w:>8} {blocos:>7} {dt:>10.2f} {len(notas) / dt:>9.0f} {paginas:>8} {tamanho / 2**20:>6.1f}')
+    encerrar_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark: memória de pico do modo streaming x parse completo.
+
+Gera lotes com número crescente de notas em um único arquivo e mede,
+com tracemalloc, o pico de memória de `ValidadorFiscal.iterar_notas`
+(leitura incremental) e de `ET.parse` + `extrair_dados_xml` (árvore
+completa). No modo streaming o pico deve ficar estável.
+
+Uso::
+
+    python -m benchmarks.bench_streaming [--notas 100 1000 5000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from benchmarks.gerador import gerar_lote
+from validador_fiscal import ValidadorFiscal
+
+
+def _pico(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    resultado = fn()
+    dt = time.perf_counter() - t0
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return resultado, dt, pico
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notas', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--itens', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    v = ValidadorFiscal()
+    print(f"{'notas':>6} {'arquivo (MB)':>13} {'streaming pico (MB)':>20} {'árvore pico (MB)':>17} {'streaming (s)':>14}")
+    with tempfile.TemporaryDirectory() as d:
+        for n in args.notas:
+            caminho = os.path.join(d, f'lote_{n}.xml')
+            with open(caminho, 'wb') as fh:
+                fh.write(gerar_lote(n, args.itens))
+            qtd, dt, pico_stream = _pico(lambda: sum(1 for _ in v.iterar_notas(caminho, 'NF-e')))
+            _, _, pico_arvore = _pico(lambda: v.extrair_dados_xml(ET.parse(caminho).getroot(), 'NF-e'))
+            if qtd != n:
+                raise SystemExit(f'Esperadas {n} notas, obtidas {qtd}')
+            mb = 1024 * 1024
+            print(f"{n:>6} {os.path.getsize(caminho) / mb:>13.1f} {pico_stream / mb:>20.2f} "
+                  f"{pico_arvore / mb:>17.2f} {dt:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
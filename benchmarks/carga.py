@@ -0,0 +1,304 @@
+"""Teste de carga do servidor web: `/validate` e `/download` sob concorrência.
+
+Usuários virtuais (threads) enviam, em laço, lotes sintéticos
+(`gerador.gerar_corpus`) ao `/validate` (multipart, `resposta=resumo`,
+como a interface) e baixam a planilha do resultado em `/download/<id>`.
+Cada lote é pequeno (`--pequeno` arquivos) ou, com probabilidade
+`--fracao-grande`, grande (`--grande` arquivos); os corpos multipart são
+montados antes da medição. Para cada nível de concorrência a carga roda
+por `--duracao` segundos e são reportados, por rota e tamanho de lote, a
+latência p50/p95/p99 e máxima, e a vazão (uploads e arquivos por
+segundo). Separar os lotes pequenos mostra se eles esperam atrás dos
+grandes.
+
+Sem `--url`, um gunicorn local é iniciado em uma porta livre com os
+argumentos de `--gunicorn` (padrão: `-c gunicorn.conf.py`), com o cache
+de extração desligado e o spool em um diretório temporário. Para
+comparar com o worker sync de antes::
+
+    python -m benchmarks.carga --gunicorn "-c gunicorn.conf.py --worker-class sync --workers 1"
+
+Contra um servidor já no ar, desligue nele o cache de extração
+(VALIDADOR_CACHE=0); senão os lotes repetidos não são extraídos de novo.
+
+Uso::
+
+    python -m benchmarks.carga [--concorrencia 1 4 8] [--duracao 20]
+    python -m benchmarks.carga --url http://127.0.0.1:8000 --salvar carga.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+PEQUENO, GRANDE = 'pequeno', 'grande'
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def multipart(campos, arquivos):
+    """Corpo multipart/form-data.
+
+    Args:
+        campos (dict[str, str]): campos de texto.
+        arquivos (list[tuple[str, bytes]]): (nome, conteúdo) enviados em `files`.
+
+    Returns:
+        tuple[bytes, str]: corpo e Content-Type.
+    """
+    fronteira = uuid.uuid4().hex
+    partes = []
+    for nome, valor in campos.items():
+        partes.append(f'--{fronteira}\r\nContent-Disposition: form-data; name="{nome}"\r\n\r\n{valor}\r\n'.encode())
+    for nome, conteudo in arquivos:
+        partes.append(f'--{fronteira}\r\nContent-Disposition: form-data; name="files"; filename="{nome}"\r\n'
+                      f'Content-Type: application/xml\r\n\r\n'.encode())
+        partes.append(conteudo)
+        partes.append(b'\r\n')
+    partes.append(f'--{fronteira}--\r\n'.encode())
+    return b''.join(partes), f'multipart/form-data; boundary={fronteira}'
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) pelo posto mais próximo; None sem valores."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posto = max(1, -(-len(ordenados) * p // 100))
+    return ordenados[int(posto) - 1]
+
+
+def _lote(arquivos, semente):
+    # arquivos de NF-e de um corpus com alguns cancelamentos
+    from benchmarks.gerador import gerar_corpus
+    return list(gerar_corpus(arquivos, itens=(1, 20), fracao_cancelada=0.1, semente=semente))[:arquivos]
+
+
+class Cliente:
+    """Conexão HTTP (keep-alive) de um usuário virtual."""
+
+    def __init__(self, host, porta, timeout):
+        self._destino = (host, porta, timeout)
+        self._conexao = None
+
+    def pedir(self, metodo, caminho, corpo=None, cabecalhos=None):
+        """(status, corpo da resposta); refaz a conexão se o servidor a fechou."""
+        for tentativa in (1, 2):
+            if self._conexao is None:
+                host, porta, timeout = self._destino
+                self._conexao = http.client.HTTPConnection(host, porta, timeout=timeout)
+            try:
+                self._conexao.request(metodo, caminho, body=corpo, headers=cabecalhos or {})
+                resposta = self._conexao.getresponse()
+                dados = resposta.read()
+                if resposta.getheader('Connection', '').lower() == 'close':
+                    self.fechar()
+                return resposta.status, dados
+            except (ConnectionError, http.client.RemoteDisconnected, http.client.CannotSendRequest):
+                self.fechar()
+                if tentativa == 2:
+                    raise
+
+    def fechar(self):
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
+
+
+def _usuario(cliente, lotes, fracao_grande, sorteio, prazo, medidas, baixar):
+    # um usuário virtual: upload, download, até o prazo
+    while time.perf_counter() < prazo:
+        classe = GRANDE if sorteio.random() < fracao_grande else PEQUENO
+        corpo, tipo_conteudo, n_arquivos = sorteio.choice(lotes[classe])
+        t0 = time.perf_counter()
+        try:
+            status, dados = cliente.pedir('POST', '/validate', corpo, {'Content-Type': tipo_conteudo})
+        except OSError as e:
+            medidas.append(('validate', classe, time.perf_counter() - t0, type(e).__name__, 0))
+            continue
+        medidas.append(('validate', classe, time.perf_counter() - t0, status, n_arquivos))
+        if status != 200 or not baixar:
+            continue
+        key = json.loads(dados)['id']
+        t0 = time.perf_counter()
+        try:
+            status, _ = cliente.pedir('GET', f'/download/{key}')
+        except OSError as e:
+            status = type(e).__name__
+        medidas.append(('download', classe, time.perf_counter() - t0, status, n_arquivos))
+    cliente.fechar()
+
+
+def executar_nivel(host, porta, lotes, concorrencia, duracao, fracao_grande, semente=0, baixar=True, timeout=600):
+    """Roda a carga com `concorrencia` usuários por `duracao` segundos.
+
+    Returns:
+        dict: segundos, uploads, arquivos, erros, uploads_s, arquivos_s e
+            `rotas` ("rota/classe" -> n, erros e latências em ms).
+    """
+    medidas = []
+    inicio = time.perf_counter()
+    prazo = inicio + duracao
+    usuarios = [threading.Thread(target=_usuario, daemon=True,
+                                 args=(Cliente(host, porta, timeout), lotes, fracao_grande,
+                                       random.Random(semente * 1000 + i), prazo, medidas, baixar))
+                for i in range(concorrencia)]
+    for u in usuarios:
+        u.start()
+    for u in usuarios:
+        u.join()
+    segundos = time.perf_counter() - inicio
+
+    rotas = {}
+    for rota, classe, dt, status, _ in medidas:
+        r = rotas.setdefault(f'{rota}/{classe}', {'n': 0, 'erros': 0, 'tempos': []})
+        r['n'] += 1
+        if status == 200:
+            r['tempos'].append(dt * 1000)
+        else:
+            r['erros'] += 1
+    for r in rotas.values():
+        tempos = r.pop('tempos')
+        for p in (50, 95, 99):
+            r[f'p{p}_ms'] = _arredondar(percentil(tempos, p))
+        r['max_ms'] = _arredondar(max(tempos, default=None))
+    uploads = [m for m in medidas if m[0] == 'validate' and m[3] == 200]
+    arquivos = sum(m[4] for m in uploads)
+    return {'segundos': round(segundos, 3), 'uploads': len(uploads), 'arquivos': arquivos,
+            'erros': sum(r['erros'] for r in rotas.values()),
+            'uploads_s': round(len(uploads) / segundos, 2), 'arquivos_s': round(arquivos / segundos, 1),
+            'rotas': dict(sorted(rotas.items()))}
+
+
+def _arredondar(valor):
+    return None if valor is None else round(valor, 1)
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(argumentos, diretorio, espera=60):
+    """Inicia um gunicorn local (app:app) e espera ele responder.
+
+    Returns:
+        tuple[subprocess.Popen, int]: processo e porta.
+    """
+    porta = _porta_livre()
+    env = dict(os.environ, PORT=str(porta), VALIDADOR_CACHE='0', VALIDADOR_SPOOL_DIR=diretorio)
+    processo = subprocess.Popen([sys.executable, '-m', 'gunicorn', *shlex.split(argumentos),
+                                 '--bind', f'127.0.0.1:{porta}', 'app:app'], cwd=_RAIZ, env=env)
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise SystemExit(f'gunicorn terminou com o código {processo.returncode}')
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=2)
+            conexao.request('GET', '/metrics')
+            if conexao.getresponse().status == 200:
+                conexao.close()
+                return processo, porta
+        except OSError:
+            time.sleep(0.2)
+    parar_servidor(processo)
+    raise SystemExit(f'gunicorn não respondeu em {espera} s')
+
+
+def parar_servidor(processo):
+    processo.terminate()
+    try:
+        processo.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+        processo.wait()
+
+
+def _imprimir(concorrencia, m):
+    print(f"\nconcorrência {concorrencia}: {m['uploads']} uploads em {m['segundos']:.1f} s, "
+          f"{m['uploads_s']:.2f} uploads/s, {m['arquivos_s']:.0f} arquivos/s, {m['erros']} erros")
+    print(f"{'rota':>18} {'n':>5} {'erros':>5} {'p50 (ms)':>9} {'p95':>8} {'p99':>8} {'máx':>8}")
+    for nome, r in m['rotas'].items():
+        p50, p95, p99, maximo = (f"{r[c]:.0f}" if r[c] is not None else '-'
+                                 for c in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'))
+        print(f"{nome:>18} {r['n']:>5} {r['erros']:>5} {p50:>9} {p95:>8} {p99:>8} {maximo:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='servidor já no ar (padrão: inicia um gunicorn local)')
+    parser.add_argument('--gunicorn', default='-c gunicorn.conf.py', help='argumentos do gunicorn local')
+    parser.add_argument('--concorrencia', type=int, nargs='+', default=[1, 4, 8], help='usuários simultâneos')
+    parser.add_argument('--duracao', type=float, default=20, help='segundos por nível de concorrência')
+    parser.add_argument('--pequeno', type=int, default=2, help='arquivos de um lote pequeno')
+    parser.add_argument('--grande', type=int, default=300, help='arquivos de um lote grande')
+    parser.add_argument('--fracao-grande', type=float, default=0.2, help='probabilidade de um lote ser grande')
+    parser.add_argument('--variantes', type=int, default=4, help='lotes distintos de cada tamanho')
+    parser.add_argument('--sem-download', action='store_true', help='só o /validate')
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--salvar', metavar='ARQUIVO', help='grava os resultados em JSON')
+    args = parser.parse_args(argv)
+
+    lotes = {}
+    for classe, n in ((PEQUENO, args.pequeno), (GRANDE, args.grande)):
+        lotes[classe] = []
+        for v in range(args.variantes):
+            arquivos = _lote(n, args.semente * 100 + v + (0 if classe == PEQUENO else 50))
+            corpo, tipo_conteudo = multipart({'tipo': 'NF-e', 'resposta': 'resumo'}, arquivos)
+            lotes[classe].append((corpo, tipo_conteudo, len(arquivos)))
+
+    processo = None
+    with tempfile.TemporaryDirectory() as diretorio:
+        if args.url:
+            destino = urlsplit(args.url)
+            host, porta = destino.hostname, destino.port or 80
+        else:
+            processo, porta = iniciar_servidor(args.gunicorn, diretorio)
+            host = '127.0.0.1'
+        try:
+            # aquecimento: um lote de cada tamanho, fora da medição
+            cliente = Cliente(host, porta, 600)
+            for classe in (PEQUENO, GRANDE):
+                corpo, tipo_conteudo, _ = lotes[classe][0]
+                cliente.pedir('POST', '/validate', corpo, {'Content-Type': tipo_conteudo})
+            cliente.fechar()
+
+            niveis = {}
+            for c in args.concorrencia:
+                niveis[str(c)] = m = executar_nivel(host, porta, lotes, c, args.duracao, args.fracao_grande,
+                                                    args.semente, baixar=not args.sem_download)
+                _imprimir(c, m)
+        finally:
+            if processo is not None:
+                parar_servidor(processo)
+
+    if args.salvar:
+        documento = {
+            'meta': {'data': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                     'plataforma': platform.platform(), 'cpus': os.cpu_count(),
+                     'servidor': args.url or f'gunicorn {args.gunicorn}'},
+            'parametros': {'pequeno': args.pequeno, 'grande': args.grande, 'fracao_grande': args.fracao_grande,
+                           'variantes': args.variantes, 'duracao': args.duracao, 'download': not args.sem_download,
+                           'semente': args.semente},
+            'niveis': niveis,
+        }
+        with open(args.salvar, 'w', encoding='utf-8') as fh:
+            json.dump(documento, fh, indent=2, ensure_ascii=False)
+        print(f'resultados gravados em {args.salvar}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
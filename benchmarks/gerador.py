@@ -0,0 +1,264 @@
+"""Gerador de XMLs sintéticos de documentos fiscais para benchmarks.
+
+Produz, com os namespaces do portal fiscal:
+
+- NF-e (`nfeProc`, modelo 55) e NFC-e (modelo 65, com `infNFeSupl`),
+  com itens tributados (ICMS, IPI, PIS, COFINS) e protocolo;
+- CT-e (`cteProc`, modelo 57), com prestação, ICMS e as NF-e
+  transportadas em `infDoc`;
+- eventos (`procEventoNFe` / `procEventoCTe`): cancelamento e carta de
+  correção.
+
+`gerar_corpus` combina tudo em um corpus com quantidades, faixa de itens
+e frações de cancelamento configuráveis. Os valores são determinísticos
+a partir da semente informada. Para gravar um corpus em disco::
+
+    python -m benchmarks.gerador DIRETORIO [--nfe 1000] [--nfce 500] [--cte 100]
+"""
+
+import argparse
+import os
+import random
+
+NS_NFE = 'http://www.portalfiscal.inf.br/nfe'
+NS_CTE = 'http://www.portalfiscal.inf.br/cte'
+
+CNPJ_EMITENTE = '12345678000195'
+CNPJ_TRANSPORTADORA = '98765432000110'
+
+
+def gerar_chave(rng, cuf='35', aamm='2601', cnpj=CNPJ_EMITENTE, modelo='55', serie=1, numero=1):
+    """Monta uma chave de acesso de 44 dígitos (com DV mod 11)."""
+    base = f"{cuf}{aamm}{cnpj}{modelo}{serie:03d}{numero:09d}1{rng.randint(0, 99999999):08d}"
+    pesos = [2, 3, 4, 5, 6, 7, 8, 9]
+    soma = sum(int(d) * pesos[i % 8] for i, d in enumerate(reversed(base)))
+    resto = soma % 11
+    dv = 0 if resto < 2 else 11 - resto
+    return base + str(dv)
+
+
+def gerar_nfe(n_itens, numero=1, semente=0, modelo='55'):
+    """Gera o XML (bytes) de uma NF-e autorizada com `n_itens` produtos."""
+    return _nfe(n_itens, numero, semente, modelo)[1]
+
+
+def gerar_nfce(n_itens, numero=1, semente=0):
+    """Gera o XML (bytes) de uma NFC-e (modelo 65) autorizada."""
+    return _nfe(n_itens, numero, semente, '65')[1]
+
+
+def _nfe(n_itens, numero, semente, modelo):
+    # (chave, bytes) de uma NF-e/NFC-e
+    rng = random.Random(semente * 100003 + numero + (0 if modelo == '55' else 7919))
+    chave = gerar_chave(rng, modelo=modelo, numero=numero)
+    itens = []
+    total_prod = 0.0
+    total_icms = 0.0
+    for i in range(1, n_itens + 1):
+        qtd = rng.randint(1, 20)
+        unit = round(rng.uniform(1, 500), 2)
+        vprod = round(qtd * unit, 2)
+        vicms = round(vprod * 0.18, 2)
+        vipi = round(vprod * 0.05, 2)
+        vpis = round(vprod * 0.0165, 2)
+        vcofins = round(vprod * 0.076, 2)
+        total_prod += vprod
+        total_icms += vicms
+        itens.append(
+            f'<det nItem="{i}"><prod><cProd>P{i:05d}</cProd><cEAN>SEM GTIN</cEAN>'
+            f'<xProd>Produto sintetico {i}</xProd><NCM>84713012</NCM>'
+            f'<CFOP>{rng.choice(["5102", "5405", "6102", "6108"])}</CFOP><uCom>UN</uCom>'
+            f'<qCom>{qtd}.0000</qCom><vUnCom>{unit:.2f}</vUnCom><vProd>{vprod:.2f}</vProd>'
+            f'<indTot>1</indTot></prod>'
+            f'<imposto><vTotTrib>{vicms + vipi:.2f}</vTotTrib>'
+            f'<ICMS><ICMS00><orig>0</orig><CST>00</CST><vBC>{vprod:.2f}</vBC><pICMS>18.00</pICMS>'
+            f'<vICMS>{vicms:.2f}</vICMS></ICMS00></ICMS>'
+            f'<IPI><cEnq>999</cEnq><IPITrib><CST>50</CST><vIPI>{vipi:.2f}</vIPI></IPITrib></IPI>'
+            f'<PIS><PISAliq><CST>01</CST><vPIS>{vpis:.2f}</vPIS></PISAliq></PIS>'
+            f'<COFINS><COFINSAliq><CST>01</CST><vCOFINS>{vcofins:.2f}</vCOFINS></COFINSAliq></COFINS>'
+            f'</imposto></det>'
+        )
+    # NFC-e: venda presencial ao consumidor, sem frete
+    frete = round(rng.uniform(0, 80), 2) if modelo == '55' else 0.0
+    vnf = round(total_prod + frete, 2)
+    supl = (f'<infNFeSupl><qrCode>https://www.nfce.fazenda.sp.gov.br/qrcode?p={chave}|2|1|1|{vnf:.2f}</qrCode>'
+            f'<urlChave>https://www.nfce.fazenda.sp.gov.br/consulta</urlChave></infNFeSupl>'
+            if modelo == '65' else '')
+    xml = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<nfeProc xmlns="{NS_NFE}" versao="4.00"><NFe><infNFe Id="NFe{chave}" versao="4.00">'
+        f'<ide><cUF>35</cUF><natOp>Venda de mercadoria</natOp><mod>{modelo}</mod><serie>1</serie>'
+        f'<nNF>{numero}</nNF><dhEmi>2026-01-{rng.randint(1, 28):02d}T10:00:00-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>12345678000195</CNPJ><xNome>Emitente Sintetico LTDA</xNome></emit>'
+        f'{"".join(itens)}'
+        f'<total><ICMSTot><vICMS>{total_icms:.2f}</vICMS><vProd>{total_prod:.2f}</vProd>'
+        f'<vFrete>{frete:.2f}</vFrete><vNF>{vnf:.2f}</vNF></ICMSTot></total>'
+        f'</infNFe>{supl}</NFe>'
+        f'<protNFe versao="4.00"><infProt><chNFe>{chave}</chNFe><dhRecbto>2026-01-28T10:00:05-03:00</dhRecbto>'
+        f'<nProt>135260000000001</nProt><cStat>100</cStat><xMotivo>Autorizado o uso da NF-e</xMotivo></infProt></protNFe>'
+        f'</nfeProc>'
+    )
+    return chave, xml.encode('utf-8')
+
+
+def gerar_cte(numero=1, semente=0, chaves_nfe=()):
+    """Gera o XML (bytes) de um CT-e autorizado.
+
+    Args:
+        numero (int): nCT.
+        semente (int): semente dos valores.
+        chaves_nfe (iterable[str]): NF-e transportadas (em `infDoc`).
+    """
+    return _cte(numero, semente, chaves_nfe)[1]
+
+
+def _cte(numero, semente, chaves_nfe):
+    rng = random.Random(semente * 100003 + numero + 104729)
+    chave = gerar_chave(rng, cnpj=CNPJ_TRANSPORTADORA, modelo='57', numero=numero)
+    peso = round(rng.uniform(10, 900), 2)
+    frete_peso = round(peso * rng.uniform(0.8, 2.5), 2)
+    pedagio = round(rng.uniform(0, 40), 2)
+    vprest = round(frete_peso + pedagio, 2)
+    vicms = round(vprest * 0.12, 2)
+    docs = ''.join(f'<infNFe><chave>{c}</chave></infNFe>' for c in chaves_nfe)
+    xml = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<cteProc xmlns="{NS_CTE}" versao="4.00"><CTe><infCte Id="CTe{chave}" versao="4.00">'
+        f'<ide><cUF>35</cUF><CFOP>5353</CFOP><natOp>Prestacao de servico de transporte</natOp>'
+        f'<mod>57</mod><serie>1</serie><nCT>{numero}</nCT>'
+        f'<dhEmi>2026-01-{rng.randint(1, 28):02d}T14:00:00-03:00</dhEmi><tpCTe>0</tpCTe></ide>'
+        f'<emit><CNPJ>{CNPJ_TRANSPORTADORA}</CNPJ><xNome>Transportadora Sintetica LTDA</xNome></emit>'
+        f'<vPrest><vTPrest>{vprest:.2f}</vTPrest><vRec>{vprest:.2f}</vRec>'
+        f'<Comp><xNome>FRETE PESO</xNome><vComp>{frete_peso:.2f}</vComp></Comp>'
+        f'<Comp><xNome>PEDAGIO</xNome><vComp>{pedagio:.2f}</vComp></Comp></vPrest>'
+        f'<imp><ICMS><ICMS00><CST>00</CST><vBC>{vprest:.2f}</vBC><pICMS>12.00</pICMS>'
+        f'<vICMS>{vicms:.2f}</vICMS></ICMS00></ICMS><vTotTrib>{vicms:.2f}</vTotTrib></imp>'
+        f'<infCTeNorm><infCarga><vCarga>{round(peso * 35, 2):.2f}</vCarga><proPred>Diversos</proPred>'
+        f'<infQ><cUnid>01</cUnid><tpMed>PESO BRUTO</tpMed><qCarga>{peso:.4f}</qCarga></infQ></infCarga>'
+        f'<infDoc>{docs}</infDoc></infCTeNorm>'
+        f'</infCte></CTe>'
+        f'<protCTe versao="4.00"><infProt><chCTe>{chave}</chCTe><dhRecbto>2026-01-28T14:00:05-03:00</dhRecbto>'
+        f'<nProt>135260000000003</nProt><cStat>100</cStat><xMotivo>Autorizado o uso do CT-e</xMotivo></infProt></protCTe>'
+        f'</cteProc>'
+    )
+    return chave, xml.encode('utf-8')
+
+
+def gerar_lote(n_notas, n_itens, semente=0):
+    """Gera um arquivo-lote (bytes) com `n_notas` nfeProc sob uma raiz comum."""
+    partes = [b'<?xml version="1.0" encoding="UTF-8"?><lote>']
+    prefixo = b'<?xml version="1.0" encoding="UTF-8"?>'
+    for numero in range(1, n_notas + 1):
+        partes.append(gerar_nfe(n_itens, numero=numero, semente=semente)[len(prefixo):])
+    partes.append(b'</lote>')
+    return b''.join(partes)
+
+
+def gerar_evento(chave, tp_evento='110111', descricao='Cancelamento', n_seq=1, documento='nfe'):
+    """Gera o XML (bytes) de um evento para a chave informada.
+
+    `documento` 'nfe' gera um procEventoNFe; 'cte', um procEventoCTe.
+    """
+    if documento == 'cte':
+        return _evento_cte(chave, tp_evento, descricao, n_seq)
+    xml = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<procEventoNFe xmlns="{NS_NFE}" versao="1.00"><evento versao="1.00">'
+        f'<infEvento Id="ID{tp_evento}{chave}{n_seq:02d}"><cOrgao>35</cOrgao><tpAmb>1</tpAmb>'
+        f'<CNPJ>12345678000195</CNPJ><chNFe>{chave}</chNFe><dhEvento>2026-02-01T09:00:00-03:00</dhEvento>'
+        f'<tpEvento>{tp_evento}</tpEvento><nSeqEvento>{n_seq}</nSeqEvento><verEvento>1.00</verEvento>'
+        f'<detEvento versao="1.00"><descEvento>{descricao}</descEvento><nProt>135260000000001</nProt>'
+        f'<xJust>Erro na emissao da nota fiscal</xJust></detEvento></infEvento></evento>'
+        f'<retEvento versao="1.00"><infEvento><tpAmb>1</tpAmb><cStat>135</cStat>'
+        f'<xMotivo>Evento registrado e vinculado a NF-e</xMotivo><chNFe>{chave}</chNFe>'
+        f'<tpEvento>{tp_evento}</tpEvento><xEvento>{descricao}</xEvento><nSeqEvento>{n_seq}</nSeqEvento>'
+        f'<dhRegEvento>2026-02-01T09:00:05-03:00</dhRegEvento><nProt>135260000000002</nProt>'
+        f'</infEvento></retEvento></procEventoNFe>'
+    )
+    return xml.encode('utf-8')
+
+
+def _evento_cte(chave, tp_evento, descricao, n_seq):
+    xml = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<procEventoCTe xmlns="{NS_CTE}" versao="4.00"><eventoCTe versao="4.00">'
+        f'<infEvento Id="ID{tp_evento}{chave}{n_seq:03d}"><cOrgao>35</cOrgao><tpAmb>1</tpAmb>'
+        f'<CNPJ>{CNPJ_TRANSPORTADORA}</CNPJ><chCTe>{chave}</chCTe><dhEvento>2026-02-01T09:00:00-03:00</dhEvento>'
+        f'<tpEvento>{tp_evento}</tpEvento><nSeqEvento>{n_seq}</nSeqEvento>'
+        f'<detEvento versaoEvento="4.00"><evCancCTe><descEvento>{descricao}</descEvento>'
+        f'<nProt>135260000000003</nProt><xJust>Erro na emissao do conhecimento</xJust></evCancCTe></detEvento>'
+        f'</infEvento></eventoCTe>'
+        f'<retEventoCTe versao="4.00"><infEvento><tpAmb>1</tpAmb><cStat>135</cStat>'
+        f'<xMotivo>Evento registrado e vinculado ao CT-e</xMotivo><chCTe>{chave}</chCTe>'
+        f'<tpEvento>{tp_evento}</tpEvento><xEvento>{descricao}</xEvento><nSeqEvento>{n_seq}</nSeqEvento>'
+        f'<dhRegEvento>2026-02-01T09:00:05-03:00</dhRegEvento><nProt>135260000000004</nProt>'
+        f'</infEvento></retEventoCTe></procEventoCTe>'
+    )
+    return xml.encode('utf-8')
+
+
+def gerar_corpus(n_nfe=100, n_nfce=0, n_cte=0, itens=(1, 20), fracao_cancelada=0.1, fracao_cce=0.0, semente=0):
+    """Gera um corpus misto de documentos e eventos.
+
+    Cada documento pode receber, em um arquivo separado, um evento de
+    cancelamento (com probabilidade `fracao_cancelada`) e uma carta de
+    correção (`fracao_cce`, só NF-e). Cada CT-e transporta de 1 a 3 das
+    NF-e geradas.
+
+    Args:
+        n_nfe, n_nfce, n_cte (int): quantidade de cada tipo de documento.
+        itens (int|tuple[int, int]): itens por NF-e/NFC-e, fixo ou faixa.
+        fracao_cancelada (float): fração de documentos cancelados.
+        fracao_cce (float): fração de NF-e com carta de correção.
+        semente (int): semente de todo o corpus.
+
+    Yields:
+        tuple[str, bytes]: nome do arquivo e conteúdo, na ordem de geração.
+    """
+    rng = random.Random(semente)
+    minimo, maximo = (itens, itens) if isinstance(itens, int) else itens
+    chaves_nfe = []
+    for prefixo, quantidade, modelo in (('nfe', n_nfe, '55'), ('nfce', n_nfce, '65')):
+        for numero in range(1, quantidade + 1):
+            chave, xml = _nfe(rng.randint(minimo, maximo), numero, semente, modelo)
+            yield f'{prefixo}_{numero:06d}.xml', xml
+            if modelo == '55':
+                chaves_nfe.append(chave)
+                if rng.random() < fracao_cce:
+                    yield (f'cce_{prefixo}_{numero:06d}.xml',
+                           gerar_evento(chave, '110110', 'Carta de Correcao'))
+            if rng.random() < fracao_cancelada:
+                yield f'canc_{prefixo}_{numero:06d}.xml', gerar_evento(chave)
+    for numero in range(1, n_cte + 1):
+        transportadas = rng.sample(chaves_nfe, min(len(chaves_nfe), rng.randint(1, 3)))
+        chave, xml = _cte(numero, semente, transportadas)
+        yield f'cte_{numero:06d}.xml', xml
+        if rng.random() < fracao_cancelada:
+            yield f'canc_cte_{numero:06d}.xml', gerar_evento(chave, documento='cte')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Grava um corpus sintético de XMLs fiscais em um diretório.')
+    parser.add_argument('diretorio')
+    parser.add_argument('--nfe', type=int, default=1000)
+    parser.add_argument('--nfce', type=int, default=0)
+    parser.add_argument('--cte', type=int, default=0)
+    parser.add_argument('--itens', type=int, nargs=2, default=(1, 20), metavar=('MIN', 'MAX'))
+    parser.add_argument('--cancelados', type=float, default=0.1, help='fração de documentos cancelados')
+    parser.add_argument('--cce', type=float, default=0.0, help='fração de NF-e com carta de correção')
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.diretorio, exist_ok=True)
+    n, total = 0, 0
+    for nome, xml in gerar_corpus(args.nfe, args.nfce, args.cte, tuple(args.itens), args.cancelados,
+                                  args.cce, args.semente):
+        with open(os.path.join(args.diretorio, nome), 'wb') as fh:
+            fh.write(xml)
+        n += 1
+        total += len(xml)
+    print(f'{n} arquivos ({total / 1024 / 1024:.1f} MB) em {args.diretorio}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""Suíte de benchmarks reproduzível, com comparação contra uma linha de base.
+
+Cada caso roda em um subprocesso próprio, sobre um corpus sintético
+determinístico (`gerador.gerar_corpus`: NF-e, NFC-e, CT-e, cancelamentos
+e cartas de correção), e mede a vazão (melhor de N repetições) e o pico
+de RSS do processo (`ru_maxrss`; `base` é o pico logo antes da medição,
+depois de montar o corpus):
+
+- `extracao`: `ValidadorFiscal.processar_arquivo` em todos os arquivos;
+- `indice_eventos`: `build_events_index` sobre o corpus inteiro;
+- `validate`: POST `/validate` de ponta a ponta pelo cliente de teste do
+  Flask (armazenamento e eventos em memória, cache de extração desligado);
+- `excel_legado` e `excel_novo`: as duas exportações Excel de
+  `bench_excel`.
+
+Uso::
+
+    python -m benchmarks.suite [--casos extracao validate] [--repeticoes 3]
+    python -m benchmarks.suite --salvar benchmarks/baseline.json
+    python -m benchmarks.suite --comparar benchmarks/baseline.json [--tolerancia 0.10]
+
+Com `--comparar`, o código de saída é 1 se algum caso ficou mais lento
+(vazão) ou mais pesado (pico de RSS) que a linha de base além da
+tolerância. Compare só resultados da mesma máquina e dos mesmos
+parâmetros de corpus.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+CASOS = ('extracao', 'indice_eventos', 'validate', 'excel_legado', 'excel_novo')
+
+
+def _pico_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _corpus(args):
+    from benchmarks.gerador import gerar_corpus
+    return list(gerar_corpus(args.nfe, args.nfce, args.cte, tuple(args.itens), args.cancelados,
+                             args.cce, args.semente))
+
+
+def _gravar(diretorio, corpus):
+    caminhos = []
+    for nome, xml in corpus:
+        caminho = os.path.join(diretorio, nome)
+        with open(caminho, 'wb') as fh:
+            fh.write(xml)
+        caminhos.append(caminho)
+    return caminhos
+
+
+def _melhor(repeticoes, funcao):
+    melhor = None
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        unidades = funcao()
+        dt = time.perf_counter() - t0
+        melhor = dt if melhor is None else min(melhor, dt)
+    return unidades, melhor
+
+
+def _caso_extracao(args, diretorio):
+    from validador_fiscal import ValidadorFiscal
+    caminhos = _gravar(diretorio, _corpus(args))
+    v = ValidadorFiscal()
+
+    def rodar():
+        for c in caminhos:
+            v.processar_arquivo(c, 'NF-e')
+        return len(caminhos)
+
+    return 'arquivos', rodar
+
+
+def _caso_indice_eventos(args, diretorio):
+    from validador_fiscal import ValidadorFiscal
+    caminhos = _gravar(diretorio, _corpus(args))
+    v = ValidadorFiscal()
+
+    def rodar():
+        v.build_events_index(caminhos)
+        return len(caminhos)
+
+    return 'arquivos', rodar
+
+
+def _caso_validate(args, diretorio):
+    import io
+    os.environ.update({'VALIDADOR_STORE': 'memoria', 'VALIDADOR_EVENTOS': 'memoria', 'VALIDADOR_CACHE': '0',
+                       'VALIDADOR_WORKERS': '1', 'VALIDADOR_SPOOL_DIR': diretorio})
+    from app import app
+    corpus = _corpus(args)
+    cliente = app.test_client()
+
+    def rodar():
+        dados = {'tipo': 'NF-e', 'files': [(io.BytesIO(xml), nome) for nome, xml in corpus]}
+        resposta = cliente.post('/validate', data=dados, content_type='multipart/form-data')
+        if resposta.status_code != 200:
+            raise SystemExit(f'/validate respondeu {resposta.status_code}: {resposta.get_data(as_text=True)[:200]}')
+        return len(corpus)
+
+    return 'arquivos', rodar
+
+
+def _caso_excel(variante):
+    def preparar(args, diretorio):
+        from benchmarks.bench_excel import excel_legado, gerar_notas
+        from exportacao import escrever_excel
+        notas = list(gerar_notas(args.notas, args.itens_excel))
+
+        def rodar():
+            if variante == 'legado':
+                return excel_legado(notas)[1]
+            with tempfile.TemporaryFile(dir=diretorio) as fh:
+                return escrever_excel(iter(notas), fh)
+
+        return 'linhas', rodar
+    return preparar
+
+
+_PREPARAR = {
+    'extracao': _caso_extracao,
+    'indice_eventos': _caso_indice_eventos,
+    'validate': _caso_validate,
+    'excel_legado': _caso_excel('legado'),
+    'excel_novo': _caso_excel('novo'),
+}
+
+
+def executar_caso(nome, args):
+    """Roda um caso no processo atual e devolve as medidas (dict)."""
+    with tempfile.TemporaryDirectory() as diretorio:
+        unidade, rodar = _PREPARAR[nome](args, diretorio)
+        base = _pico_rss_mb()
+        unidades, segundos = _melhor(args.repeticoes, rodar)
+        pico = _pico_rss_mb()
+    return {'unidade': unidade, 'unidades': unidades, 'segundos': round(segundos, 6),
+            'vazao': round(unidades / segundos, 2), 'rss_base_mb': round(base, 1), 'rss_pico_mb': round(pico, 1)}
+
+
+def _parametros(args):
+    return {'nfe': args.nfe, 'nfce': args.nfce, 'cte': args.cte, 'itens': list(args.itens),
+            'cancelados': args.cancelados, 'cce': args.cce, 'semente': args.semente,
+            'notas': args.notas, 'itens_excel': args.itens_excel, 'repeticoes': args.repeticoes}
+
+
+def _argumentos_caso(args):
+    p = _parametros(args)
+    return ['--nfe', str(p['nfe']), '--nfce', str(p['nfce']), '--cte', str(p['cte']),
+            '--itens', *map(str, p['itens']), '--cancelados', str(p['cancelados']), '--cce', str(p['cce']),
+            '--semente', str(p['semente']), '--notas', str(p['notas']), '--itens-excel', str(p['itens_excel']),
+            '--repeticoes', str(p['repeticoes'])]
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(resultados, linha_base, tolerancia):
+    """Compara os resultados com a linha de base.
+
+    Returns:
+        list[tuple]: (caso, variação da vazão, variação do pico de RSS,
+            regrediu) para cada caso presente nas duas execuções.
+    """
+    comparacao = []
+    for nome, atual in resultados.items():
+        anterior = linha_base['casos'].get(nome)
+        if anterior is None:
+            continue
+        d_vazao = atual['vazao'] / anterior['vazao'] - 1
+        d_rss = atual['rss_pico_mb'] / anterior['rss_pico_mb'] - 1
+        comparacao.append((nome, d_vazao, d_rss, d_vazao < -tolerancia or d_rss > tolerancia))
+    return comparacao
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--casos', nargs='+', choices=CASOS, default=list(CASOS))
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--nfe', type=int, default=1500)
+    parser.add_argument('--nfce', type=int, default=400)
+    parser.add_argument('--cte', type=int, default=100)
+    parser.add_argument('--itens', type=int, nargs=2, default=(1, 20), metavar=('MIN', 'MAX'))
+    parser.add_argument('--cancelados', type=float, default=0.1)
+    parser.add_argument('--cce', type=float, default=0.05)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--notas', type=int, default=5000, help='notas dos casos Excel')
+    parser.add_argument('--itens-excel', type=int, default=20)
+    parser.add_argument('--salvar', metavar='ARQUIVO', help='grava os resultados como linha de base')
+    parser.add_argument('--comparar', metavar='ARQUIVO', help='compara com uma linha de base gravada')
+    parser.add_argument('--tolerancia', type=float, default=0.10, help='variação aceita (fração)')
+    parser.add_argument('--caso', choices=CASOS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.caso:
+        print(json.dumps(executar_caso(args.caso, args)))
+        return 0
+
+    linha_base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as fh:
+            linha_base = json.load(fh)
+        if linha_base.get('parametros') != _parametros(args):
+            print('aviso: parâmetros do corpus diferentes dos da linha de base', file=sys.stderr)
+
+    resultados = {}
+    print(f"{'caso':>15} {'unidades':>9} {'tempo (s)':>10} {'vazão (/s)':>11} {'RSS base':>9} {'RSS pico':>9}")
+    for nome in args.casos:
+        saida = subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--caso', nome, *_argumentos_caso(args)],
+                               check=True, capture_output=True, text=True).stdout
+        m = resultados[nome] = json.loads(saida.splitlines()[-1])
+        print(f"{nome:>15} {m['unidades']:>9} {m['segundos']:>10.3f} {m['vazao']:>11.0f} "
+              f"{m['rss_base_mb']:>9.1f} {m['rss_pico_mb']:>9.1f}")
+
+    if args.salvar:
+        documento = {
+            'meta': {'data': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                     'plataforma': platform.platform(), 'cpus': os.cpu_count(), 'commit': _commit()},
+            'parametros': _parametros(args),
+            'casos': resultados,
+        }
+        with open(args.salvar, 'w', encoding='utf-8') as fh:
+            json.dump(documento, fh, indent=2, ensure_ascii=False)
+        print(f'linha de base gravada em {args.salvar}')
+
+    if linha_base is not None:
+        comparacao = comparar(resultados, linha_base, args.tolerancia)
+        print(f"\n{'caso':>15} {'vazão':>8} {'RSS pico':>9}   (contra {linha_base['meta'].get('commit') or args.comparar})")
+        for nome, d_vazao, d_rss, regrediu in comparacao:
+            print(f"{nome:>15} {d_vazao:>+8.1%} {d_rss:>+9.1%}   {'REGRESSÃO' if regrediu else 'ok'}")
+        if any(r for *_, r in comparacao):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""cache_extracao
+==============
+
+Cache de resultados de extração endereçado por conteúdo.
+
+A chave de cada entrada é o SHA-256 dos bytes do arquivo XML combinado
+com a versão da extração (`extrator.VERSAO_EXTRACAO`) e o modo de
+leitura; reenviar o mesmo arquivo — ainda que com outro nome — pula o
+parse por completo. As entradas guardam apenas o que não depende do
+lote: as notas (sem status) e os registros de eventos do arquivo. O
+status das notas é sempre recalculado com o índice de eventos do lote
+atual, de modo que um cancelamento enviado depois continua valendo.
+
+As entradas ficam em disco (um arquivo por entrada, JSON compactado com
+zlib), gravadas de forma atômica, o que permite compartilhar o mesmo
+diretório entre processos do pool e workers do gunicorn. Quando o total
+passa de `max_bytes`, as entradas menos usadas recentemente (pela data
+de modificação, renovada a cada acerto) são descartadas.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import zlib
+
+from armazenamento import desserializar, diretorio_spool, serializar
+from eventos import RegistroEvento
+from extrator import VERSAO_EXTRACAO
+from modelo import como_nota
+
+MAX_BYTES_PADRAO = 512 * 1024 * 1024
+
+_BLOCO_LEITURA = 1024 * 1024
+_SUFIXO = '.json.z'
+
+# erros de uma entrada corrompida ou truncada (descompressão, JSON, formato)
+_ENTRADA_INVALIDA = (ValueError, zlib.error, KeyError, TypeError, IndexError)
+
+
+def hash_conteudo(fonte):
+    """SHA-256 (hex) de bytes ou do conteúdo de um arquivo, lido em blocos."""
+    if isinstance(fonte, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(fonte).hexdigest()
+    h = hashlib.sha256()
+    with open(fonte, 'rb') as fh:
+        for bloco in iter(lambda: fh.read(_BLOCO_LEITURA), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def empacotar_resultado(notas, eventos):
+    """Reduz notas e eventos de um arquivo ao formato guardado no cache.
+
+    Cada nota vira a sua lista posicional (`Nota.como_linha`).
+    """
+    return {
+        'notas': [como_nota(n).como_linha() for n in notas],
+        'eventos': [[r.chave, r.tp_evento, r.n_seq, r.dh_registro, r.status] for r in eventos],
+    }
+
+
+def desempacotar_resultado(entrada, tipo):
+    """Inverso de `empacotar_resultado`.
+
+    O Tipo guardado é o do documento (perfil de extração); `tipo` só
+    preenche notas guardadas sem Tipo. Entradas antigas, com as notas em
+    dicionários, também são aceitas.
+    """
+    notas = [como_nota(n) for n in entrada['notas']]
+    for dados in notas:
+        if not dados['Tipo']:
+            dados['Tipo'] = tipo
+    eventos = [RegistroEvento(*campos) for campos in entrada['eventos']]
+    return notas, eventos
+
+
+class CacheExtracao:
+    """Cache em disco de resultados de extração, com descarte LRU.
+
+    Args:
+        diretorio (str): diretório das entradas; criado se não existir.
+        max_bytes (int): tamanho máximo total das entradas.
+        versao (int): versão da extração embutida na chave.
+    """
+
+    def __init__(self, diretorio, max_bytes=MAX_BYTES_PADRAO, versao=VERSAO_EXTRACAO):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self.versao = versao
+        self.acertos = 0
+        self.falhas = 0
+        self.gravacoes = 0
+        self.descartes = 0
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+        self._bytes = sum(tamanho for _, _, tamanho in self._entradas())
+
+    def chave(self, digest, modo):
+        """Chave da entrada: hash do conteúdo + versão da extração + modo."""
+        return f'{digest}-v{self.versao}-{modo}'
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave[:2], chave + _SUFIXO)
+
+    def _entradas(self):
+        # (caminho, mtime, tamanho) de todas as entradas em disco
+        for sub in os.scandir(self.diretorio):
+            if not sub.is_dir():
+                continue
+            for ent in os.scandir(sub.path):
+                if ent.name.endswith(_SUFIXO):
+                    try:
+                        st = ent.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield ent.path, st.st_mtime, st.st_size
+
+    def obter(self, chave, desempacotar=None):
+        """Retorna a entrada guardada ou None, contabilizando acerto/falha.
+
+        Args:
+            chave (str): chave da entrada (`chave`).
+            desempacotar (callable, opcional): aplicado à entrada lida (ex.:
+                `desempacotar_resultado`); o retorno é o dele.
+
+        Uma entrada que não pode ser lida ou desempacotada (arquivo
+        corrompido ou truncado) conta como falha e é apagada.
+        """
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'rb') as fh:
+                dados = fh.read()
+        except OSError:
+            with self._lock:
+                self.falhas += 1
+            return None
+        try:
+            entrada = desserializar(dados)
+            if desempacotar is not None:
+                entrada = desempacotar(entrada)
+        except _ENTRADA_INVALIDA:
+            try:
+                os.unlink(caminho)
+            except OSError:
+                pass
+            with self._lock:
+                self.falhas += 1
+                self._bytes = max(0, self._bytes - len(dados))
+            return None
+        try:
+            os.utime(caminho)  # renova a entrada para o descarte LRU
+        except OSError:
+            pass
+        with self._lock:
+            self.acertos += 1
+        return entrada
+
+    def guardar(self, chave, entrada):
+        """Grava a entrada (de forma atômica) e descarta as antigas se preciso."""
+        dados = serializar(entrada)
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(dados)
+            os.replace(temp, caminho)
+        except OSError:
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self.gravacoes += 1
+            self._bytes += len(dados)
+            excedeu = self._bytes > self.max_bytes
+        if excedeu:
+            self.podar()
+
+    def podar(self, alvo=None):
+        """Remove as entradas menos usadas até o total ficar abaixo de `alvo`.
+
+        O padrão é 90% de `max_bytes`, para não podar a cada gravação.
+        """
+        alvo = self.max_bytes * 0.9 if alvo is None else alvo
+        with self._lock:
+            entradas = sorted(self._entradas(), key=lambda e: e[1])
+            total = sum(tamanho for _, _, tamanho in entradas)
+            for caminho, _, tamanho in entradas:
+                if total <= alvo:
+                    break
+                try:
+                    os.unlink(caminho)
+                except FileNotFoundError:
+                    pass
+                total -= tamanho
+                self.descartes += 1
+            self._bytes = total
+
+    def somar(self, acertos=0, falhas=0):
+        """Incorpora contadores de outro processo (ex.: do pool)."""
+        with self._lock:
+            self.acertos += acertos
+            self.falhas += falhas
+
+    def estatisticas(self):
+        """Contadores deste processo e ocupação estimada do diretório."""
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else 0.0,
+                'gravacoes': self.gravacoes,
+                'descartes': self.descartes,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'versao': self.versao,
+            }
+
+
+def criar_cache():
+    """Cria o cache de extração a partir das variáveis de ambiente.
+
+    - VALIDADOR_CACHE: '0' desativa o cache (retorna None);
+    - VALIDADOR_CACHE_DIR: diretório (padrão: cache/ no spool);
+    - VALIDADOR_CACHE_MAX_MB: tamanho máximo total.
+    """
+    if os.environ.get('VALIDADOR_CACHE', '1').lower() in ('0', 'false', 'nao', 'não'):
+        return None
+    diretorio = os.environ.get('VALIDADOR_CACHE_DIR') or os.path.join(diretorio_spool(), 'cache')
+    max_bytes = int(float(os.environ.get('VALIDADOR_CACHE_MAX_MB', MAX_BYTES_PADRAO / (1024 * 1024))) * 1024 * 1024)
+    return CacheExtracao(diretorio, max_bytes=max_bytes)
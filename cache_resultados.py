@@ -0,0 +1,70 @@
+"""cache_resultados
+================
+
+Cache LRU, por id de resultado, de estruturas montadas a partir das
+notas guardadas no armazenamento (`armazenamento`).
+
+Montar a estrutura (índice de páginas, DataFrames do resumo...) exige
+desserializar o resultado inteiro; o cache guarda a estrutura pronta dos
+resultados consultados por último. Cada entrada guarda a versão do
+resultado no armazenamento e só vale enquanto ela for a atual: um
+resultado expirado some do cache e um regravado (ex.: cancelamentos
+reconciliados em outro worker) é montado de novo.
+"""
+
+import threading
+from collections import OrderedDict
+
+# versão das entradas quando não há como consultar o armazenamento
+_SEM_VERSAO = object()
+
+
+class CacheVersionado:
+    """Cache LRU de `montar(notas)` por id de resultado, conferido pela versão.
+
+    Args:
+        max_itens (int): quantidade de resultados mantidos.
+        montar (callable): `montar(notas)` devolve a estrutura guardada.
+        versao (callable, opcional): `versao(key)` devolve a versão atual
+            do resultado no armazenamento (None se não existe mais),
+            conferida a cada acerto. Sem ela as entradas valem até saírem
+            do LRU.
+    """
+
+    def __init__(self, max_itens, montar, versao=None):
+        self.max_itens = max_itens
+        self._montar = montar
+        self._versao = versao
+        self._itens = OrderedDict()  # id -> (versão, estrutura)
+        self._lock = threading.Lock()
+
+    def obter(self, key, carregar):
+        """Estrutura do resultado `key`; `carregar()` devolve as notas (ou None) na falta."""
+        # a versão é lida antes das notas: uma gravação no meio invalida a entrada
+        versao = _SEM_VERSAO if self._versao is None else self._versao(key)
+        with self._lock:
+            item = self._itens.get(key)
+            if item is not None:
+                if item[0] == versao:
+                    self._itens.move_to_end(key)
+                    return item[1]
+                del self._itens[key]
+        if versao is None:
+            return None
+        notas = carregar()
+        if notas is None:
+            return None
+        estrutura = self._montar(notas)
+        with self._lock:
+            self._itens[key] = (versao, estrutura)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+        return estrutura
+
+    def __len__(self):
+        return len(self._itens)
+
+    def descartar(self, key):
+        """Remove o resultado do cache (ex.: quando as notas mudam)."""
+        with self._lock:
+            self._itens.pop(key, None)
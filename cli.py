@@ -0,0 +1,381 @@
+"""cli
+===
+
+Validação em lote pela linha de comando, sem a aplicação web.
+
+Percorre árvores de diretórios (e arquivos ZIP/tar) em busca de XMLs,
+extrai as notas no pool de processos de `paralelo`, monta o índice de
+eventos com os eventos da árvore inteira — um cancelamento em qualquer
+pasta vale para a nota de qualquer outra — e grava o resultado em XLSX,
+CSV, Parquet ou Arrow, conforme a extensão da saída.
+
+A varredura dos diretórios é feita por um pool de threads (um
+`os.scandir` por diretório). A execução é incremental: o resultado de
+cada arquivo (notas sem status e eventos) fica em um manifesto local,
+junto com o mtime e o tamanho do arquivo; na execução seguinte os
+arquivos que não mudaram são reaproveitados do manifesto sem nova
+leitura, e só os novos ou alterados passam pelo pool.
+
+Uso::
+
+    python -m cli ENTRADA [ENTRADA ...] -o saida.xlsx [--tipo NF-e] [--workers N]
+
+Sai com código 2 se alguma entrada não existe, e com 1 se houve erros,
+arquivos rejeitados ou ilegíveis, ou se nenhum arquivo foi encontrado.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from armazenamento import desserializar, serializar
+from cache_extracao import desempacotar_resultado, empacotar_resultado
+from compactados import SUFIXOS_TAR, ArquivoRejeitado, abrir_compactado, eh_compactado
+from eventos import IndiceEventos
+from extrator import VERSAO_EXTRACAO
+from integridade import verificar_lote
+from paralelo import processar_lote
+from validador_fiscal import ValidadorFiscal
+
+FORMATOS_SAIDA = ('xlsx', 'csv', 'parquet', 'arrow')
+SUFIXO_MANIFESTO = '.manifesto'
+
+_EXTENSOES = ('.xml', '.zip') + SUFIXOS_TAR
+
+
+def _listar_diretorio(diretorio):
+    # Executado nas threads da varredura: (arquivos, subdiretórios, erro)
+    arquivos, subdiretorios = [], []
+    try:
+        with os.scandir(diretorio) as entradas:
+            for e in entradas:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        subdiretorios.append(e.path)
+                    elif e.name.lower().endswith(_EXTENSOES) and not e.name.startswith('._') and e.is_file():
+                        st = e.stat()
+                        arquivos.append((os.path.abspath(e.path), st.st_mtime_ns, st.st_size))
+                except OSError:
+                    continue
+    except OSError as erro:
+        return arquivos, subdiretorios, f'{diretorio}: {erro.strerror or erro}'
+    return arquivos, subdiretorios, None
+
+
+def varrer(entradas, threads=8):
+    """Lista os XMLs e arquivos compactados das entradas.
+
+    Args:
+        entradas (iterable[str]): diretórios (percorridos recursivamente)
+            ou arquivos.
+        threads (int): diretórios lidos em paralelo.
+
+    Returns:
+        tuple[list, list[str]]: ``(caminho absoluto, mtime_ns, tamanho)``
+            ordenados pelo caminho, e os avisos de entradas ilegíveis.
+    """
+    encontrados, avisos, diretorios = {}, [], []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            diretorios.append(entrada)
+            continue
+        try:
+            st = os.stat(entrada)
+        except OSError as erro:
+            avisos.append(f'{entrada}: {erro.strerror or erro}')
+            continue
+        caminho = os.path.abspath(entrada)
+        encontrados[caminho] = (caminho, st.st_mtime_ns, st.st_size)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pendentes = {executor.submit(_listar_diretorio, d) for d in diretorios}
+        while pendentes:
+            prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                arquivos, subdiretorios, aviso = futuro.result()
+                for item in arquivos:
+                    encontrados[item[0]] = item
+                if aviso:
+                    avisos.append(aviso)
+                pendentes |= {executor.submit(_listar_diretorio, s) for s in subdiretorios}
+    return sorted(encontrados.values()), avisos
+
+
+class Manifesto:
+    """Resultados por arquivo da última execução, para reprocessar só o que mudou.
+
+    Cada entrada guarda o mtime (ns), o tamanho e o resultado do arquivo
+    — uma lista ``[origem, entrada empacotada]`` por XML (um só para um
+    XML avulso, um por membro para um compactado). O manifesto inteiro é
+    descartado se a versão da extração, o tipo ou o modo de leitura mudar.
+
+    Args:
+        caminho (str): arquivo do manifesto (JSON compactado com zlib).
+        tipo (str): tipo de nota da execução.
+        streaming (bool): modo de leitura da execução.
+    """
+
+    def __init__(self, caminho, tipo, streaming=False):
+        self.caminho = caminho
+        self.assinatura = [VERSAO_EXTRACAO, tipo, bool(streaming)]
+        self.arquivos = {}
+
+    def carregar(self):
+        """Lê o manifesto do disco; ausente, corrompido ou de outra versão vale vazio."""
+        try:
+            with open(self.caminho, 'rb') as fh:
+                dados = desserializar(fh.read())
+            if dados.get('assinatura') == self.assinatura:
+                self.arquivos = dados['arquivos']
+        except (OSError, ValueError, KeyError, AttributeError, zlib.error):
+            self.arquivos = {}
+        return self
+
+    def obter(self, caminho, mtime_ns, tamanho):
+        """Resultado guardado do arquivo, ou None se ele mudou ou é novo."""
+        entrada = self.arquivos.get(caminho)
+        if entrada is not None and entrada[0] == mtime_ns and entrada[1] == tamanho:
+            return entrada[2]
+        return None
+
+    def gravar(self, arquivos):
+        """Substitui o manifesto (de forma atômica) por `arquivos`."""
+        self.arquivos = arquivos
+        dados = serializar({'assinatura': self.assinatura, 'arquivos': arquivos})
+        diretorio = os.path.dirname(os.path.abspath(self.caminho))
+        fd, temp = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(dados)
+            os.replace(temp, self.caminho)
+        except OSError:
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            raise
+
+
+class Progresso:
+    """Linha de progresso (arquivos, notas, erros e vazão) no stderr.
+
+    Args:
+        ativo (bool): desligado, não escreve nada.
+        intervalo (float): segundos mínimos entre atualizações.
+    """
+
+    def __init__(self, ativo=True, intervalo=0.2):
+        self.ativo = ativo
+        self.intervalo = intervalo
+        self.inicio = time.perf_counter()
+        self._ultima = 0.0
+        self._linha = ''
+
+    def __call__(self, feitos, notas, erros):
+        agora = time.perf_counter()
+        if not self.ativo or agora - self._ultima < self.intervalo:
+            return
+        self._ultima = agora
+        decorrido = max(agora - self.inicio, 1e-9)
+        self._linha = (f'\r{feitos} XMLs  {notas} notas  {erros} erros  '
+                       f'{feitos / decorrido:.0f} XMLs/s  {notas / decorrido:.0f} notas/s')
+        sys.stderr.write(self._linha)
+        sys.stderr.flush()
+
+    def fim(self):
+        if self.ativo and self._linha:
+            sys.stderr.write('\n')
+
+
+def _fontes(arquivos, resultados, rejeitados):
+    # Caminhos (XML) e ConteudoXML (membros de compactados) na ordem dos
+    # arquivos; registra em `resultados[caminho]` a lista que vai receber
+    # os resultados de cada um, e em `donos` o arquivo de cada item
+    donos = []
+
+    def gerar():
+        for caminho, _, _ in arquivos:
+            if eh_compactado(caminho, caminho):
+                try:
+                    pacote = abrir_compactado(caminho)
+                except ArquivoRejeitado as erro:
+                    rejeitados.append(str(erro))
+                    continue
+                resultados[caminho] = []
+                with pacote:
+                    for membro in pacote:
+                        donos.append(caminho)
+                        yield membro
+            else:
+                resultados[caminho] = []
+                donos.append(caminho)
+                yield caminho
+
+    return gerar(), donos
+
+
+def validar_arvore(entradas, tipo='NF-e', workers=None, streaming=False, manifesto=None, ao_progresso=None):
+    """Valida todos os XMLs (e compactados) das entradas.
+
+    Args:
+        entradas (iterable[str]): diretórios e/ou arquivos.
+        tipo (str): tipo de nota (ex.: 'NF-e').
+        workers (int, opcional): processos do pool (ver `processar_lote`).
+        streaming (bool): leitura incremental de cada XML.
+        manifesto (Manifesto, opcional): resultados da execução anterior;
+            é regravado ao fim com os arquivos desta execução.
+        ao_progresso (callable, opcional): repassado a `processar_lote`.
+
+    Returns:
+        tuple[list[Nota], dict]: notas (com status, na ordem dos arquivos)
+            e o relatório da execução: contagens, erros, rejeitados e avisos.
+    """
+    arquivos, avisos = varrer(entradas)
+    guardados, novos = {}, []
+    for caminho, mtime_ns, tamanho in arquivos:
+        entrada = manifesto.obter(caminho, mtime_ns, tamanho) if manifesto is not None else None
+        if entrada is None:
+            novos.append((caminho, mtime_ns, tamanho))
+        else:
+            guardados[caminho] = [(origem, *desempacotar_resultado(pacote, tipo), None)
+                                  for origem, pacote in entrada]
+
+    processados, rejeitados = {}, []
+    if novos:
+        fontes, donos = _fontes(novos, processados, rejeitados)
+        total = None if any(eh_compactado(c, c) for c, _, _ in novos) else len(novos)
+        resultados, _ = processar_lote(fontes, tipo, workers=workers, streaming=streaming,
+                                       ao_progresso=ao_progresso, total=total)
+        for dono, r in zip(donos, resultados):
+            processados[dono].append((r.origem, r.notas, r.eventos, r.erro))
+
+    # índice da árvore inteira: eventos reaproveitados + eventos novos
+    indice = IndiceEventos()
+    for por_arquivo in (guardados, processados):
+        for itens in por_arquivo.values():
+            for _, _, eventos, _ in itens:
+                for registro in eventos:
+                    indice.adicionar(registro)
+
+    validador = ValidadorFiscal()
+    notas, erros, sem_numero, novo_manifesto = [], [], 0, {}
+    for caminho, mtime_ns, tamanho in arquivos:
+        itens = guardados[caminho] if caminho in guardados else processados.get(caminho)
+        if itens is None:
+            # compactado rejeitado
+            continue
+        falhou = False
+        for origem, notas_arquivo, _, erro in itens:
+            if erro:
+                falhou = True
+                fase, detalhe = erro
+                erros.append(f"{origem}: erro de {'parse' if fase == 'parse' else 'extração'}: "
+                             f"{detalhe.strip().splitlines()[-1]}")
+            for dados in validador.aplicar_status(notas_arquivo, indice):
+                if dados.get('Número') and dados.get('Número') != '0.00':
+                    notas.append(dados)
+                else:
+                    sem_numero += 1
+        if not falhou:
+            # arquivos com erro não entram: são tentados de novo na próxima execução
+            novo_manifesto[caminho] = [mtime_ns, tamanho, [[origem, empacotar_resultado(n, ev)]
+                                                           for origem, n, ev, _ in itens]]
+    if manifesto is not None:
+        manifesto.gravar(novo_manifesto)
+
+    relatorio = {
+        'arquivos': len(arquivos),
+        'reaproveitados': len(guardados),
+        'processados': len(novos) - len(rejeitados),
+        'xmls_processados': sum(len(v) for v in processados.values()),
+        'notas': len(notas),
+        'sem_numero': sem_numero,
+        'erros': erros,
+        'rejeitados': rejeitados,
+        'avisos': avisos,
+    }
+    return notas, relatorio
+
+
+def _formato_saida(caminho):
+    extensao = os.path.splitext(caminho)[1].lower().lstrip('.')
+    return extensao if extensao in FORMATOS_SAIDA else None
+
+
+def escrever_saida(notas, saida, tabela='notas', integridade=None):
+    """Grava as notas em `saida` no formato indicado pela extensão.
+
+    Na planilha, `integridade` (relatório de `verificar_lote`) vira a aba
+    "Integridade".
+
+    Returns:
+        int: linhas de dados escritas.
+    """
+    formato = _formato_saida(saida)
+    if formato == 'xlsx':
+        from exportacao import escrever_excel
+        return escrever_excel(notas, saida, integridade=integridade)
+    from exportacao import escrever_tabela
+    return escrever_tabela(notas, tabela, formato, saida)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m cli', description=__doc__.split('\n\n')[1].replace('\n', ' '))
+    parser.add_argument('entradas', nargs='+', help='diretórios, XMLs ou arquivos ZIP/tar')
+    parser.add_argument('-o', '--saida', required=True,
+                        help='arquivo de saída: .xlsx, .csv, .parquet ou .arrow')
+    parser.add_argument('--tipo', default='NF-e',
+                        help='tipo das notas sem raiz de documento conhecida (padrão: NF-e)')
+    parser.add_argument('--tabela', choices=['notas', 'itens', 'integridade'], default='notas',
+                        help='tabela exportada em CSV/Parquet/Arrow (padrão: notas)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='processos de extração (padrão: CPUs da máquina)')
+    parser.add_argument('--streaming', action='store_true', help='leitura incremental de cada XML')
+    parser.add_argument('--manifesto', help=f'manifesto incremental (padrão: SAIDA{SUFIXO_MANIFESTO})')
+    parser.add_argument('--completo', action='store_true',
+                        help='ignora o manifesto e reprocessa todos os arquivos')
+    parser.add_argument('-q', '--silencioso', action='store_true', help='sem linha de progresso')
+    args = parser.parse_args(argv)
+
+    if _formato_saida(args.saida) is None:
+        parser.error(f'extensão de saída não suportada: {args.saida} (use {", ".join(FORMATOS_SAIDA)})')
+    inexistentes = [e for e in args.entradas if not os.path.exists(e)]
+    if inexistentes:
+        parser.error(f'entrada não encontrada: {", ".join(inexistentes)}')
+
+    inicio = time.perf_counter()
+    manifesto = Manifesto(args.manifesto or args.saida + SUFIXO_MANIFESTO, args.tipo, args.streaming)
+    if not args.completo:
+        manifesto.carregar()
+    progresso = Progresso(ativo=not args.silencioso and sys.stderr.isatty())
+    try:
+        notas, rel = validar_arvore(args.entradas, args.tipo, workers=args.workers, streaming=args.streaming,
+                                    manifesto=manifesto, ao_progresso=progresso)
+    finally:
+        progresso.fim()
+    integ = verificar_lote(notas)
+    linhas = escrever_saida(notas, args.saida, args.tabela, integ)
+    decorrido = time.perf_counter() - inicio
+
+    for mensagem in rel['avisos'] + rel['rejeitados'] + rel['erros']:
+        print(mensagem, file=sys.stderr)
+    print(f"{rel['arquivos']} arquivos ({rel['processados']} processados, {rel['reaproveitados']} sem alteração), "
+          f"{rel['notas']} notas, {len(rel['erros']) + len(rel['rejeitados'])} erros em {decorrido:.2f}s "
+          f"({rel['xmls_processados'] / decorrido:.0f} XMLs/s processados)", file=sys.stderr)
+    r = integ['resumo']
+    print(f"integridade: {r['chaves_invalidas']} chaves inválidas, {r['chaves_duplicadas']} chaves repetidas, "
+          f"{r['numeros_duplicados']} números repetidos, {r['lacunas']} lacunas ({r['numeros_faltando']} números)",
+          file=sys.stderr)
+    print(f'{linhas} linhas gravadas em {args.saida}', file=sys.stderr)
+    if not rel['arquivos']:
+        print('nenhum XML ou arquivo compactado encontrado nas entradas', file=sys.stderr)
+    return 1 if rel['erros'] or rel['rejeitados'] or rel['avisos'] or not rel['arquivos'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""compactados
+===========
+
+Leitura de arquivos compactados (ZIP e tar) com XMLs fiscais.
+
+Os membros são lidos diretamente do arquivo compactado para a memória e
+entregues ao parser um a um, como `ConteudoXML`; nada é extraído para
+disco. Antes de qualquer leitura o índice do arquivo é conferido contra
+os limites configurados — quantidade de membros, tamanho total
+descompactado e razão de compressão (por membro e no total) — para
+recusar arquivos abusivos (zip bombs) logo na entrada. No tar, que não
+tem índice central, os cabeçalhos são lidos um a um e conferidos antes
+de o fluxo avançar sobre os dados do membro: um tar.gz abusivo é
+recusado sem ser descompactado até o fim.
+
+Limites (variáveis de ambiente):
+
+- VALIDADOR_ARQ_MAX_MEMBROS: membros por arquivo (padrão 100000);
+- VALIDADOR_ARQ_MAX_MB: tamanho total descompactado (padrão 2048);
+- VALIDADOR_ARQ_MAX_RAZAO: razão descompactado/compactado (padrão 200).
+"""
+
+import os
+import tarfile
+import zipfile
+
+from validador_fiscal import ConteudoXML
+
+SUFIXOS_TAR = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# membros pequenos comprimem muito bem sem serem abusivos
+_RAZAO_TAMANHO_MINIMO = 64 * 1024
+
+
+class ArquivoRejeitado(ValueError):
+    """Arquivo compactado inválido ou fora dos limites configurados."""
+
+
+class LimitesCompactado:
+    """Limites aplicados a cada arquivo compactado.
+
+    Args:
+        max_membros (int): quantidade máxima de membros (arquivos).
+        max_bytes (int): soma máxima dos tamanhos descompactados.
+        max_razao (float): razão máxima descompactado/compactado.
+    """
+
+    __slots__ = ('max_membros', 'max_bytes', 'max_razao')
+
+    def __init__(self, max_membros=100000, max_bytes=2048 * 1024 * 1024, max_razao=200.0):
+        self.max_membros = max_membros
+        self.max_bytes = max_bytes
+        self.max_razao = max_razao
+
+
+def limites_configurados():
+    """Limites definidos nas variáveis VALIDADOR_ARQ_*."""
+    padrao = LimitesCompactado()
+    return LimitesCompactado(
+        max_membros=int(os.environ.get('VALIDADOR_ARQ_MAX_MEMBROS', padrao.max_membros)),
+        max_bytes=int(float(os.environ.get('VALIDADOR_ARQ_MAX_MB', padrao.max_bytes / (1024 * 1024))) * 1024 * 1024),
+        max_razao=float(os.environ.get('VALIDADOR_ARQ_MAX_RAZAO', padrao.max_razao)),
+    )
+
+
+def _tamanho_fonte(fonte):
+    if isinstance(fonte, str):
+        return os.path.getsize(fonte)
+    pos = fonte.tell()
+    fim = fonte.seek(0, os.SEEK_END)
+    fonte.seek(pos)
+    return fim
+
+
+def eh_compactado(nome, fonte=None):
+    """Indica se o upload/arquivo é um ZIP ou tar (pela extensão ou assinatura)."""
+    nome = (nome or '').lower()
+    if nome.endswith('.zip') or nome.endswith(SUFIXOS_TAR):
+        return True
+    if nome.endswith('.xml') or fonte is None:
+        return False
+    try:
+        return zipfile.is_zipfile(fonte)
+    finally:
+        if not isinstance(fonte, str):
+            fonte.seek(0)
+
+
+def _eh_xml(nome):
+    base = nome.rsplit('/', 1)[-1]
+    return nome.lower().endswith('.xml') and not base.startswith('._') and '__MACOSX/' not in nome
+
+
+class PacoteXML:
+    """Arquivo compactado aberto e validado; itera os XMLs como `ConteudoXML`.
+
+    Use `abrir_compactado` para criar. `len(pacote)` é a quantidade de
+    membros XML; a iteração lê cada membro do arquivo compactado apenas
+    quando ele é consumido.
+
+    Args:
+        nome (str): nome do arquivo (prefixo da origem de cada membro).
+        abrir_membro (callable): membro -> bytes.
+        nomes (list[str]): nomes dos membros XML, na ordem do arquivo
+            (podem se repetir).
+        fechar (callable): libera o arquivo subjacente.
+        membros (list, opcional): o que `abrir_membro` recebe para cada
+            nome (ex.: `ZipInfo`/`TarInfo`, que distinguem membros de
+            mesmo nome); padrão: os próprios nomes.
+    """
+
+    def __init__(self, nome, abrir_membro, nomes, fechar, membros=None):
+        self.nome = nome
+        self.nomes = nomes
+        self._membros = nomes if membros is None else membros
+        self._abrir_membro = abrir_membro
+        self._fechar = fechar
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def __iter__(self):
+        for nome_membro, membro in zip(self.nomes, self._membros):
+            yield ConteudoXML(f'{self.nome}:{nome_membro}', self._abrir_membro(membro))
+
+    def close(self):
+        self._fechar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Conferencia:
+    # limites conferidos membro a membro, à medida que o índice é lido
+
+    def __init__(self, nome, tamanho_arquivo, limites):
+        self.nome = nome
+        self.tamanho_arquivo = tamanho_arquivo
+        self.limites = limites
+        self.membros = 0
+        self.total = 0
+
+    def membro(self, membro, tamanho, compactado=None):
+        nome, limites = self.nome, self.limites
+        self.membros += 1
+        if self.membros > limites.max_membros:
+            raise ArquivoRejeitado(f'{nome}: mais de {limites.max_membros} membros (limite {limites.max_membros})')
+        if (compactado is not None and tamanho > _RAZAO_TAMANHO_MINIMO
+                and tamanho > limites.max_razao * max(compactado, 1)):
+            raise ArquivoRejeitado(f'{nome}: razão de compressão suspeita em {membro}')
+        self.total += tamanho
+        if self.total > limites.max_bytes:
+            raise ArquivoRejeitado(f'{nome}: mais de {limites.max_bytes} bytes descompactados '
+                                   f'(limite {limites.max_bytes})')
+        if self.total > _RAZAO_TAMANHO_MINIMO and self.total > limites.max_razao * max(self.tamanho_arquivo, 1):
+            raise ArquivoRejeitado(f'{nome}: razão de compressão suspeita')
+
+
+def abrir_compactado(fonte, nome=None, limites=None):
+    """Abre um ZIP ou tar e confere os limites antes de ler qualquer membro.
+
+    Args:
+        fonte (str|file-like): caminho ou arquivo binário com suporte a
+            `seek` (ex.: o stream de um upload).
+        nome (str, opcional): nome usado na origem dos membros; padrão é
+            o próprio caminho.
+        limites (LimitesCompactado, opcional): padrão `limites_configurados()`.
+
+    Returns:
+        PacoteXML: membros XML prontos para o processamento em lote.
+
+    Raises:
+        ArquivoRejeitado: arquivo corrompido, de formato desconhecido ou
+            fora dos limites.
+    """
+    limites = limites or limites_configurados()
+    nome = nome or (fonte if isinstance(fonte, str) else 'arquivo')
+    tamanho_arquivo = _tamanho_fonte(fonte)
+
+    if not isinstance(fonte, str):
+        fonte.seek(0)
+    if zipfile.is_zipfile(fonte):
+        if not isinstance(fonte, str):
+            fonte.seek(0)
+        try:
+            zf = zipfile.ZipFile(fonte)
+        except zipfile.BadZipFile as e:
+            raise ArquivoRejeitado(f'{nome}: ZIP inválido ({e})') from None
+        infos = [i for i in zf.infolist() if not i.is_dir()]
+        conferencia = _Conferencia(nome, tamanho_arquivo, limites)
+        try:
+            for i in infos:
+                conferencia.membro(i.filename, i.file_size, i.compress_size)
+        except ArquivoRejeitado:
+            zf.close()
+            raise
+        # zipfile nunca devolve mais que file_size bytes por membro
+        xmls = [i for i in infos if _eh_xml(i.filename)]
+        return PacoteXML(nome, zf.read, [i.filename for i in xmls], zf.close, xmls)
+
+    if not isinstance(fonte, str):
+        fonte.seek(0)
+    try:
+        if isinstance(fonte, str):
+            tf = tarfile.open(fonte, mode='r:*')
+        else:
+            tf = tarfile.open(fileobj=fonte, mode='r:*')
+    except (tarfile.TarError, EOFError, OSError):
+        raise ArquivoRejeitado(f'{nome}: arquivo compactado inválido ou corrompido') from None
+    # cada cabeçalho é conferido antes de `next()` avançar (e descompactar)
+    # sobre os dados do membro; no tar a compressão é do fluxo inteiro, e só
+    # a razão total se aplica
+    conferencia = _Conferencia(nome, tamanho_arquivo, limites)
+    xmls = []
+    try:
+        while True:
+            try:
+                membro = tf.next()
+            except (tarfile.TarError, EOFError, OSError):
+                raise ArquivoRejeitado(f'{nome}: arquivo compactado inválido ou corrompido') from None
+            if membro is None:
+                break
+            # todo cabeçalho conta: o tarfile guarda cada um na memória
+            conferencia.membro(membro.name, membro.size if membro.isfile() else 0)
+            if membro.isfile() and _eh_xml(membro.name):
+                xmls.append(membro)
+    except ArquivoRejeitado:
+        tf.close()
+        raise
+
+    def ler(membro):
+        with tf.extractfile(membro) as fh:
+            return fh.read()
+
+    return PacoteXML(nome, ler, [m.name for m in xmls], tf.close, xmls)
@@ -0,0 +1,155 @@
+"""eventos
+=======
+
+Índice compacto de eventos fiscais (cancelamento, carta de correção...).
+
+Cada evento é reduzido, no momento da indexação, a um `RegistroEvento`
+com poucos campos e o status já decidido; nenhuma árvore XML fica
+retida depois disso. O `IndiceEventos` mantém os registros por chave de
+acesso e o conjunto de chaves canceladas, de modo que consultar o status
+de uma nota é uma única operação em conjunto/dicionário.
+"""
+
+from extrator import nome_local
+
+AUTORIZADA = 'Autorizada'
+CANCELADO = 'Cancelado'
+
+TP_CANCELAMENTO = '110111'
+
+# tags com a chave do documento do evento (NF-e/NFC-e, CT-e e MDF-e), em minúsculas
+TAGS_CHAVE_EVENTO = frozenset(('chnfe', 'chcte', 'chmdfe'))
+
+
+def texto_indica_cancelamento(texto):
+    """Indica se um texto (já em minúsculas) descreve um cancelamento."""
+    return 'cancel' in texto or TP_CANCELAMENTO in texto
+
+
+def decidir_status(tp_evento, x_evento=None, cancelamento_no_texto=False):
+    """Status que um evento impõe à nota (mesmas regras do validador).
+
+    Cancelado quando o tipo é 110111, quando xEvento menciona cancelamento
+    ou quando o conteúdo textual do evento o faz; caso contrário, o evento
+    não altera o status da nota.
+    """
+    if tp_evento and str(tp_evento).strip() == TP_CANCELAMENTO:
+        return CANCELADO
+    if x_evento and texto_indica_cancelamento(str(x_evento).lower()):
+        return CANCELADO
+    if cancelamento_no_texto:
+        return CANCELADO
+    return AUTORIZADA
+
+
+class RegistroEvento:
+    """Evento reduzido aos campos necessários para decidir o status.
+
+    Atributos:
+        chave (str): chave de acesso do documento (chNFe, chCTe ou chMDFe).
+        tp_evento (str|None): código do tipo de evento (ex.: '110111').
+        n_seq (str|None): nSeqEvento.
+        dh_registro (str|None): data/hora do protocolo (dhRegEvento, ou
+            dhEvento na falta dele).
+        status (str): status decidido ('Cancelado' ou 'Autorizada').
+    """
+
+    __slots__ = ('chave', 'tp_evento', 'n_seq', 'dh_registro', 'status')
+
+    def __init__(self, chave, tp_evento=None, n_seq=None, dh_registro=None, status=AUTORIZADA):
+        self.chave = chave
+        self.tp_evento = tp_evento
+        self.n_seq = n_seq
+        self.dh_registro = dh_registro
+        self.status = status
+
+    def __repr__(self):
+        return (f'RegistroEvento({self.chave!r}, tp_evento={self.tp_evento!r}, '
+                f'n_seq={self.n_seq!r}, dh_registro={self.dh_registro!r}, status={self.status!r})')
+
+
+class LeitorEvento:
+    """Acumula os campos de um evento à medida que os elementos chegam."""
+
+    __slots__ = ('chave', 'tp_evento', 'x_evento', 'n_seq', 'dh_registro', 'dh_evento', 'cancelamento')
+
+    def __init__(self):
+        self.chave = None
+        self.tp_evento = None
+        self.x_evento = None
+        self.n_seq = None
+        self.dh_registro = None
+        self.dh_evento = None
+        self.cancelamento = False
+
+    def ler(self, nome, texto):
+        # num procEvento* o evento vem antes do retEvento: chave, tipo,
+        # sequência e data do evento valem na primeira ocorrência (a do
+        # evento); xEvento e dhRegEvento vêm do retEvento
+        if not texto:
+            return
+        if nome in TAGS_CHAVE_EVENTO:
+            self.chave = self.chave or texto.strip()
+        elif nome == 'tpevento':
+            self.tp_evento = self.tp_evento or texto.strip()
+        elif nome == 'xevento':
+            self.x_evento = texto.strip()
+        elif nome == 'nseqevento':
+            self.n_seq = self.n_seq or texto.strip()
+        elif nome == 'dhregevento':
+            self.dh_registro = texto.strip()
+        elif nome == 'dhevento':
+            self.dh_evento = self.dh_evento or texto.strip()
+        if not self.cancelamento and texto_indica_cancelamento(texto.lower()):
+            self.cancelamento = True
+
+    def registro(self):
+        if not self.chave:
+            return None
+        status = decidir_status(self.tp_evento, self.x_evento, self.cancelamento)
+        return RegistroEvento(self.chave, self.tp_evento, self.n_seq,
+                              self.dh_registro or self.dh_evento, status)
+
+
+def registro_de_arvore(root):
+    """Reduz um documento de evento (árvore) a um `RegistroEvento`.
+
+    Returns:
+        RegistroEvento|None: None quando o documento não tem a chave
+            (chNFe, chCTe ou chMDFe).
+    """
+    leitor = LeitorEvento()
+    for el in root.iter():
+        leitor.ler(nome_local(el.tag), el.text)
+    return leitor.registro()
+
+
+class IndiceEventos(dict):
+    """Índice chave de acesso -> lista de `RegistroEvento`.
+
+    Continua sendo um dicionário (compatível com `events_index.get(chave)`),
+    mas guarda também o conjunto de chaves canceladas, de modo que
+    `status(chave)` é O(1).
+    """
+
+    def __init__(self, registros=()):
+        super().__init__()
+        self._cancelados = set()
+        for reg in registros:
+            self.adicionar(reg)
+
+    def adicionar(self, registro):
+        self.setdefault(registro.chave, []).append(registro)
+        if registro.status == CANCELADO:
+            self._cancelados.add(registro.chave)
+
+    def mesclar(self, outro):
+        """Incorpora os registros de outro índice (ex.: de outro processo)."""
+        for registros in outro.values():
+            for reg in registros:
+                self.adicionar(reg)
+        return self
+
+    def status(self, chave):
+        """Status da nota com a chave informada ('Autorizada' se não houver evento)."""
+        return CANCELADO if chave in self._cancelados else AUTORIZADA
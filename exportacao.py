@@ -0,0 +1,251 @@
+"""exportacao
+==========
+
+Motor de exportação das notas extraídas, compartilhado pela aplicação web
+(`/download`) e por `ValidadorFiscal.exportar_excel`.
+
+A planilha é escrita linha a linha diretamente a partir do iterável de
+notas, com o modo `constant_memory` do xlsxwriter: cada linha é gravada
+em disco assim que a seguinte começa, sem lista intermediária de linhas
+e sem manter a planilha inteira na memória. O total das notas
+autorizadas é acumulado na mesma passagem.
+
+As bibliotecas pesadas (xlsxwriter, pandas, pyarrow) só são importadas
+dentro das funções que as usam: importar este módulo é barato.
+
+Para análise (BI), as mesmas notas podem ser exportadas em tabelas
+normalizadas — `notas` (uma linha por nota), `itens` (uma linha por
+produto, ligada à nota pela Chave) e `integridade` (uma linha por
+ocorrência de `integridade.verificar_lote`) — em Parquet, Arrow IPC ou
+CSV. As tabelas são montadas em lotes de `LOTE_PADRAO` linhas (um
+DataFrame por lote) e cada lote é gravado assim que fica pronto: um row
+group no Parquet, um record batch no Arrow e um bloco de linhas no CSV.
+"""
+
+COLUNAS_EXCEL = ['Tipo', 'Data', 'Número', 'Natureza de Operação', 'Status', 'Frete', 'Impostos', 'Total',
+                 'Código Produto', 'Produto', 'CFOP', 'Valor Produto', 'Imposto Produto']
+
+LARGURAS_EXCEL = [(0, 2, 12), (3, 3, 30), (4, 7, 12), (8, 8, 14), (9, 9, 40), (10, 10, 10), (11, 12, 14)]
+
+COLUNAS_INTEGRIDADE_EXCEL = ['Ocorrência', 'Chave', 'CNPJ emitente', 'Modelo', 'Série', 'Número inicial',
+                             'Número final', 'Quantidade', 'Notas (posições)', 'Detalhe']
+
+# Opções de agrupamento (outline): produtos ocultos sob a linha da nota
+_LINHA_NOTA = {'level': 0, 'collapsed': True}
+_LINHA_PRODUTO = {'level': 1, 'hidden': True}
+
+
+def escrever_excel(notas, destino, nome_planilha='Notas', integridade=None):
+    """Escreve as notas (e seus produtos) em uma planilha .xlsx.
+
+    Uma linha por nota e, abaixo dela, uma linha por produto agrupada
+    (nível 1, oculta); ao fim, o total das notas não canceladas. Com
+    `integridade`, uma segunda aba lista as ocorrências do lote.
+
+    Args:
+        notas (iterable[dict]): notas no formato de `extrair_dados_xml`;
+            pode ser um gerador, consumido uma única vez.
+        destino (str|file-like): caminho ou arquivo binário com `seek`.
+        nome_planilha (str): nome da aba.
+        integridade (dict, opcional): relatório de
+            `integridade.verificar_lote` para a aba "Integridade".
+
+    Returns:
+        int: quantidade de linhas de dados escritas (notas + produtos).
+    """
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(destino, {'constant_memory': True})
+    try:
+        ws = workbook.add_worksheet(nome_planilha)
+        header_format = workbook.add_format({'bold': True, 'bg_color': '#DCE6F1'})
+        money_fmt = workbook.add_format({'num_format': '#,##0.00'})
+        for primeira, ultima, largura in LARGURAS_EXCEL:
+            ws.set_column(primeira, ultima, largura)
+
+        write_string = ws.write_string
+        write_number = ws.write_number
+        set_row = ws.set_row
+
+        for c, h in enumerate(COLUNAS_EXCEL):
+            write_string(0, c, h, header_format)
+
+        linha = 1
+        total_autorizadas = 0.0
+        for nota in notas:
+            # no modo constant_memory as opções da linha vêm antes das células
+            set_row(linha, None, None, _LINHA_NOTA)
+            write_string(linha, 0, str(nota.get('Tipo', '')))
+            write_string(linha, 1, str(nota.get('Data', '')))
+            write_string(linha, 2, str(nota.get('Número', '')))
+            write_string(linha, 3, str(nota.get('Natureza', '')))
+            write_string(linha, 4, str(nota.get('Status', '')))
+            write_number(linha, 5, float(nota.get('Frete (R$)', 0.0)), money_fmt)
+            write_number(linha, 6, float(nota.get('Impostos (R$)', 0.0)), money_fmt)
+            total = float(nota.get('Total (R$)', 0.0))
+            write_number(linha, 7, total, money_fmt)
+            if nota.get('Status') != 'Cancelado':
+                total_autorizadas += total
+            linha += 1
+
+            for p in nota.get('Produtos', ()):
+                set_row(linha, None, None, _LINHA_PRODUTO)
+                write_string(linha, 8, str(p.get('codigo', '')))
+                write_string(linha, 9, str(p.get('descricao', '')))
+                write_string(linha, 10, str(p.get('cfop', '')))
+                write_number(linha, 11, float(p.get('vProd', 0.0)), money_fmt)
+                write_number(linha, 12, float(p.get('imposto', 0.0)), money_fmt)
+                linha += 1
+
+        write_string(linha, 6, 'TOTAL AUTORIZADAS', header_format)
+        write_number(linha, 7, total_autorizadas, money_fmt)
+
+        if integridade is not None:
+            _aba_integridade(workbook, integridade, header_format)
+    finally:
+        workbook.close()
+    return linha - 1
+
+
+def _aba_integridade(workbook, integridade, header_format):
+    from integridade import linhas_ocorrencias
+    ws = workbook.add_worksheet('Integridade')
+    ws.set_column(0, 0, 18)
+    ws.set_column(1, 1, 48)
+    ws.set_column(2, 2, 16)
+    ws.set_column(8, 9, 30)
+    resumo = integridade['resumo']
+    ws.write_string(0, 0, 'Resumo', header_format)
+    for c, (nome, valor) in enumerate(resumo.items()):
+        ws.write_string(1, c, nome)
+        ws.write_number(2, c, valor)
+    for c, h in enumerate(COLUNAS_INTEGRIDADE_EXCEL):
+        ws.write_string(4, c, h, header_format)
+    linha = 5
+    for ocorrencia in linhas_ocorrencias(integridade):
+        for c, valor in enumerate(ocorrencia):
+            if isinstance(valor, int):
+                ws.write_number(linha, c, valor)
+            elif valor:
+                ws.write_string(linha, c, valor)
+        linha += 1
+    if integridade.get('truncado'):
+        ws.write_string(linha, 0, 'Lista cortada: o resumo traz as contagens completas.')
+
+
+# Tabelas normalizadas: (coluna, tipo) — 'texto', 'inteiro' ou 'numero'
+COLUNAS_NOTAS = [('Tipo', 'texto'), ('Número', 'texto'), ('Data', 'texto'), ('Chave', 'texto'),
+                 ('Status', 'texto'), ('Natureza', 'texto'), ('Frete (R$)', 'numero'),
+                 ('Impostos (R$)', 'numero'), ('Total (R$)', 'numero')]
+COLUNAS_ITENS = [('Chave', 'texto'), ('item', 'inteiro'), ('codigo', 'texto'), ('descricao', 'texto'),
+                 ('cfop', 'texto'), ('vProd', 'numero'), ('imposto', 'numero')]
+COLUNAS_INTEGRIDADE = [('tipo', 'texto'), ('Chave', 'texto'), ('cnpj', 'texto'), ('modelo', 'texto'),
+                       ('serie', 'texto'), ('numero_inicial', 'inteiro'), ('numero_final', 'inteiro'),
+                       ('quantidade', 'inteiro'), ('notas', 'texto'), ('detalhe', 'texto')]
+TABELAS = {'notas': COLUNAS_NOTAS, 'itens': COLUNAS_ITENS, 'integridade': COLUNAS_INTEGRIDADE}
+FORMATOS = {'parquet': 'application/vnd.apache.parquet',
+            'arrow': 'application/vnd.apache.arrow.file',
+            'csv': 'text/csv'}
+
+LOTE_PADRAO = 50000
+
+
+def _linhas(notas, tabela):
+    # Tuplas na ordem das colunas da tabela
+    if tabela == 'integridade':
+        # verificação do lote inteiro, com todas as ocorrências
+        from integridade import linhas_ocorrencias, verificar_lote
+        yield from linhas_ocorrencias(verificar_lote(list(notas), max_ocorrencias=None))
+    elif tabela == 'notas':
+        for n in notas:
+            yield (str(n.get('Tipo', '')), str(n.get('Número', '')), str(n.get('Data', '')),
+                   n.get('Chave') or '', str(n.get('Status', '')), str(n.get('Natureza', '')),
+                   float(n.get('Frete (R$)', 0.0)), float(n.get('Impostos (R$)', 0.0)),
+                   float(n.get('Total (R$)', 0.0)))
+    else:
+        for n in notas:
+            chave = n.get('Chave') or ''
+            for i, p in enumerate(n.get('Produtos', ()), 1):
+                yield (chave, i, str(p.get('codigo', '')), str(p.get('descricao', '')), str(p.get('cfop', '')),
+                       float(p.get('vProd', 0.0)), float(p.get('imposto', 0.0)))
+
+
+def lotes_tabela(notas, tabela, tamanho_lote=LOTE_PADRAO):
+    """Monta uma tabela normalizada em DataFrames de até `tamanho_lote` linhas.
+
+    Args:
+        notas (iterable[dict]): notas no formato de `extrair_dados_xml`.
+        tabela (str): 'notas', 'itens' ou 'integridade'.
+        tamanho_lote (int): linhas por DataFrame.
+
+    Yields:
+        pandas.DataFrame: lotes com as colunas de `TABELAS[tabela]`.
+    """
+    import pandas as pd
+    colunas = [c for c, _ in TABELAS[tabela]]
+    lote = []
+    for linha in _linhas(notas, tabela):
+        lote.append(linha)
+        if len(lote) >= tamanho_lote:
+            yield pd.DataFrame.from_records(lote, columns=colunas)
+            lote = []
+    if lote:
+        yield pd.DataFrame.from_records(lote, columns=colunas)
+
+
+def _schema_arrow(tabela):
+    import pyarrow as pa
+    tipos = {'texto': pa.string(), 'inteiro': pa.int32(), 'numero': pa.float64()}
+    return pa.schema([(c, tipos[t]) for c, t in TABELAS[tabela]])
+
+
+def escrever_tabela(notas, tabela, formato, destino, tamanho_lote=LOTE_PADRAO):
+    """Exporta uma tabela normalizada ('notas', 'itens' ou 'integridade') em lotes.
+
+    Parquet e Arrow IPC usam o pyarrow (o mesmo motor do pandas para esses
+    formatos); uma tabela vazia ainda gera um arquivo válido, só com o
+    esquema. O CSV é UTF-8, separado por vírgula, com cabeçalho.
+
+    Args:
+        notas (iterable[dict]): notas no formato de `extrair_dados_xml`.
+        tabela (str): 'notas', 'itens' ou 'integridade'.
+        formato (str): 'parquet', 'arrow' ou 'csv'.
+        destino (str|file-like): caminho ou arquivo binário.
+        tamanho_lote (int): linhas por lote (row group / record batch).
+
+    Returns:
+        int: quantidade de linhas exportadas.
+    """
+    if tabela not in TABELAS:
+        raise ValueError(f'Tabela desconhecida: {tabela}')
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconhecido: {formato}')
+    total = 0
+    lotes = lotes_tabela(notas, tabela, tamanho_lote)
+
+    if formato == 'csv':
+        fh = open(destino, 'wb') if isinstance(destino, str) else destino
+        try:
+            for df in lotes:
+                df.to_csv(fh, header=(total == 0), index=False, encoding='utf-8', lineterminator='\n')
+                total += len(df)
+            if total == 0:
+                fh.write((','.join(c for c, _ in TABELAS[tabela]) + '\n').encode('utf-8'))
+        finally:
+            if fh is not destino:
+                fh.close()
+        return total
+
+    import pyarrow as pa
+    schema = _schema_arrow(tabela)
+    if formato == 'parquet':
+        import pyarrow.parquet as pq
+        escritor = pq.ParquetWriter(destino, schema)
+    else:
+        escritor = pa.ipc.new_file(destino, schema)
+    try:
+        for df in lotes:
+            escritor.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            total += len(df)
+    finally:
+        escritor.close()
+    return total
@@ -0,0 +1,613 @@
+"""extrator
+========
+
+Motor de extração em passagem única para XMLs fiscais.
+
+Os campos de interesse são declarados por tipo de documento em perfis
+(`PerfilExtracao`: NF-e/NFC-e, CT-e, MDF-e e NFS-e) e cada perfil é
+compilado uma única vez em uma tabela ``tag -> ação`` com as tags já
+qualificadas pelo namespace do leiaute ('{ns}vNF'). A árvore é
+percorrida uma só vez e cada elemento é resolvido com uma consulta em
+dicionário. O perfil é escolhido pelo elemento raiz do documento
+(infNFe, infCte, infMDFe, infNFSe/InfNfse: `extrator_da_raiz`); sem
+raiz conhecida vale o perfil genérico, com os candidatos históricos de
+todos os tipos.
+
+Campos de cabeçalho são buscados fora dos itens (det) e, entre os
+candidatos de um campo, vale o primeiro da lista de preferência que
+existir no documento (o total da NF-e é o vNF do ICMSTot, nunca o vProd
+de um item); entre elementos com a mesma tag vence o primeiro em ordem
+de documento. Campos de item valem o primeiro candidato dentro de cada
+det/prod. Tags fora do leiaute declarado (outro namespace, outra
+caixa) ainda casam pelo nome local em minúsculas. O valor é o texto do
+elemento ou '0.00' quando vazio ou ausente.
+
+A coleta é orientada a eventos (`abrir`/`fechar` de cada elemento), de
+modo que o mesmo motor serve tanto para árvores já carregadas quanto
+para leitura incremental (`iterar_incremental`), usada em arquivos
+grandes e em lotes com várias notas.
+"""
+
+import base64
+import gzip
+import io
+import xml.etree.ElementTree as ET
+
+VALOR_AUSENTE = '0.00'
+
+# Versão da extração: incrementar sempre que os campos extraídos ou o
+# formato das notas mudarem (invalida o cache de extração em disco)
+VERSAO_EXTRACAO = 2
+
+NS_NFE = 'http://www.portalfiscal.inf.br/nfe'
+NS_CTE = 'http://www.portalfiscal.inf.br/cte'
+NS_MDFE = 'http://www.portalfiscal.inf.br/mdfe'
+NS_NFSE = 'http://www.sped.fazenda.gov.br/nfse'
+NS_NFSE_ABRASF = 'http://www.abrasf.org.br/nfse.xsd'
+
+# Candidatos por campo de cabeçalho do perfil genérico (documentos sem
+# raiz conhecida), na ordem histórica do validador
+CAMPOS_CABECALHO = {
+    'numero': ['nNF', 'Numero', 'numNota', 'nCT', 'nMDF'],
+    'data': ['dhEmi', 'DataEmissao', 'dEmi', 'dhEmiS'],
+    'total': ['vNF', 'vServ', 'vLiquido', 'vProd', 'vTPrest'],
+    'frete': ['vFrete', 'vFreteT'],
+    'impostos': ['vTotTrib', 'vICMS', 'vISS', 'vTot'],
+    'natureza': ['natOp', 'natureza'],
+    'chave': ['chNFe', 'chave'],
+}
+
+# Campos buscados dentro de det/prod
+CAMPOS_ITEM = {
+    'descricao': ['xProd', 'descr', 'descricao'],
+    'codigo': ['cProd', 'codigo', 'cProdItem'],
+    'cfop': ['CFOP', 'cfop'],
+    'vProd': ['vProd', 'vproduto', 'vProdItem'],
+}
+
+# Tags somadas em todo o det para compor o imposto do item
+TAGS_IMPOSTO_ITEM = ['vICMS', 'vIPI', 'vPIS', 'vCOFINS', 'vII', 'vST']
+
+_PAPEL_ITEM = 'det'
+_PAPEL_PRODUTO = 'prod'
+_PAPEL_RAIZ = 'raiz'
+
+_NAO_COMPILADA = object()
+_SEM_CANDIDATO = 1 << 30
+
+
+class PerfilExtracao:
+    """Declaração dos campos de um tipo de documento fiscal.
+
+    Args:
+        nome (str): tipo do documento (ex.: 'CT-e'), o Tipo das notas.
+        raizes (list[str]): elementos que delimitam o documento e trazem
+            a chave de acesso no atributo Id (ex.: ['infCte']).
+        namespaces (list[str]): namespaces do leiaute.
+        cabecalho (dict[str, list[str]]): campo -> tags candidatas, em
+            ordem de preferência, buscadas fora dos itens.
+        item (dict[str, list[str]], opcional): campo -> tags candidatas
+            em det/prod.
+        tags_imposto (list[str], opcional): tags somadas em cada det.
+        prefixo_id (str): prefixo do Id antes da chave (ex.: 'CTe').
+        modelos (dict[str, str], opcional): modelo do documento (campo
+            'modelo') -> Tipo, para leiautes compartilhados por mais de
+            um modelo (NF-e 55 e NFC-e 65).
+    """
+
+    def __init__(self, nome, raizes, namespaces, cabecalho, item=None, tags_imposto=None, prefixo_id='',
+                 modelos=None):
+        self.nome = nome
+        self.raizes = list(raizes)
+        self.namespaces = list(namespaces)
+        self.cabecalho = cabecalho
+        self.item = item or {}
+        self.tags_imposto = tags_imposto or []
+        self.prefixo_id = prefixo_id
+        self.modelos = modelos or {}
+
+
+PERFIL_NFE = PerfilExtracao(
+    'NF-e', ['infNFe'], [NS_NFE],
+    cabecalho={
+        'numero': ['nNF'],
+        'modelo': ['mod'],
+        'data': ['dhEmi', 'dEmi'],
+        'total': ['vNF'],
+        'frete': ['vFrete'],
+        'impostos': ['vTotTrib', 'vICMS'],
+        'natureza': ['natOp'],
+        'chave': ['chNFe'],
+    },
+    item={'descricao': ['xProd'], 'codigo': ['cProd'], 'cfop': ['CFOP'], 'vProd': ['vProd']},
+    tags_imposto=TAGS_IMPOSTO_ITEM,
+    prefixo_id='NFe',
+    modelos={'55': 'NF-e', '65': 'NFC-e'},
+)
+
+PERFIL_CTE = PerfilExtracao(
+    'CT-e', ['infCte'], [NS_CTE],
+    cabecalho={
+        'numero': ['nCT'],
+        'modelo': ['mod'],
+        'data': ['dhEmi'],
+        'total': ['vTPrest'],
+        'impostos': ['vTotTrib', 'vICMS'],
+        'natureza': ['natOp'],
+        'chave': ['chCTe'],
+    },
+    prefixo_id='CTe',
+    modelos={'57': 'CT-e', '67': 'CT-e OS'},
+)
+
+PERFIL_MDFE = PerfilExtracao(
+    'MDF-e', ['infMDFe'], [NS_MDFE],
+    cabecalho={
+        'numero': ['nMDF'],
+        'modelo': ['mod'],
+        'data': ['dhEmi'],
+        'total': ['vCarga'],
+        'chave': ['chMDFe'],
+    },
+    prefixo_id='MDFe',
+)
+
+# NFS-e do padrão nacional (infNFSe) e do leiaute ABRASF dos municípios (InfNfse)
+PERFIL_NFSE = PerfilExtracao(
+    'NFS-e', ['infNFSe', 'InfNfse'], [NS_NFSE, NS_NFSE_ABRASF],
+    cabecalho={
+        'numero': ['nNFSe', 'Numero'],
+        'data': ['dhEmi', 'DataEmissao', 'dhProc'],
+        'total': ['vLiq', 'ValorLiquidoNfse', 'vServ', 'ValorServicos'],
+        'impostos': ['vTotTribFed', 'vISSQN', 'ValorIss'],
+        'natureza': ['NaturezaOperacao'],
+    },
+    prefixo_id='NFS',
+)
+
+# Tipo -> perfil (a NFC-e usa o leiaute da NF-e, com modelo 65)
+PERFIS = {'NF-e': PERFIL_NFE, 'NFC-e': PERFIL_NFE, 'CT-e': PERFIL_CTE, 'MDF-e': PERFIL_MDFE,
+          'NFS-e': PERFIL_NFSE}
+
+PERFIL_GENERICO = PerfilExtracao(None, ['infNFe'], [], CAMPOS_CABECALHO, CAMPOS_ITEM, TAGS_IMPOSTO_ITEM,
+                                 prefixo_id='NFe')
+
+
+def nome_local(tag):
+    """Retorna o nome da tag sem namespace e em minúsculas.
+
+    Tags que não são texto (comentários, instruções de processamento)
+    retornam string vazia.
+    """
+    if not isinstance(tag, str):
+        return ''
+    return (tag.split('}', 1)[1] if '}' in tag else tag).lower()
+
+
+def _ultimo_descendente(el):
+    """Último elemento da subárvore de `el` em pré-ordem."""
+    while len(el):
+        el = el[-1]
+    return el
+
+
+class _ItemAberto:
+    """Estado de um elemento det em coleta."""
+
+    __slots__ = ('prof', 'prof_prod', 'el_prod', 'tem_prod', 'campos', 'impostos')
+
+    def __init__(self, prof, n_impostos):
+        self.prof = prof
+        self.prof_prod = None
+        self.el_prod = None
+        self.tem_prod = False
+        self.campos = {}
+        self.impostos = [[] for _ in range(n_impostos)]
+
+    def imposto_total(self):
+        # soma na ordem das tags e, dentro de cada tag, na ordem do documento
+        total = 0.0
+        for valores in self.impostos:
+            for v in valores:
+                total += v
+        return total
+
+
+class ResultadoExtracao:
+    """Valores brutos coletados de um documento.
+
+    Atributos:
+        cabecalho (dict): campo -> texto ('0.00' quando não encontrado).
+        chave_id (str|None): chave obtida do atributo Id/ID da raiz do
+            documento (infNFe, infCte...).
+        itens (list[tuple[dict, float]]): campos de cada det/prod e a soma
+            dos impostos do det, na ordem do documento.
+        tipo (str|None): tipo do documento pelo perfil (None no perfil
+            genérico).
+    """
+
+    __slots__ = ('cabecalho', 'chave_id', 'itens', 'tipo')
+
+    def __init__(self, cabecalho, chave_id, itens, tipo=None):
+        self.cabecalho = cabecalho
+        self.chave_id = chave_id
+        self.itens = itens
+        self.tipo = tipo
+
+    def valor(self, campo):
+        return self.cabecalho.get(campo) or VALOR_AUSENTE
+
+
+class Coleta:
+    """Coleta dos campos de um documento a partir de eventos abrir/fechar.
+
+    Em modo imediato (árvore completa) o texto é lido na abertura do
+    elemento. Com ``adiar_texto=True`` (leitura incremental, quando o
+    texto ainda não foi lido na abertura) o elemento é reservado na
+    abertura — preservando a ordem de documento — e o texto é lido no
+    fechamento.
+    """
+
+    def __init__(self, extrator, adiar_texto=False):
+        self._ext = extrator
+        self._adiar = adiar_texto
+        self._prof = 0
+        self._dets = []
+        self._prods = []
+        self._pendentes = {}
+        # campo de cabeçalho -> posição do candidato já reservado
+        self._preferencia = {}
+        self.cabecalho = {}
+        self.chave_id = None
+        self.itens = []
+
+    def _reservar(self, el, destino, campo):
+        if self._adiar:
+            destino[campo] = None
+            self._pendentes.setdefault(el, []).append((destino, campo))
+        else:
+            destino[campo] = el.text or VALOR_AUSENTE
+
+    def _reservar_imposto(self, el, idx):
+        if self._adiar:
+            for det in self._dets:
+                self._pendentes.setdefault(el, []).append((det.impostos, idx))
+        elif el.text:
+            try:
+                v = float(el.text.replace(',', '.'))
+            except ValueError:
+                return
+            for det in self._dets:
+                det.impostos[idx].append(v)
+
+    def _reivindicar(self, el, cab, item, idx_imposto):
+        if cab and not self._dets:
+            preferencia = self._preferencia
+            for campo, posicao in cab:
+                if posicao < preferencia.get(campo, _SEM_CANDIDATO):
+                    preferencia[campo] = posicao
+                    self._reservar(el, self.cabecalho, campo)
+        if item:
+            for det in self._prods:
+                for campo in item:
+                    if campo not in det.campos:
+                        self._reservar(el, det.campos, campo)
+        if idx_imposto >= 0 and self._dets:
+            self._reservar_imposto(el, idx_imposto)
+
+    def _ler_chave(self, el):
+        attr = (el.attrib.get('Id') or el.attrib.get('ID') or '').strip()
+        if attr:
+            prefixo = self._ext.prefixo_id
+            self.chave_id = attr[len(prefixo):] if prefixo and attr.startswith(prefixo) else attr
+
+    def abrir(self, el):
+        """Evento de abertura de `el` (leitura incremental)."""
+        self._prof += 1
+        acao = self._ext.acao(el.tag)
+        if acao is None:
+            return
+        cab, item, idx_imposto, papel = acao
+        if papel == _PAPEL_ITEM:
+            det = _ItemAberto(self._prof, self._ext.n_impostos)
+            self._dets.append(det)
+            self.itens.append(det)
+        elif papel == _PAPEL_PRODUTO:
+            if self._dets:
+                det = self._dets[-1]
+                if det.prof == self._prof - 1 and not det.tem_prod:
+                    det.tem_prod = True
+                    det.prof_prod = self._prof
+                    self._prods.append(det)
+        elif papel == _PAPEL_RAIZ and self.chave_id is None:
+            self._ler_chave(el)
+        self._reivindicar(el, cab, item, idx_imposto)
+
+    def fechar(self, el):
+        """Evento de fechamento de `el` (leitura incremental)."""
+        prof = self._prof
+        self._prof -= 1
+        if self._pendentes:
+            alvos = self._pendentes.pop(el, None)
+            if alvos:
+                texto = el.text
+                for destino, campo in alvos:
+                    if isinstance(campo, int):
+                        if texto:
+                            try:
+                                destino[campo].append(float(texto.replace(',', '.')))
+                            except ValueError:
+                                pass
+                    else:
+                        destino[campo] = texto or VALOR_AUSENTE
+        if self._prods and self._prods[-1].prof_prod == prof:
+            self._prods.pop()
+        if self._dets and self._dets[-1].prof == prof:
+            self._dets.pop()
+
+    def percorrer(self, root):
+        """Alimenta a coleta com a árvore completa de `root`.
+
+        Percorre `root.iter()` (pré-ordem) uma única vez. O escopo de cada
+        det/prod termina no seu último descendente, que é calculado ao
+        abrir o escopo; assim não é preciso recursão nem eventos de
+        fechamento.
+        """
+        ext = self._ext
+        por_tag = ext._por_tag
+        acao_de = ext.acao
+        dets = self._dets
+        prods = self._prods
+        # pilha de escopos abertos: (último descendente, pilha a desempilhar)
+        escopos = []
+        fim = None
+        for el in root.iter():
+            acao = por_tag.get(el.tag, _NAO_COMPILADA)
+            if acao is _NAO_COMPILADA:
+                acao = acao_de(el.tag)
+            if acao is not None:
+                cab, item, idx_imposto, papel = acao
+                if papel == _PAPEL_ITEM:
+                    det = _ItemAberto(0, ext.n_impostos)
+                    # o produto do det é o primeiro filho direto 'prod'
+                    for filho in el:
+                        acao_filho = acao_de(filho.tag)
+                        if acao_filho is not None and acao_filho[3] == _PAPEL_PRODUTO:
+                            det.el_prod = filho
+                            break
+                    dets.append(det)
+                    self.itens.append(det)
+                    escopos.append((_ultimo_descendente(el), dets))
+                    fim = escopos[-1][0]
+                elif papel == _PAPEL_PRODUTO:
+                    if dets and dets[-1].el_prod is el:
+                        det = dets[-1]
+                        det.tem_prod = True
+                        prods.append(det)
+                        escopos.append((_ultimo_descendente(el), prods))
+                        fim = escopos[-1][0]
+                elif papel == _PAPEL_RAIZ and self.chave_id is None:
+                    self._ler_chave(el)
+                self._reivindicar(el, cab, item, idx_imposto)
+            if el is fim:
+                while escopos and escopos[-1][0] is el:
+                    escopos.pop()[1].pop()
+                fim = escopos[-1][0] if escopos else None
+
+    def resultado(self):
+        itens = [(det.campos, det.imposto_total()) for det in self.itens if det.tem_prod]
+        return ResultadoExtracao(self.cabecalho, self.chave_id, itens, self._ext.tipo(self.cabecalho))
+
+
+class ExtratorCompilado:
+    """Tabela de extração compilada a partir de um `PerfilExtracao`.
+
+    As tags do perfil entram na tabela já qualificadas por cada namespace
+    do leiaute ('{ns}tag') e também sem namespace; tags fora da tabela
+    são resolvidas uma vez pelo nome local em minúsculas e guardadas.
+
+    Args:
+        perfil (PerfilExtracao): campos do tipo de documento (padrão: o
+            perfil genérico).
+    """
+
+    def __init__(self, perfil=None):
+        perfil = PERFIL_GENERICO if perfil is None else perfil
+        self.perfil = perfil
+        self.prefixo_id = perfil.prefixo_id
+
+        cab = {}
+        for campo, candidatos in perfil.cabecalho.items():
+            for posicao, tag in enumerate(candidatos):
+                lista = cab.setdefault(tag, [])
+                if campo not in (c for c, _ in lista):
+                    lista.append((campo, posicao))
+        item = self._inverter(perfil.item)
+        imposto = {}
+        for i, tag in enumerate(perfil.tags_imposto):
+            imposto.setdefault(tag, i)
+        self.n_impostos = len(perfil.tags_imposto)
+        papeis = {_PAPEL_ITEM: _PAPEL_ITEM, _PAPEL_PRODUTO: _PAPEL_PRODUTO}
+        papeis.update((raiz, _PAPEL_RAIZ) for raiz in perfil.raizes)
+
+        # tag declarada -> (campos cabeçalho com a posição, campos item, índice imposto, papel)
+        declaradas = {}
+        for tag in set(cab) | set(item) | set(imposto) | set(papeis):
+            declaradas[tag] = (tuple(cab.get(tag, ())), tuple(item.get(tag, ())), imposto.get(tag, -1),
+                               papeis.get(tag))
+        # nome local em minúsculas -> ação, para tags fora do leiaute
+        self._por_nome = {}
+        for tag, acao in declaradas.items():
+            self._por_nome.setdefault(tag.lower(), acao)
+        # tag bruta (com namespace) -> ação: as do leiaute já compiladas,
+        # as demais preenchidas sob demanda
+        self._por_tag = {}
+        for tag, acao in declaradas.items():
+            self._por_tag[tag] = acao
+            for ns in perfil.namespaces:
+                self._por_tag[f'{{{ns}}}{tag}'] = acao
+
+    @staticmethod
+    def _inverter(campos):
+        por_tag = {}
+        for campo, candidatos in campos.items():
+            for tag in candidatos:
+                lista = por_tag.setdefault(tag, [])
+                if campo not in lista:
+                    lista.append(campo)
+        return por_tag
+
+    def acao(self, tag):
+        """Retorna a ação compilada para a tag bruta ou None."""
+        try:
+            return self._por_tag[tag]
+        except KeyError:
+            acao = self._por_nome.get(nome_local(tag))
+            self._por_tag[tag] = acao
+            return acao
+
+    def tipo(self, cabecalho):
+        """Tipo do documento: pelo modelo, quando o perfil distingue, ou o nome do perfil."""
+        modelo = cabecalho.get('modelo')
+        if modelo and self.perfil.modelos:
+            return self.perfil.modelos.get(modelo.strip(), self.perfil.nome)
+        return self.perfil.nome
+
+    def nova_coleta(self, adiar_texto=False):
+        return Coleta(self, adiar_texto=adiar_texto)
+
+    def extrair(self, root):
+        """Extrai todos os campos declarados de `root` em uma única passagem.
+
+        Args:
+            root (xml.etree.ElementTree.Element): elemento raiz do documento.
+
+        Returns:
+            ResultadoExtracao: valores brutos encontrados.
+        """
+        coleta = Coleta(self)
+        coleta.percorrer(root)
+        return coleta.resultado()
+
+
+EXTRATOR_PADRAO = ExtratorCompilado()
+
+# um extrator compilado por perfil
+EXTRATORES = {perfil.nome: ExtratorCompilado(perfil)
+              for perfil in (PERFIL_NFE, PERFIL_CTE, PERFIL_MDFE, PERFIL_NFSE)}
+EXTRATORES['NFC-e'] = EXTRATORES['NF-e']
+
+
+def _compilar_raizes():
+    # raiz do documento (tag bruta e nome local em minúsculas) -> extrator
+    por_tag, por_nome = {}, {}
+    for extrator in EXTRATORES.values():
+        for raiz in extrator.perfil.raizes:
+            por_nome[raiz.lower()] = extrator
+            por_tag[raiz] = extrator
+            for ns in extrator.perfil.namespaces:
+                por_tag[f'{{{ns}}}{raiz}'] = extrator
+    return por_tag, por_nome
+
+
+# como nas tabelas dos perfis, tags fora do leiaute são resolvidas pelo
+# nome local e guardadas em _POR_RAIZ
+_POR_RAIZ, _RAIZ_POR_NOME = _compilar_raizes()
+
+
+def extrator_da_raiz(tag):
+    """Extrator do perfil cuja raiz é a tag bruta `tag` (ex.: infCte), ou None."""
+    try:
+        return _POR_RAIZ[tag]
+    except KeyError:
+        extrator = _RAIZ_POR_NOME.get(nome_local(tag))
+        _POR_RAIZ[tag] = extrator
+        return extrator
+
+
+def extrator_do_documento(root):
+    """Extrator do perfil do documento: o da primeira raiz conhecida em
+    ordem de documento (o genérico, se não houver)."""
+    for el in root.iter():
+        extrator = extrator_da_raiz(el.tag)
+        if extrator is not None:
+            return extrator
+    return EXTRATOR_PADRAO
+
+
+def iterar_incremental(fonte, extrator=None):
+    """Lê um XML de forma incremental, emitindo notas e eventos.
+
+    Cada nota é emitida assim que a sua raiz (`infNFe`, `infCte`...) fecha,
+    extraída com o perfil dessa raiz; cada evento, assim que o seu
+    `procEvento*` fecha (ou o `infEvento`, fora de um `procEvento*`): o
+    `evento` e o `retEvento` de um mesmo `procEvento*` formam um único
+    registro, com a data de registro do `retEvento`, como na leitura em
+    árvore (`eventos.registro_de_arvore`). Elementos já processados são
+    removidos da árvore parcial, de modo que o consumo de memória não
+    depende do tamanho do arquivo. Funciona para documentos isolados e
+    para contêineres com várias notas (lotes `enviNFe`, vários `nfeProc`,
+    lotes de distribuição com `docZip` em base64+gzip).
+
+    Args:
+        fonte (str|file-like): caminho ou objeto de arquivo binário.
+        extrator (ExtratorCompilado, opcional): tabela de extração usada em
+            todas as notas, no lugar da do perfil de cada raiz.
+
+    Yields:
+        tuple: ('nota', ResultadoExtracao) ou ('evento', RegistroEvento).
+    """
+    # import local: eventos depende de nome_local deste módulo
+    from eventos import LeitorEvento
+
+    nomes = {}
+    pilha = []
+    coleta = None
+    prof_nota = 0
+    evento = None
+    prof_evento = 0
+    for tipo_ev, el in ET.iterparse(fonte, events=('start', 'end')):
+        tag = el.tag
+        nome = nomes.get(tag)
+        if nome is None:
+            nome = nomes[tag] = nome_local(tag)
+        if tipo_ev == 'start':
+            pilha.append(el)
+            if coleta is None and evento is None:
+                perfil = extrator_da_raiz(tag)
+                if perfil is not None:
+                    coleta = (extrator or perfil).nova_coleta(adiar_texto=True)
+                    prof_nota = len(pilha)
+                elif nome == 'infevento' or nome.startswith('procevento'):
+                    evento = LeitorEvento()
+                    prof_evento = len(pilha)
+            if coleta is not None:
+                coleta.abrir(el)
+            continue
+
+        if coleta is not None:
+            coleta.fechar(el)
+            if len(pilha) == prof_nota:
+                yield 'nota', coleta.resultado()
+                coleta = None
+        elif evento is not None:
+            evento.ler(nome, el.text)
+            if len(pilha) == prof_evento:
+                registro = evento.registro()
+                if registro is not None:
+                    yield 'evento', registro
+                evento = None
+        elif nome == 'doczip' and el.text:
+            # documento compactado de lote de distribuição (NSU)
+            try:
+                conteudo = gzip.decompress(base64.b64decode(el.text))
+            except (ValueError, OSError):
+                conteudo = None
+            if conteudo:
+                yield from iterar_incremental(io.BytesIO(conteudo), extrator)
+
+        pilha.pop()
+        # irmãos anteriores já foram removidos, então o elemento recém-fechado
+        # é o primeiro filho do pai (o parser pode já ter anexado os seguintes)
+        if pilha and len(pilha[-1]) and pilha[-1][0] is el:
+            del pilha[-1][0]
@@ -0,0 +1,48 @@
+"""Configuração do gunicorn para produção (Procfile e render.yaml).
+
+O gunicorn carrega este arquivo sozinho quando é iniciado nesta pasta;
+o Procfile o indica com `-c` para não depender disso.
+
+Workers `gthread`: cada processo web atende várias requisições ao mesmo
+tempo, uma por thread, e um upload grande não segura os pequenos na
+fila, como acontecia com o worker `sync` padrão (uma requisição por
+vez). A extração, que é CPU, sai das threads de atendimento e vai para
+o pool de processos de `paralelo` (VALIDADOR_WORKERS, um processo por
+CPU). Com uma CPU só o pool não traria paralelismo, só o custo de levar
+arquivos e notas entre processos, e a extração fica nas threads. Lotes
+pequenos (até VALIDADOR_LOTE_SEQUENCIAL arquivos) são extraídos na
+própria thread, sem esperar na fila do pool atrás dos blocos dos lotes
+grandes.
+
+Variáveis de ambiente:
+
+- PORT: porta (padrão 8000);
+- WEB_CONCURRENCY: processos web (padrão 1; cada um tem o seu pool de
+  extração, e os caches em memória não são compartilhados entre eles);
+- VALIDADOR_THREADS: threads de atendimento por processo web (padrão 8);
+- VALIDADOR_TIMEOUT: segundos sem sinal de vida até o worker ser
+  reiniciado (padrão 300).
+
+Valores já definidos no ambiente para VALIDADOR_WORKERS e
+VALIDADOR_LOTE_SEQUENCIAL prevalecem sobre os daqui.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+threads = int(os.environ.get('VALIDADOR_THREADS', '8'))
+timeout = int(os.environ.get('VALIDADOR_TIMEOUT', '300'))
+graceful_timeout = 30
+keepalive = 5
+
+# lidos pelo app (paralelo.workers_configurados) ao ser importado no worker
+os.environ.setdefault('VALIDADOR_WORKERS', str(os.cpu_count() or 1))
+os.environ.setdefault('VALIDADOR_LOTE_SEQUENCIAL', '8')
+
+
+def post_fork(server, worker):
+    # o pool de extração nasce antes das threads de atendimento existirem
+    from paralelo import aquecer_pool
+    aquecer_pool()
@@ -0,0 +1,199 @@
+"""integridade
+===========
+
+Verificações de integridade do lote inteiro, depois da extração.
+
+Cada nota é verificada em relação às demais do lote:
+
+- chave de acesso: formato (44 dígitos) e dígito verificador (módulo 11);
+- chaves duplicadas: a mesma nota enviada mais de uma vez (índice hash
+  chave -> posições);
+- números duplicados: o mesmo número na mesma série do mesmo emitente,
+  com chaves diferentes;
+- lacunas de numeração por emitente (CNPJ), modelo e série: os números
+  de cada série são ordenados e os saltos entre números consecutivos
+  são reportados como faixas. Só os saltos entre o menor e o maior
+  número do lote contam; o que fica fora dessa faixa é desconhecido.
+
+CNPJ do emitente, modelo, série e número vêm da própria chave de acesso
+(cUF, AAMM, CNPJ, mod, serie, nNF, tpEmis, cNF, cDV), comum a NF-e,
+NFC-e, CT-e e MDF-e. A NFS-e não tem essa chave (a do padrão nacional
+tem 50 posições e a do leiaute ABRASF não existe): entra só na busca de
+chaves repetidas. O custo total é O(n log n) (a ordenação de cada
+série); em lotes grandes o dígito verificador é calculado de uma vez com
+o numpy.
+
+`verificar_lote` devolve um dicionário serializável em JSON, incluído na
+resposta do `/validate` e nas exportações (aba "Integridade" da
+planilha, tabela `integridade` em `/export`).
+"""
+
+from operator import mul
+
+# pesos do módulo 11 para as 43 primeiras posições (2 a 9, da direita para a esquerda)
+_PESOS = tuple(reversed([2 + i % 8 for i in range(43)]))
+_BASE_ASCII = 48 * sum(_PESOS)
+
+# a partir deste tamanho o dígito verificador é calculado com o numpy
+_LOTE_VETORIZADO = 2000
+
+# ocorrências listadas por tipo na resposta; as contagens são sempre completas
+MAX_OCORRENCIAS = 1000
+
+FORMATO, DIGITO, AUSENTE = 'formato', 'digito', 'ausente'
+
+# tipos de documento sem a chave de acesso de 44 dígitos
+TIPOS_SEM_CHAVE_44 = frozenset(('NFS-e',))
+
+
+def digito_verificador(chave):
+    """Dígito verificador (módulo 11) das 43 primeiras posições da chave."""
+    resto = (sum(map(mul, chave[:43].encode('ascii'), _PESOS)) - _BASE_ASCII) % 11
+    return 0 if resto < 2 else 11 - resto
+
+
+def chave_valida(chave):
+    """True se a chave tem 44 dígitos e o dígito verificador confere."""
+    return _bem_formada(chave) and digito_verificador(chave) == ord(chave[43]) - 48
+
+
+def _bem_formada(chave):
+    return len(chave) == 44 and chave.isascii() and chave.isdigit()
+
+
+def decompor_chave(chave):
+    """(CNPJ do emitente, modelo, série, número) de uma chave de 44 dígitos."""
+    return chave[6:20], chave[20:22], chave[22:25], int(chave[25:34])
+
+
+def _digitos_calculados(chaves):
+    # dígito verificador esperado de cada chave (todas bem formadas)
+    if len(chaves) < _LOTE_VETORIZADO:
+        return [digito_verificador(c) for c in chaves]
+    import numpy as np
+    matriz = np.frombuffer(''.join(chaves).encode('ascii'), dtype=np.uint8).reshape(-1, 44)
+    resto = (matriz[:, :43].astype(np.int64) - 48) @ np.array(_PESOS, dtype=np.int64) % 11
+    return np.where(resto < 2, 0, 11 - resto).tolist()
+
+
+def _limitar(lista, limite):
+    return lista if limite is None else lista[:limite]
+
+
+def verificar_lote(notas, max_ocorrencias=MAX_OCORRENCIAS):
+    """Verifica chaves, duplicidades e lacunas de numeração de um lote.
+
+    Args:
+        notas (list[Nota|dict]): notas do lote, na ordem do resultado;
+            as posições reportadas (`indices`) são as desta lista.
+        max_ocorrencias (int|None): ocorrências listadas por tipo (None
+            lista todas).
+
+    Returns:
+        dict: `resumo` (contagens), `chaves_invalidas`, `chaves_duplicadas`,
+            `numeros_duplicados`, `lacunas` e `series`, e `truncado` se
+            alguma lista foi cortada em `max_ocorrencias`.
+    """
+    invalidas = []
+    por_chave = {}
+    formadas, posicoes_formadas = [], []
+    for i, nota in enumerate(notas):
+        chave = (nota.get('Chave') or '').strip()
+        if nota.get('Tipo') in TIPOS_SEM_CHAVE_44:
+            if chave:
+                por_chave.setdefault(chave, []).append(i)
+            continue
+        if not chave:
+            invalidas.append({'indice': i, 'Número': nota.get('Número', ''), 'Chave': '', 'motivo': AUSENTE})
+            continue
+        por_chave.setdefault(chave, []).append(i)
+        if _bem_formada(chave):
+            formadas.append(chave)
+            posicoes_formadas.append(i)
+        else:
+            invalidas.append({'indice': i, 'Número': nota.get('Número', ''), 'Chave': chave, 'motivo': FORMATO})
+
+    for chave, i, esperado in zip(formadas, posicoes_formadas, _digitos_calculados(formadas)):
+        if esperado != ord(chave[43]) - 48:
+            invalidas.append({'indice': i, 'Número': notas[i].get('Número', ''), 'Chave': chave,
+                              'motivo': DIGITO, 'esperado': esperado})
+    invalidas.sort(key=lambda o: o['indice'])
+
+    duplicadas = [{'Chave': c, 'indices': pos} for c, pos in por_chave.items() if len(pos) > 1]
+
+    # série (CNPJ, modelo, série) -> número -> chaves distintas
+    series = {}
+    for chave, pos in por_chave.items():
+        if _bem_formada(chave):
+            cnpj, modelo, serie, numero = decompor_chave(chave)
+            series.setdefault((cnpj, modelo, serie), {}).setdefault(numero, []).append((chave, pos[0]))
+
+    numeros_duplicados, lacunas, resumo_series = [], [], []
+    faltando_total = 0
+    for (cnpj, modelo, serie), numeros in sorted(series.items()):
+        ordenados = sorted(numeros)
+        faltando = 0
+        for anterior, atual in zip(ordenados, ordenados[1:]):
+            if atual - anterior > 1:
+                lacunas.append({'cnpj': cnpj, 'modelo': modelo, 'serie': serie, 'de': anterior + 1,
+                                'ate': atual - 1, 'quantidade': atual - anterior - 1})
+                faltando += atual - anterior - 1
+        for numero in ordenados:
+            chaves = numeros[numero]
+            if len(chaves) > 1:
+                numeros_duplicados.append({'cnpj': cnpj, 'modelo': modelo, 'serie': serie, 'numero': numero,
+                                           'chaves': [c for c, _ in chaves], 'indices': [i for _, i in chaves]})
+        faltando_total += faltando
+        resumo_series.append({'cnpj': cnpj, 'modelo': modelo, 'serie': serie, 'notas': len(ordenados),
+                              'primeiro': ordenados[0], 'ultimo': ordenados[-1], 'faltando': faltando})
+
+    ocorrencias = {'chaves_invalidas': invalidas, 'chaves_duplicadas': duplicadas,
+                   'numeros_duplicados': numeros_duplicados, 'lacunas': lacunas, 'series': resumo_series}
+    relatorio = {
+        'resumo': {
+            'notas': len(notas),
+            'chaves_invalidas': len(invalidas),
+            'chaves_duplicadas': len(duplicadas),
+            'notas_repetidas': sum(len(d['indices']) - 1 for d in duplicadas),
+            'numeros_duplicados': len(numeros_duplicados),
+            'lacunas': len(lacunas),
+            'numeros_faltando': faltando_total,
+            'series': len(resumo_series),
+        },
+        'truncado': max_ocorrencias is not None and any(len(v) > max_ocorrencias for v in ocorrencias.values()),
+    }
+    for nome, lista in ocorrencias.items():
+        relatorio[nome] = _limitar(lista, max_ocorrencias)
+    return relatorio
+
+
+def sem_ocorrencias(relatorio):
+    """True se o relatório não tem nenhuma ocorrência."""
+    r = relatorio['resumo']
+    return not (r['chaves_invalidas'] or r['chaves_duplicadas'] or r['numeros_duplicados'] or r['lacunas'])
+
+
+def linhas_ocorrencias(relatorio):
+    """Ocorrências em linhas planas, para planilhas e tabelas.
+
+    Yields:
+        tuple: (tipo, Chave, cnpj, modelo, serie, numero_inicial,
+            numero_final, quantidade, notas, detalhe), com `notas` as
+            posições das notas separadas por vírgula.
+    """
+    for o in relatorio['chaves_invalidas']:
+        detalhe = f"dígito esperado {o['esperado']}" if o['motivo'] == DIGITO else o['motivo']
+        chave = o['Chave']
+        partes = decompor_chave(chave) if _bem_formada(chave) else ('', '', '', None)
+        yield ('chave_invalida', chave, *partes[:3], partes[3], partes[3], 1, str(o['indice']), detalhe)
+    for o in relatorio['chaves_duplicadas']:
+        chave = o['Chave']
+        partes = decompor_chave(chave) if _bem_formada(chave) else ('', '', '', None)
+        yield ('chave_duplicada', chave, *partes[:3], partes[3], partes[3], len(o['indices']),
+               ','.join(map(str, o['indices'])), 'mesma chave em mais de uma nota')
+    for o in relatorio['numeros_duplicados']:
+        yield ('numero_duplicado', ' '.join(o['chaves']), o['cnpj'], o['modelo'], o['serie'], o['numero'],
+               o['numero'], len(o['chaves']), ','.join(map(str, o['indices'])), 'mesmo número com chaves diferentes')
+    for o in relatorio['lacunas']:
+        yield ('lacuna', '', o['cnpj'], o['modelo'], o['serie'], o['de'], o['ate'], o['quantidade'], '',
+               'números ausentes no lote')
@@ -0,0 +1,178 @@
+"""jobs
+====
+
+Fila de processamento assíncrono para uploads grandes.
+
+O `/validate` em modo job salva os arquivos, registra o job e devolve o
+id imediatamente; a extração roda em um executor em segundo plano, que
+atualiza o progresso (arquivos processados, notas, erros) a cada arquivo
+ou bloco. O estado dos jobs fica em um registro plugável:
+
+- `JobsMemoria`: dicionário no próprio processo (padrão);
+- `JobsSQLite`: arquivo SQLite, compartilhado por todos os workers do
+  gunicorn que apontarem para o mesmo caminho.
+
+Jobs concluídos (ou com erro) expiram `ttl` segundos depois de
+terminar — o mesmo tempo de vida dos resultados no armazenamento — e são
+descartados a cada job novo; jobs em andamento nunca expiram.
+
+Use `criar_registro_jobs(destino, ttl)` para escolher o backend a partir
+da configuração (VALIDADOR_JOBS_DB).
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+PENDENTE = 'pendente'
+PROCESSANDO = 'processando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+
+
+def _novo_job(job_id, total_arquivos):
+    return {
+        'id': job_id,
+        'estado': PENDENTE,
+        'arquivos_total': total_arquivos,
+        'arquivos_processados': 0,
+        'notas': 0,
+        'erros': 0,
+        'criado_em': time.time(),
+        'iniciado_em': None,
+        'concluido_em': None,
+        'mensagem': None,
+    }
+
+
+def resumo_job(job):
+    """Acrescenta ao estado do job o tempo decorrido e a estimativa (ETA)."""
+    if job is None:
+        return None
+    resumo = dict(job)
+    agora = time.time()
+    inicio = job.get('iniciado_em')
+    fim = job.get('concluido_em') or agora
+    resumo['decorrido_s'] = round(fim - inicio, 3) if inicio else 0.0
+    feitos = job.get('arquivos_processados') or 0
+    total = job.get('arquivos_total') or 0
+    eta = None
+    if job.get('estado') == PROCESSANDO and inicio and feitos:
+        eta = round((agora - inicio) / feitos * max(0, total - feitos), 1)
+    elif job.get('estado') in (CONCLUIDO, ERRO):
+        eta = 0.0
+    resumo['eta_s'] = eta
+    resumo['progresso'] = round(feitos / total, 4) if total else 1.0
+    return resumo
+
+
+def _expira_em(job, ttl):
+    # instante em que o job some do registro (None: não expira)
+    if ttl is None or job.get('estado') not in (CONCLUIDO, ERRO) or not job.get('concluido_em'):
+        return None
+    return job['concluido_em'] + ttl
+
+
+class JobsMemoria:
+    """Registro de jobs em memória (visível apenas no processo atual).
+
+    Args:
+        ttl (float, opcional): segundos que um job terminado fica no
+            registro (None: para sempre).
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _vivo(self, job, agora):
+        expira = _expira_em(job, self.ttl)
+        return expira is None or expira > agora
+
+    def criar(self, job_id, total_arquivos):
+        with self._lock:
+            agora = time.time()
+            for vencido in [k for k, job in self._jobs.items() if not self._vivo(job, agora)]:
+                del self._jobs[vencido]
+            self._jobs[job_id] = _novo_job(job_id, total_arquivos)
+
+    def atualizar(self, job_id, **campos):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(campos)
+
+    def obter(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None and self._vivo(job, time.time()) else None
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+class JobsSQLite:
+    """Registro de jobs em um arquivo SQLite compartilhado entre processos.
+
+    Args:
+        caminho (str): arquivo do banco; criado se não existir.
+        ttl (float, opcional): segundos que um job terminado fica no
+            registro (None: para sempre).
+    """
+
+    def __init__(self, caminho, ttl=None):
+        self.caminho = caminho
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conexao() as con:
+            con.execute('CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, dados TEXT NOT NULL, expira_em REAL)')
+            # bancos criados antes da expiração dos jobs
+            if 'expira_em' not in {c[1] for c in con.execute('PRAGMA table_info(jobs)')}:
+                con.execute('ALTER TABLE jobs ADD COLUMN expira_em REAL')
+
+    def _conexao(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=30)
+            con.execute('PRAGMA journal_mode=WAL')
+            self._local.con = con
+        return con
+
+    def criar(self, job_id, total_arquivos):
+        with self._conexao() as con:
+            con.execute('DELETE FROM jobs WHERE expira_em <= ?', (time.time(),))
+            con.execute('INSERT OR REPLACE INTO jobs (id, dados, expira_em) VALUES (?, ?, NULL)',
+                        (job_id, json.dumps(_novo_job(job_id, total_arquivos))))
+
+    def atualizar(self, job_id, **campos):
+        con = self._conexao()
+        with con:
+            # BEGIN IMMEDIATE serializa leitura+escrita entre processos
+            con.execute('BEGIN IMMEDIATE')
+            linha = con.execute('SELECT dados FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if linha is None:
+                return
+            job = json.loads(linha[0])
+            job.update(campos)
+            con.execute('UPDATE jobs SET dados = ?, expira_em = ? WHERE id = ?',
+                        (json.dumps(job), _expira_em(job, self.ttl), job_id))
+
+    def obter(self, job_id):
+        linha = self._conexao().execute('SELECT dados FROM jobs WHERE id = ? '
+                                        'AND (expira_em IS NULL OR expira_em > ?)', (job_id, time.time())).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def __len__(self):
+        return self._conexao().execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+
+def criar_registro_jobs(destino=None, ttl=None):
+    """Cria o registro de jobs: SQLite se `destino` for um caminho, senão memória.
+
+    `ttl` é o tempo (s) que um job terminado fica no registro.
+    """
+    if destino:
+        return JobsSQLite(destino, ttl=ttl)
+    return JobsMemoria(ttl=ttl)
@@ -0,0 +1,241 @@
+"""metricas
+========
+
+Instrumentação do caminho crítico: tempo por etapa e contadores.
+
+Uma `Metricas` acompanha uma unidade de trabalho (uma requisição, um job
+ou um bloco do pool): `etapa(nome)` cronometra um trecho e `contar(nome,
+n)` soma um contador (arquivos, notas, itens, bytes...). As etapas podem
+se aninhar; o tempo de cada uma é exclusivo, isto é, descontado do tempo
+das etapas internas, de modo que a soma das etapas não conta nada duas
+vezes. Sem instrumentação, o `ValidadorFiscal` usa `SEM_METRICAS`, cujos
+métodos não fazem nada.
+
+Ao fim de cada unidade, as medidas são somadas ao `RegistroMetricas` do
+processo, exposto em `/metrics` no formato texto do Prometheus junto com
+o histograma de duração das requisições e medidores calculados na hora
+da coleta (tamanho do armazenamento, do cache, da base de eventos...).
+Cada processo (worker do gunicorn) tem o seu registro.
+"""
+
+import threading
+import time
+
+# limites (s) do histograma de duração das requisições
+LIMITES_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+AJUDA_CONTADORES = {
+    'arquivos': 'Arquivos XML processados.',
+    'notas': 'Notas extraídas.',
+    'itens': 'Itens (produtos) extraídos.',
+    'bytes': 'Bytes de XML lidos pelo parser ou pelo cache.',
+    'erros_parse': 'Arquivos com erro de parse.',
+    'erros_extracao': 'Arquivos com erro de extração.',
+    'eventos': 'Registros de evento encontrados.',
+}
+
+
+class _Cronometro:
+    __slots__ = ('metricas', 'nome', 'inicio', 'filhos')
+
+    def __init__(self, metricas, nome):
+        self.metricas = metricas
+        self.nome = nome
+
+    def __enter__(self):
+        self.filhos = 0.0
+        self.metricas._pilha.append(self)
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        decorrido = time.perf_counter() - self.inicio
+        m = self.metricas
+        m._pilha.pop()
+        m.tempos[self.nome] = m.tempos.get(self.nome, 0.0) + decorrido - self.filhos
+        m.chamadas[self.nome] = m.chamadas.get(self.nome, 0) + 1
+        if m._pilha:
+            m._pilha[-1].filhos += decorrido
+
+
+class Metricas:
+    """Tempos (exclusivos) por etapa e contadores de uma unidade de trabalho.
+
+    Não é thread-safe: cada requisição, job ou bloco do pool usa a sua.
+    """
+
+    ativo = True
+
+    def __init__(self):
+        self.tempos = {}
+        self.chamadas = {}
+        self.contadores = {}
+        self._pilha = []
+        self.inicio = time.perf_counter()
+
+    def etapa(self, nome):
+        """Gerenciador de contexto que cronometra a etapa `nome`."""
+        return _Cronometro(self, nome)
+
+    def contar(self, nome, valor=1):
+        self.contadores[nome] = self.contadores.get(nome, 0) + valor
+
+    def instantaneo(self):
+        """Medidas em dicionários simples (serializáveis entre processos)."""
+        return {'tempos': dict(self.tempos), 'chamadas': dict(self.chamadas),
+                'contadores': dict(self.contadores)}
+
+    def mesclar(self, outro):
+        """Soma as medidas de outra `Metricas` ou de um `instantaneo()`."""
+        if isinstance(outro, Metricas):
+            outro = outro.instantaneo()
+        for campo in ('tempos', 'chamadas', 'contadores'):
+            destino = getattr(self, campo)
+            for nome, valor in outro[campo].items():
+                destino[nome] = destino.get(nome, 0) + valor
+        return self
+
+    def resumo(self):
+        """Decomposição para o modo perfil: segundos, chamadas e fração por etapa.
+
+        No pool de processos as etapas dos workers são somadas, e podem
+        passar do tempo de parede (`total_segundos`).
+        """
+        total = time.perf_counter() - self.inicio
+        soma = sum(self.tempos.values()) or 1.0
+        etapas = {nome: {'segundos': round(seg, 6), 'chamadas': self.chamadas.get(nome, 0),
+                         'fracao': round(seg / soma, 4)}
+                  for nome, seg in sorted(self.tempos.items(), key=lambda kv: -kv[1])}
+        return {'total_segundos': round(total, 6), 'etapas': etapas, 'contadores': dict(self.contadores)}
+
+
+class _CronometroNulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _MetricasNulas:
+    # Mesma interface de `Metricas`, sem custo: instrumentação desligada
+    ativo = False
+    _cronometro = _CronometroNulo()
+
+    def etapa(self, nome):
+        return self._cronometro
+
+    def contar(self, nome, valor=1):
+        pass
+
+    def mesclar(self, outro):
+        return self
+
+
+SEM_METRICAS = _MetricasNulas()
+
+
+def _rotulos(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in pares) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class RegistroMetricas:
+    """Métricas acumuladas do processo, exportadas no formato do Prometheus.
+
+    Args:
+        prefixo (str): prefixo dos nomes das métricas.
+    """
+
+    def __init__(self, prefixo='validador'):
+        self.prefixo = prefixo
+        self._total = Metricas()
+        self._requisicoes = {}  # (rota, método, código) -> quantidade
+        self._duracoes = {}  # rota -> [contagens por limite..., +Inf, soma]
+        self._medidores = []
+        self._lock = threading.Lock()
+
+    def absorver(self, metricas):
+        """Soma as medidas de uma unidade de trabalho concluída."""
+        if not metricas.ativo:
+            return
+        with self._lock:
+            self._total.mesclar(metricas)
+
+    def observar_requisicao(self, rota, metodo, codigo, segundos):
+        """Registra a duração e o código de resposta de uma requisição."""
+        with self._lock:
+            chave = (rota, metodo, codigo)
+            self._requisicoes[chave] = self._requisicoes.get(chave, 0) + 1
+            hist = self._duracoes.get(rota)
+            if hist is None:
+                hist = self._duracoes[rota] = [0] * (len(LIMITES_DURACAO) + 1) + [0.0]
+            for i, limite in enumerate(LIMITES_DURACAO):
+                if segundos <= limite:
+                    hist[i] += 1
+            hist[len(LIMITES_DURACAO)] += 1
+            hist[-1] += segundos
+
+    def medidor(self, nome, ajuda, funcao, tipo='gauge'):
+        """Registra uma métrica calculada na coleta.
+
+        `funcao()` devolve um número ou uma lista de ``(rótulos, valor)``,
+        com rótulos como tupla de pares; se levantar exceção, a métrica é
+        omitida nessa coleta.
+        """
+        self._medidores.append((nome, ajuda, funcao, tipo))
+
+    def texto(self):
+        """Todas as métricas no formato de exposição texto do Prometheus."""
+        p = self.prefixo
+        linhas = []
+
+        def familia(nome, tipo, ajuda, amostras):
+            linhas.append(f'# HELP {p}_{nome} {ajuda}')
+            linhas.append(f'# TYPE {p}_{nome} {tipo}')
+            for sufixo, rotulos, valor in amostras:
+                linhas.append(f'{p}_{nome}{sufixo}{_rotulos(rotulos)} {_numero(valor)}')
+
+        with self._lock:
+            total = self._total.instantaneo()
+            requisicoes = dict(self._requisicoes)
+            duracoes = {rota: list(h) for rota, h in self._duracoes.items()}
+
+        familia('etapa_segundos_total', 'counter', 'Tempo acumulado por etapa (exclusivo, somado entre processos).',
+                [('', (('etapa', n),), v) for n, v in sorted(total['tempos'].items())])
+        familia('etapa_chamadas_total', 'counter', 'Execuções de cada etapa.',
+                [('', (('etapa', n),), v) for n, v in sorted(total['chamadas'].items())])
+        for nome in sorted(set(AJUDA_CONTADORES) | set(total['contadores'])):
+            familia(f'{nome}_total', 'counter', AJUDA_CONTADORES.get(nome, nome),
+                    [('', (), total['contadores'].get(nome, 0))])
+        familia('requisicoes_total', 'counter', 'Requisições atendidas por rota, método e código.',
+                [('', (('rota', r), ('metodo', m), ('codigo', c)), v)
+                 for (r, m, c), v in sorted(requisicoes.items())])
+        amostras = []
+        for rota, hist in sorted(duracoes.items()):
+            for limite, n in zip(LIMITES_DURACAO, hist):
+                amostras.append(('_bucket', (('rota', rota), ('le', _numero(limite))), n))
+            amostras.append(('_bucket', (('rota', rota), ('le', '+Inf')), hist[len(LIMITES_DURACAO)]))
+            amostras.append(('_sum', (('rota', rota),), hist[-1]))
+            amostras.append(('_count', (('rota', rota),), hist[len(LIMITES_DURACAO)]))
+        familia('requisicao_segundos', 'histogram', 'Duração das requisições por rota.', amostras)
+
+        for nome, ajuda, funcao, tipo in self._medidores:
+            try:
+                valor = funcao()
+            except Exception:
+                continue
+            if valor is None:
+                continue
+            if isinstance(valor, (int, float)):
+                valor = [((), valor)]
+            familia(nome, tipo, ajuda, [('', rotulos, v) for rotulos, v in valor])
+        return '\n'.join(linhas) + '\n'
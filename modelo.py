@@ -0,0 +1,290 @@
+"""modelo
+======
+
+Representação compacta das notas extraídas.
+
+Cada nota é uma `Nota` com `__slots__` (sem dicionário por instância) e
+os produtos da nota ficam em colunas (`ItensNota`): uma tupla para cada
+campo de texto e um único `array('d')` com valor e imposto de todos os
+itens — nenhum dicionário e nenhum objeto float por produto. Textos que
+se repetem entre notas (Tipo, Data, Natureza, Status e a descrição, o
+código e o CFOP dos produtos, que vêm do cadastro do emitente) são
+internados com `sys.intern`: uma só cópia serve a todas.
+Um `Item` é só uma vista de um produto, criada quando é lido.
+
+Compatibilidade: `Nota` e `Item` se comportam como dicionários das
+chaves de sempre ("Número", "Total (R$)", "Status", "Produtos"...;
+"codigo", "vProd", "imposto"...): `get`, `[]`, `in`, `keys`, `items`,
+`dict(nota)` e `nota['Status'] = ...` funcionam como antes. `como_dict()`
+é o adaptador para o dicionário puro (o formato antigo de
+`extrair_dados_xml`, usado no JSON da API) e `Nota.de_dict` faz o
+caminho inverso.
+
+Para guardar (armazenamento de resultados, cache de extração, manifesto
+da CLI) cada nota vira uma lista posicional (`como_linha` / `de_linha`),
+sem repetir o nome dos campos em cada nota.
+"""
+
+import sys
+from array import array
+
+from eventos import AUTORIZADA
+
+# (chave de exibição, atributo), na ordem do dicionário de `extrair_dados_xml`
+CAMPOS_NOTA = (('Tipo', 'tipo'), ('Número', 'numero'), ('Data', 'data'), ('Frete (R$)', 'frete'),
+               ('Impostos (R$)', 'impostos'), ('Total (R$)', 'total'), ('Natureza', 'natureza'),
+               ('Chave', 'chave'), ('Status', 'status'), ('Produtos', 'itens'))
+CAMPOS_ITEM = ('descricao', 'codigo', 'cfop', 'vProd', 'imposto')
+
+_intern = sys.intern
+
+
+def _internar(texto):
+    return _intern(texto) if type(texto) is str else texto
+
+
+class _Mapeamento:
+    # Interface de dicionário (somente as chaves de exibição) sobre os slots
+    __slots__ = ()
+    _ATRIBUTOS = {}
+
+    def get(self, chave, padrao=None):
+        atributo = self._ATRIBUTOS.get(chave)
+        return padrao if atributo is None else getattr(self, atributo)
+
+    def __getitem__(self, chave):
+        atributo = self._ATRIBUTOS.get(chave)
+        if atributo is None:
+            raise KeyError(chave)
+        return getattr(self, atributo)
+
+    def __contains__(self, chave):
+        return chave in self._ATRIBUTOS
+
+    def keys(self):
+        return self._ATRIBUTOS.keys()
+
+    def __iter__(self):
+        return iter(self._ATRIBUTOS)
+
+    def __len__(self):
+        return len(self._ATRIBUTOS)
+
+    def values(self):
+        return [getattr(self, a) for a in self._ATRIBUTOS.values()]
+
+    def items(self):
+        return [(k, getattr(self, a)) for k, a in self._ATRIBUTOS.items()]
+
+    def __eq__(self, outro):
+        if type(outro) is type(self):
+            return self.values() == outro.values()
+        if isinstance(outro, dict):
+            return self.como_dict() == outro
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.como_dict()!r})'
+
+
+class Item(_Mapeamento):
+    """Um produto da nota (vista criada a partir de `ItensNota`).
+
+    Atributos:
+        descricao, codigo, cfop (str), vProd, imposto (float).
+    """
+
+    __slots__ = CAMPOS_ITEM
+    _ATRIBUTOS = {c: c for c in CAMPOS_ITEM}
+
+    def __init__(self, descricao='', codigo='', cfop='', vProd=0.0, imposto=0.0):
+        self.descricao = descricao
+        self.codigo = codigo
+        self.cfop = cfop
+        self.vProd = vProd
+        self.imposto = imposto
+
+    def como_dict(self):
+        return {'descricao': self.descricao, 'codigo': self.codigo, 'cfop': self.cfop,
+                'vProd': self.vProd, 'imposto': self.imposto}
+
+    def __reduce__(self):
+        return Item, (self.descricao, self.codigo, self.cfop, self.vProd, self.imposto)
+
+
+class ItensNota:
+    """Produtos de uma nota em colunas.
+
+    Uma sequência de `Item` (`len`, índice, fatia, iteração), guardada como
+    três tuplas (descrições, códigos, CFOPs) e um `array('d')` com vProd e
+    imposto intercalados.
+
+    Args:
+        descricoes, codigos, cfops (iterable[str]): colunas de texto.
+        valores (iterable[float]): vProd e imposto de cada item, intercalados.
+    """
+
+    __slots__ = ('descricoes', 'codigos', 'cfops', 'valores')
+
+    def __init__(self, descricoes=(), codigos=(), cfops=(), valores=()):
+        self.descricoes = tuple(map(_internar, descricoes))
+        self.codigos = tuple(map(_internar, codigos))
+        self.cfops = tuple(map(_internar, cfops))
+        self.valores = valores if type(valores) is array else array('d', valores)
+
+    @classmethod
+    def de_itens(cls, produtos):
+        """Monta as colunas a partir de `Item`s ou dicionários de produto."""
+        if isinstance(produtos, ItensNota):
+            return produtos
+        descricoes, codigos, cfops, valores = [], [], [], array('d')
+        for p in produtos:
+            descricoes.append(p.get('descricao', ''))
+            codigos.append(p.get('codigo', ''))
+            cfops.append(p.get('cfop', ''))
+            valores.append(float(p.get('vProd', 0.0)))
+            valores.append(float(p.get('imposto', 0.0)))
+        return cls(descricoes, codigos, cfops, valores)
+
+    def __len__(self):
+        return len(self.descricoes)
+
+    def _item(self, i):
+        return Item(self.descricoes[i], self.codigos[i], self.cfops[i], self.valores[2 * i], self.valores[2 * i + 1])
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self._item(i) for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError('item fora da nota')
+        return self._item(indice)
+
+    def __iter__(self):
+        valores = self.valores
+        for i, (descricao, codigo, cfop) in enumerate(zip(self.descricoes, self.codigos, self.cfops)):
+            yield Item(descricao, codigo, cfop, valores[2 * i], valores[2 * i + 1])
+
+    def vprods(self):
+        """Coluna de valores dos produtos."""
+        return self.valores[0::2]
+
+    def impostos(self):
+        """Coluna de impostos dos produtos."""
+        return self.valores[1::2]
+
+    def como_lista(self):
+        """Os produtos como lista de dicionários (formato antigo)."""
+        return [p.como_dict() for p in self]
+
+    def __eq__(self, outro):
+        if isinstance(outro, ItensNota):
+            return (self.descricoes == outro.descricoes and self.codigos == outro.codigos
+                    and self.cfops == outro.cfops and self.valores == outro.valores)
+        if isinstance(outro, list):
+            return self.como_lista() == outro
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return ItensNota, (self.descricoes, self.codigos, self.cfops, self.valores)
+
+    def __repr__(self):
+        return f'ItensNota({self.como_lista()!r})'
+
+
+_SEM_ITENS = ItensNota()
+
+
+class Nota(_Mapeamento):
+    """Nota extraída, com os campos em slots e os produtos em colunas.
+
+    Atributos:
+        tipo, numero, data, natureza, chave, status (str).
+        frete, impostos, total (float).
+        itens (ItensNota): produtos (chave "Produtos").
+    """
+
+    __slots__ = tuple(a for _, a in CAMPOS_NOTA)
+    _ATRIBUTOS = dict(CAMPOS_NOTA)
+
+    def __init__(self, tipo='', numero='', data='', frete=0.0, impostos=0.0, total=0.0, natureza='', chave='',
+                 status=AUTORIZADA, itens=None):
+        self.tipo = _internar(tipo)
+        self.numero = numero
+        self.data = _internar(data)
+        self.frete = frete
+        self.impostos = impostos
+        self.total = total
+        self.natureza = _internar(natureza)
+        self.chave = chave
+        self.status = _internar(status)
+        self.itens = _SEM_ITENS if not itens else ItensNota.de_itens(itens)
+
+    def __setitem__(self, chave, valor):
+        atributo = self._ATRIBUTOS.get(chave)
+        if atributo is None:
+            raise KeyError(f'Campo desconhecido na nota: {chave}')
+        if atributo == 'itens':
+            valor = ItensNota.de_itens(valor) if valor else _SEM_ITENS
+        setattr(self, atributo, _internar(valor))
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Nota a partir do dicionário no formato antigo de `extrair_dados_xml`."""
+        if isinstance(dados, Nota):
+            return dados
+        return cls(dados.get('Tipo', ''), dados.get('Número', ''), dados.get('Data', ''),
+                   dados.get('Frete (R$)', 0.0), dados.get('Impostos (R$)', 0.0), dados.get('Total (R$)', 0.0),
+                   dados.get('Natureza', ''), dados.get('Chave') or '', dados.get('Status', AUTORIZADA),
+                   dados.get('Produtos') or ())
+
+    def como_dict(self, produtos=True):
+        """A nota como dicionário puro; sem `produtos`, sem a chave "Produtos"."""
+        dados = {'Tipo': self.tipo, 'Número': self.numero, 'Data': self.data, 'Frete (R$)': self.frete,
+                 'Impostos (R$)': self.impostos, 'Total (R$)': self.total, 'Natureza': self.natureza,
+                 'Chave': self.chave, 'Status': self.status}
+        if produtos:
+            dados['Produtos'] = self.itens.como_lista()
+        return dados
+
+    def como_linha(self):
+        """Lista posicional serializável (campos da nota e colunas dos produtos)."""
+        itens = self.itens
+        return [self.tipo, self.numero, self.data, self.frete, self.impostos, self.total, self.natureza,
+                self.chave, self.status, list(itens.descricoes), list(itens.codigos), list(itens.cfops),
+                itens.valores.tolist()]
+
+    @classmethod
+    def de_linha(cls, linha):
+        """Inverso de `como_linha`."""
+        nota = cls(*linha[:9])
+        if linha[9]:
+            nota.itens = ItensNota(linha[9], linha[10], linha[11], linha[12])
+        return nota
+
+    def __reduce__(self):
+        return Nota, (self.tipo, self.numero, self.data, self.frete, self.impostos, self.total, self.natureza,
+                      self.chave, self.status, self.itens)
+
+
+def como_nota(dados):
+    """`Nota` a partir de uma nota, de um dicionário antigo ou de uma linha guardada."""
+    if isinstance(dados, Nota):
+        return dados
+    if isinstance(dados, list):
+        return Nota.de_linha(dados)
+    return Nota.de_dict(dados)
+
+
+def para_json(obj):
+    """`default` do json: notas, produtos e colunas de produtos em dicionários."""
+    if isinstance(obj, (Nota, Item)):
+        return obj.como_dict()
+    if isinstance(obj, ItensNota):
+        return obj.como_lista()
+    raise TypeError(f'Objeto do tipo {type(obj).__name__} não é serializável em JSON')
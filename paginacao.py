@@ -0,0 +1,178 @@
+"""paginacao
+=========
+
+Consulta paginada de um resultado do `/validate`.
+
+Em vez de devolver todas as notas (com todos os produtos) em um único
+JSON, o `/validate` pode responder só com o resumo do lote (`totais`) e
+a interface busca as notas aos poucos em `/notas/<id>`: páginas com
+`offset`/`limit`, filtro por Status e, opcionalmente, sem os produtos
+(só a quantidade), que então são buscados por nota em
+`/notas/<id>/itens`. A variante NDJSON (`linhas_ndjson`) envia uma nota
+por linha, para a página desenhar as linhas conforme chegam.
+
+Cada página precisaria desserializar o resultado inteiro do
+armazenamento; por isso as notas dos resultados consultados por último
+ficam em um cache LRU (`CacheNotas`, conferido pela versão do resultado
+no armazenamento; ver `cache_resultados`), já com as posições de cada
+Status indexadas, e uma página filtrada custa O(limit).
+"""
+
+import json
+
+from cache_resultados import CacheVersionado
+from eventos import CANCELADO
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+# notas por bloco de escrita na resposta NDJSON
+_NOTAS_POR_BLOCO = 200
+
+
+def totais(notas):
+    """Resumo do lote: quantidades e totais de autorizadas x canceladas.
+
+    Returns:
+        dict: notas, autorizadas, canceladas, itens, total_autorizadas e
+            total_canceladas.
+    """
+    n_canc, n_itens, total_aut, total_canc = 0, 0, 0.0, 0.0
+    for n in notas:
+        n_itens += len(n.get('Produtos') or ())
+        total = float(n.get('Total (R$)', 0.0))
+        if n.get('Status') == CANCELADO:
+            n_canc += 1
+            total_canc += total
+        else:
+            total_aut += total
+    return {'notas': len(notas), 'autorizadas': len(notas) - n_canc, 'canceladas': n_canc, 'itens': n_itens,
+            'total_autorizadas': round(total_aut, 2), 'total_canceladas': round(total_canc, 2)}
+
+
+class NotasResultado:
+    """Notas de um resultado com as posições de cada Status.
+
+    Atributos:
+        notas (list[Nota]): notas na ordem do resultado.
+        por_status (dict[str, list[int]]): Status -> posições em `notas`.
+    """
+
+    __slots__ = ('notas', 'por_status')
+
+    def __init__(self, notas):
+        self.notas = notas
+        self.por_status = {}
+        for i, n in enumerate(notas):
+            self.por_status.setdefault(n.get('Status') or '', []).append(i)
+
+    def posicoes(self, status=None):
+        """Posições das notas com o Status informado (todas, se None)."""
+        if status is None:
+            return range(len(self.notas))
+        return self.por_status.get(status, [])
+
+
+def _nota_sem_itens(nota, indice):
+    dados = nota.como_dict(produtos=False)
+    dados['indice'] = indice
+    dados['n_itens'] = len(nota.itens)
+    return dados
+
+
+def _nota_com_itens(nota, indice):
+    dados = nota.como_dict()
+    dados['indice'] = indice
+    dados['n_itens'] = len(nota.itens)
+    return dados
+
+
+def pagina_notas(resultado, offset=0, limit=LIMITE_PADRAO, status=None, itens=False):
+    """Uma página de notas, com a posição (`indice`) e a quantidade de itens.
+
+    Args:
+        resultado (NotasResultado): notas do resultado.
+        offset (int): notas (já filtradas) a pular.
+        limit (int): notas na página (até `LIMITE_MAXIMO`).
+        status (str, opcional): só notas com este Status.
+        itens (bool): incluir os `Produtos` de cada nota.
+
+    Returns:
+        dict: total (após o filtro), offset, limit, proximo (offset da
+            página seguinte ou None) e notas.
+    """
+    offset, limit = max(0, offset), max(0, min(limit, LIMITE_MAXIMO))
+    posicoes = resultado.posicoes(status)
+    montar = _nota_com_itens if itens else _nota_sem_itens
+    notas = [montar(resultado.notas[i], i) for i in posicoes[offset:offset + limit]]
+    fim = offset + len(notas)
+    return {'total': len(posicoes), 'offset': offset, 'limit': limit,
+            'proximo': fim if fim < len(posicoes) else None, 'notas': notas}
+
+
+def pagina_itens(resultado, offset=0, limit=LIMITE_PADRAO, status=None, nota=None):
+    """Uma página de itens (produtos), cada um com a posição e a Chave da nota.
+
+    Args:
+        resultado (NotasResultado): notas do resultado.
+        offset (int): itens (já filtrados) a pular.
+        limit (int): itens na página (até `LIMITE_MAXIMO`).
+        status (str, opcional): só itens de notas com este Status.
+        nota (int, opcional): só os itens da nota nesta posição.
+
+    Returns:
+        dict: total (após o filtro), offset, limit, proximo e itens.
+    """
+    offset, limit = max(0, offset), max(0, min(limit, LIMITE_MAXIMO))
+    if nota is not None:
+        posicoes = [nota] if 0 <= nota < len(resultado.notas) else []
+        if status is not None:
+            posicoes = [i for i in posicoes if (resultado.notas[i].get('Status') or '') == status]
+    else:
+        posicoes = resultado.posicoes(status)
+    itens, total = [], 0
+    for i in posicoes:
+        n = resultado.notas[i]
+        produtos = n.get('Produtos') or ()
+        # só as notas que tocam a janela têm os produtos copiados
+        inicio = max(0, offset - total)
+        if inicio < len(produtos) and len(itens) < limit:
+            chave = n.get('Chave') or ''
+            for j, p in enumerate(produtos[inicio:inicio + limit - len(itens)], inicio + 1):
+                itens.append(dict(p.como_dict(), nota=i, item=j, Chave=chave))
+        total += len(produtos)
+    fim = offset + len(itens)
+    return {'total': total, 'offset': offset, 'limit': limit,
+            'proximo': fim if fim < total else None, 'itens': itens}
+
+
+def linhas_ndjson(resultado, offset=0, limit=None, status=None, itens=False):
+    """Notas em NDJSON (uma por linha), em blocos de texto para uma resposta em streaming.
+
+    Sem `limit`, envia todas as notas a partir de `offset`.
+    """
+    posicoes = resultado.posicoes(status)
+    fim = len(posicoes) if limit is None else offset + max(0, limit)
+    montar = _nota_com_itens if itens else _nota_sem_itens
+    bloco = []
+    for i in posicoes[max(0, offset):fim]:
+        bloco.append(json.dumps(montar(resultado.notas[i], i), ensure_ascii=False, separators=(',', ':')))
+        if len(bloco) >= _NOTAS_POR_BLOCO:
+            yield '\n'.join(bloco) + '\n'
+            bloco = []
+    if bloco:
+        yield '\n'.join(bloco) + '\n'
+
+
+class CacheNotas(CacheVersionado):
+    """Cache LRU de `NotasResultado` por id de resultado.
+
+    Args:
+        max_itens (int): quantidade de resultados mantidos.
+        versao (callable, opcional): `versao(key)` devolve a versão atual
+            do resultado no armazenamento (None se não existe mais),
+            conferida a cada acerto.
+    """
+
+    def __init__(self, max_itens=4, versao=None):
+        super().__init__(max_itens, NotasResultado, versao)
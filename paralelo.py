@@ -0,0 +1,218 @@
+"""paralelo
+========
+
+Processamento de lotes de XMLs, sequencial ou em pool de processos.
+
+Os arquivos são divididos em blocos e cada bloco é processado por um
+processo do pool com `ValidadorFiscal.processar_arquivo` (uma leitura
+por arquivo: notas sem status + registros de eventos). Depois que todos
+os blocos terminam, os registros de todos os processos são mesclados em
+um único `IndiceEventos` e só então o status de cada nota é decidido —
+um cancelamento que está em um bloco vale para a nota de outro bloco.
+A ordem dos resultados é a mesma da entrada.
+
+O número de processos vem do argumento `workers` ou da variável de
+ambiente VALIDADOR_WORKERS (padrão 1, isto é, sequencial). Lotes de até
+VALIDADOR_LOTE_SEQUENCIAL arquivos (padrão 1) são processados no próprio
+processo, sem entrar na fila do pool: num servidor com várias threads, um
+upload pequeno não espera atrás dos blocos dos lotes grandes.
+
+Com um `CacheExtracao`, cada processo do pool abre o mesmo diretório de
+cache; os contadores de acertos e falhas dos processos são somados aos
+do cache do chamador ao fim de cada bloco. Da mesma forma, com `metricas`, cada
+bloco é medido no seu processo e as medidas voltam com o resultado.
+"""
+
+import atexit
+import collections
+import itertools
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_extracao import CacheExtracao
+from eventos import IndiceEventos
+from metricas import SEM_METRICAS, Metricas
+from validador_fiscal import ValidadorFiscal
+
+_POOL = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+_CACHES = {}  # caches abertos neste processo, por (diretório, max_bytes)
+
+
+def workers_configurados():
+    """Número de processos definido em VALIDADOR_WORKERS (mínimo 1)."""
+    try:
+        return max(1, int(os.environ.get('VALIDADOR_WORKERS', '1')))
+    except ValueError:
+        return 1
+
+
+def lote_sequencial_configurado():
+    """Maior lote processado sem o pool, de VALIDADOR_LOTE_SEQUENCIAL (mínimo 1)."""
+    try:
+        return max(1, int(os.environ.get('VALIDADOR_LOTE_SEQUENCIAL', '1')))
+    except ValueError:
+        return 1
+
+
+def obter_pool(workers):
+    """Retorna o pool de processos compartilhado, recriando-o se o tamanho mudou.
+
+    Manter o pool vivo entre requisições evita pagar a criação dos
+    processos a cada lote.
+    """
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            encerrar_pool()
+            _POOL = ProcessPoolExecutor(max_workers=workers)
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def aquecer_pool(workers=None):
+    """Cria o pool e inicia os seus processos agora.
+
+    Para chamar antes de o processo ter outras threads (ex.: no
+    `post_fork` do gunicorn): o fork de um processo com várias threads
+    pode levar para os filhos locks presos por outras threads.
+    """
+    workers = workers or workers_configurados()
+    if workers > 1:
+        obter_pool(workers).submit(os.getpid).result()
+
+
+@atexit.register
+def encerrar_pool():
+    global _POOL, _POOL_WORKERS
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+    _POOL = None
+    _POOL_WORKERS = 0
+
+
+def _cache_do_processo(config):
+    if config is None:
+        return None
+    cache = _CACHES.get(config)
+    if cache is None:
+        cache = _CACHES[config] = CacheExtracao(*config)
+    return cache
+
+
+def _processar_bloco(args):
+    # Executado no processo do pool: precisa ser uma função de módulo
+    caminhos, tipo, streaming, config_cache, medir = args
+    cache = _cache_do_processo(config_cache)
+    antes = (cache.acertos, cache.falhas) if cache is not None else (0, 0)
+    metricas = Metricas() if medir else None
+    validador = ValidadorFiscal(cache=cache, metricas=metricas)
+    resultados = [validador.processar_arquivo(c, tipo, streaming=streaming) for c in caminhos]
+    medidas = metricas.instantaneo() if medir else None
+    if cache is None:
+        return resultados, (0, 0), medidas
+    return resultados, (cache.acertos - antes[0], cache.falhas - antes[1]), medidas
+
+
+def _blocos(caminhos, tamanho):
+    # aceita qualquer iterável; só materializa um bloco por vez
+    it = iter(caminhos)
+    while True:
+        bloco = list(itertools.islice(it, tamanho))
+        if not bloco:
+            return
+        yield bloco
+
+
+def _mapear_limitado(pool, funcao, tarefas, em_voo):
+    # Como pool.map, na ordem das tarefas, mas com no máximo `em_voo`
+    # tarefas enviadas de cada vez: a entrada (ex.: membros de um ZIP)
+    # é lida à medida que o pool avança, e não toda de uma vez
+    pendentes = collections.deque()
+    for tarefa in tarefas:
+        pendentes.append(pool.submit(funcao, tarefa))
+        if len(pendentes) >= em_voo:
+            yield pendentes.popleft().result()
+    while pendentes:
+        yield pendentes.popleft().result()
+
+
+def processar_lote(caminhos, tipo, workers=None, tamanho_bloco=None, streaming=False,
+                   ao_progresso=None, cache=None, total=None, metricas=None, lote_sequencial=None):
+    """Processa um lote de arquivos e aplica o status com o índice do lote todo.
+
+    Args:
+        caminhos (iterable): arquivos XML (notas e eventos misturados):
+            caminhos ou `ConteudoXML` (ex.: membros de um `PacoteXML`).
+            É consumido sob demanda; sem `len()`, informe `total`.
+        tipo (str): tipo de nota (ex.: 'NF-e').
+        workers (int, opcional): número de processos; 1 processa no
+            processo atual. Padrão: `workers_configurados()`.
+        tamanho_bloco (int, opcional): arquivos por tarefa do pool. Por
+            padrão divide o lote em ~4 blocos por processo (máx. 64
+            arquivos por bloco).
+        streaming (bool): usa leitura incremental em cada arquivo.
+        ao_progresso (callable, opcional): chamado como
+            ``ao_progresso(arquivos_feitos, notas, erros)`` após cada arquivo
+            (sequencial) ou bloco (pool).
+        cache (CacheExtracao, opcional): cache de extração por conteúdo;
+            o status é sempre recalculado com o índice deste lote.
+        total (int, opcional): quantidade de arquivos, quando `caminhos`
+            não tem `len()`; usada só no tamanho padrão dos blocos.
+        metricas (Metricas, opcional): recebe os tempos por etapa e os
+            contadores, inclusive os medidos nos processos do pool.
+        lote_sequencial (int, opcional): lotes com até esta quantidade de
+            arquivos (`total`) não usam o pool. Padrão:
+            `lote_sequencial_configurado()`.
+
+    Returns:
+        tuple[list[ResultadoArquivo], IndiceEventos]: resultados na ordem
+            de `caminhos` (notas já com status) e o índice mesclado.
+    """
+    if total is None and hasattr(caminhos, '__len__'):
+        total = len(caminhos)
+    workers = workers or workers_configurados()
+    lote_sequencial = lote_sequencial or lote_sequencial_configurado()
+    contagem = {'notas': 0, 'erros': 0}
+
+    def _avancar(novos):
+        for r in novos:
+            contagem['notas'] += len(r.notas)
+            contagem['erros'] += 1 if r.erro else 0
+        if ao_progresso is not None:
+            ao_progresso(len(resultados), contagem['notas'], contagem['erros'])
+
+    resultados = []
+    if workers <= 1 or (total is not None and total <= lote_sequencial):
+        validador = ValidadorFiscal(cache=cache, metricas=metricas)
+        for c in caminhos:
+            resultados.append(validador.processar_arquivo(c, tipo, streaming=streaming))
+            _avancar(resultados[-1:])
+    else:
+        if not tamanho_bloco:
+            tamanho_bloco = max(1, min(64, math.ceil((total or 64 * workers * 4) / (workers * 4))))
+        pool = obter_pool(workers)
+        config_cache = (cache.diretorio, cache.max_bytes) if cache is not None else None
+        medir = metricas is not None and metricas.ativo
+        tarefas = ((bloco, tipo, streaming, config_cache, medir) for bloco in _blocos(caminhos, tamanho_bloco))
+        # preserva a ordem dos blocos
+        for parcial, (acertos, falhas), medidas in _mapear_limitado(pool, _processar_bloco, tarefas, workers * 2):
+            if cache is not None:
+                cache.somar(acertos, falhas)
+            if medidas is not None:
+                metricas.mesclar(medidas)
+            resultados.extend(parcial)
+            _avancar(parcial)
+
+    with (metricas or SEM_METRICAS).etapa('eventos'):
+        indice = IndiceEventos()
+        for r in resultados:
+            for registro in r.eventos:
+                indice.adicionar(registro)
+        validador = ValidadorFiscal()
+        for r in resultados:
+            validador.aplicar_status(r.notas, indice)
+    return resultados, indice
@@ -0,0 +1,182 @@
+"""relatorio_pdf
+=============
+
+Relatório PDF das notas extraídas, sem GUI e em paralelo.
+
+As notas são divididas em blocos consecutivos; cada bloco é desenhado
+como um PDF independente (com a tabela de itens de cada nota) por um
+processo do pool de `paralelo`, e os blocos são depois concatenados na
+ordem original com o pypdf. A primeira página traz o resumo do lote
+(quantidade de notas e totais autorizadas x canceladas).
+
+A geração respeita um prazo (`prazo`, em segundos): se os blocos não
+ficarem prontos a tempo, os pendentes são cancelados e `PrazoExcedido`
+é levantada — a aplicação web usa VALIDADOR_PDF_PRAZO como orçamento da
+requisição.
+"""
+
+import io
+import time
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+from eventos import CANCELADO
+
+NOTAS_POR_BLOCO = 250
+
+# após a célula, volta à margem esquerda na linha seguinte
+_PROXIMA_LINHA = {'new_x': 'LMARGIN', 'new_y': 'NEXT'}
+
+# Tabela de itens em fonte monoespaçada, uma célula por linha (cada
+# célula do fpdf custa ~0,1 ms; uma por coluna deixaria tudo 5x mais lento)
+_LINHA_ITEM = '{:<15.15} {:<50.50} {:^5.5} {:>15.15} {:>13.13}'
+_CABECALHO_ITENS = _LINHA_ITEM.format('Código', 'Produto', 'CFOP', 'Valor', 'Imposto')
+
+
+class PrazoExcedido(TimeoutError):
+    """A geração do relatório não terminou dentro do prazo."""
+
+
+def _texto(valor):
+    # As fontes padrão do PDF só cobrem latin-1
+    return str(valor).encode('latin-1', 'replace').decode('latin-1')
+
+
+def _moeda(valor):
+    try:
+        return f'{float(valor):,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+    except (TypeError, ValueError):
+        return '0,00'
+
+
+def _novo_pdf():
+    # fpdf só é carregado quando um relatório é de fato gerado
+    from fpdf import FPDF
+    pdf = FPDF(format='A4')
+    pdf.set_auto_page_break(True, margin=12)
+    pdf.set_margins(10, 10, 10)
+    pdf.add_page()
+    return pdf
+
+
+def resumo_capa(notas):
+    """(notas, canceladas, total autorizadas, total canceladas) para a capa."""
+    n_canc, total_aut, total_canc = 0, 0.0, 0.0
+    for n in notas:
+        total = float(n.get('Total (R$)', 0.0))
+        if n.get('Status') == CANCELADO:
+            n_canc += 1
+            total_canc += total
+        else:
+            total_aut += total
+    return len(notas), n_canc, total_aut, total_canc
+
+
+def _capa(pdf, capa):
+    quantidade, n_canc, total_aut, total_canc = capa
+    pdf.set_font('helvetica', 'B', 16)
+    pdf.cell(0, 10, _texto('Relatório de Validação Fiscal'), align='C', **_PROXIMA_LINHA)
+    pdf.set_font('helvetica', size=11)
+    pdf.cell(0, 6, _texto(f'Notas: {quantidade}  (canceladas: {n_canc})'),
+             **_PROXIMA_LINHA)
+    pdf.cell(0, 6, _texto(f'Total autorizadas: R$ {_moeda(total_aut)}   Total canceladas: R$ {_moeda(total_canc)}'),
+             **_PROXIMA_LINHA)
+    pdf.ln(6)
+
+
+def _nota(pdf, d):
+    pdf.set_font('helvetica', 'B', 11)
+    pdf.cell(0, 7, _texto(f"Nota: {d.get('Número', '')} - Chave: {d.get('Chave', '')}"),
+             **_PROXIMA_LINHA)
+    pdf.set_font('helvetica', size=9)
+    pdf.cell(0, 5, _texto(f"Tipo: {d.get('Tipo', '')}  Data: {d.get('Data', '')}  Status: {d.get('Status', '')}"
+                          f"  Natureza: {d.get('Natureza', '')}"), **_PROXIMA_LINHA)
+    pdf.cell(0, 5, _texto(f"Total: R$ {_moeda(d.get('Total (R$)', 0))}  Frete: R$ {_moeda(d.get('Frete (R$)', 0))}"
+                          f"  Impostos: R$ {_moeda(d.get('Impostos (R$)', 0))}"),
+             **_PROXIMA_LINHA)
+    produtos = d.get('Produtos') or []
+    if produtos:
+        pdf.set_font('courier', 'B', 7.5)
+        pdf.cell(0, 4.5, _texto(_CABECALHO_ITENS), border='B', **_PROXIMA_LINHA)
+        pdf.set_font('courier', size=7.5)
+        cell = pdf.cell
+        for p in produtos:
+            linha = _LINHA_ITEM.format(str(p.get('codigo', '')), str(p.get('descricao', '')), str(p.get('cfop', '')),
+                                       _moeda(p.get('vProd', 0)), _moeda(p.get('imposto', 0)))
+            cell(0, 3.8, _texto(linha), **_PROXIMA_LINHA)
+    pdf.ln(3)
+
+
+def renderizar_bloco(args):
+    """Desenha um bloco de notas como um PDF independente (bytes).
+
+    Executado nos processos do pool: recebe ``(notas, capa)``, onde `capa`
+    é o `resumo_capa` do lote inteiro quando o bloco é o primeiro, ou None.
+    """
+    notas, capa = args
+    pdf = _novo_pdf()
+    if capa is not None:
+        _capa(pdf, capa)
+    for d in notas:
+        _nota(pdf, d)
+    return bytes(pdf.output())
+
+
+def _juntar(partes, destino):
+    from pypdf import PdfWriter, PdfReader
+    escritor = PdfWriter()
+    for parte in partes:
+        escritor.append(PdfReader(io.BytesIO(parte)))
+    escritor.write(destino)
+    escritor.close()
+
+
+def gerar_pdf(notas, destino, workers=1, notas_por_bloco=NOTAS_POR_BLOCO, prazo=None):
+    """Gera o relatório PDF das notas em `destino`.
+
+    Args:
+        notas (list[dict]): notas no formato de `extrair_dados_xml`.
+        destino (str|file-like): caminho ou arquivo binário.
+        workers (int): processos usados para desenhar os blocos; 1 desenha
+            no processo atual.
+        notas_por_bloco (int): notas por bloco (unidade de paralelismo).
+        prazo (float, opcional): segundos disponíveis para a geração.
+
+    Returns:
+        int: quantidade de blocos gerados.
+
+    Raises:
+        PrazoExcedido: o prazo acabou antes de todos os blocos ficarem prontos.
+    """
+    limite = time.monotonic() + prazo if prazo else None
+    notas = list(notas)
+    capa = resumo_capa(notas)
+    tarefas = [(notas[i:i + notas_por_bloco], capa if i == 0 else None)
+               for i in range(0, max(len(notas), 1), notas_por_bloco)]
+
+    def restante():
+        if limite is None:
+            return None
+        falta = limite - time.monotonic()
+        if falta <= 0:
+            raise PrazoExcedido(f'Relatório não concluído em {prazo:g}s')
+        return falta
+
+    if workers <= 1 or len(tarefas) <= 1:
+        partes = []
+        for t in tarefas:
+            restante()
+            partes.append(renderizar_bloco(t))
+    else:
+        from paralelo import obter_pool
+        pool = obter_pool(workers)
+        futuros = [pool.submit(renderizar_bloco, t) for t in tarefas]
+        try:
+            partes = [f.result(timeout=restante()) for f in futuros]
+        except FuturesTimeout:
+            raise PrazoExcedido(f'Relatório não concluído em {prazo:g}s') from None
+        finally:
+            for f in futuros:
+                f.cancel()
+    restante()
+    _juntar(partes, destino)
+    return len(tarefas)
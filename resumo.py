@@ -0,0 +1,158 @@
+"""resumo
+======
+
+Resumo agregado de um resultado do `/validate` (painel de conferência).
+
+As notas de um resultado são carregadas uma única vez em dois DataFrames
+— notas e itens, cada item já com o Status da sua nota — e todas as
+agregações são group-bys vetorizados do pandas sobre eles: totais por
+status, por data, por natureza de operação e por CFOP, sempre separando
+o valor das notas autorizadas do das canceladas.
+
+Os DataFrames ficam em um cache LRU por id de resultado (`CacheFrames`),
+de modo que consultas repetidas do painel não reconstroem as tabelas;
+resultados expirados ou regravados (em qualquer worker) são montados de
+novo (ver `cache_resultados`). O pandas só é importado na primeira
+consulta.
+"""
+
+from cache_resultados import CacheVersionado
+from eventos import CANCELADO
+from modelo import ItensNota
+
+AGRUPAMENTOS = ('status', 'data', 'natureza', 'cfop')
+
+
+class FramesResultado:
+    """Notas e itens de um resultado em formato colunar.
+
+    Atributos:
+        notas (pandas.DataFrame): Tipo, Número, Data, Chave, Status,
+            Natureza, Frete, Impostos, Total (uma linha por nota).
+        itens (pandas.DataFrame): nota (posição da nota), Chave, cfop,
+            vProd, imposto e Status da nota (uma linha por produto).
+    """
+
+    __slots__ = ('notas', 'itens')
+
+    def __init__(self, notas, itens):
+        self.notas = notas
+        self.itens = itens
+
+
+def montar_frames(notas):
+    """Constrói os DataFrames de notas e itens a partir da lista de notas."""
+    import numpy as np
+    import pandas as pd
+    df_notas = pd.DataFrame({
+        'Tipo': [n.get('Tipo', '') for n in notas],
+        'Número': [str(n.get('Número', '')) for n in notas],
+        'Data': [n.get('Data', '') for n in notas],
+        'Chave': [n.get('Chave') or '' for n in notas],
+        'Status': [n.get('Status', '') for n in notas],
+        'Natureza': [n.get('Natureza', '') for n in notas],
+        'Frete': np.fromiter((float(n.get('Frete (R$)', 0.0)) for n in notas), float, len(notas)),
+        'Impostos': np.fromiter((float(n.get('Impostos (R$)', 0.0)) for n in notas), float, len(notas)),
+        'Total': np.fromiter((float(n.get('Total (R$)', 0.0)) for n in notas), float, len(notas)),
+    })
+    posicoes, cfops, vprods, impostos = [], [], [], []
+    for i, n in enumerate(notas):
+        produtos = n.get('Produtos', ())
+        if isinstance(produtos, ItensNota):
+            # colunas prontas: sem criar um Item por produto
+            posicoes.extend([i] * len(produtos))
+            cfops.extend(produtos.cfops)
+            vprods.extend(produtos.vprods())
+            impostos.extend(produtos.impostos())
+            continue
+        for p in produtos:
+            posicoes.append(i)
+            cfops.append(p.get('cfop', ''))
+            vprods.append(float(p.get('vProd', 0.0)))
+            impostos.append(float(p.get('imposto', 0.0)))
+    posicoes = np.asarray(posicoes, dtype=np.int64)
+    df_itens = pd.DataFrame({
+        'nota': posicoes,
+        'Chave': df_notas['Chave'].to_numpy()[posicoes],
+        'cfop': cfops,
+        'vProd': np.asarray(vprods, dtype=float),
+        'imposto': np.asarray(impostos, dtype=float),
+        'Status': df_notas['Status'].to_numpy()[posicoes],
+    })
+    return FramesResultado(df_notas, df_itens)
+
+
+def _registros(df):
+    # DataFrame agregado -> lista de dicts com valores arredondados
+    return df.round(2).reset_index().to_dict('records')
+
+
+def _por_chave(df, chave, valor, extras):
+    # Agrupa por `chave` somando `valor` (total, autorizadas, canceladas) e `extras`
+    import numpy as np
+    cancelada = (df['Status'] == CANCELADO).to_numpy()
+    v = df[valor].to_numpy()
+    base = df.assign(_autorizadas=np.where(cancelada, 0.0, v), _canceladas=np.where(cancelada, v, 0.0),
+                     _n_canceladas=cancelada.astype(np.int64))
+    agg = {
+        'quantidade': (valor, 'size'),
+        'canceladas': ('_n_canceladas', 'sum'),
+        'total': (valor, 'sum'),
+        'total_autorizadas': ('_autorizadas', 'sum'),
+        'total_canceladas': ('_canceladas', 'sum'),
+    }
+    for coluna in extras:
+        agg[coluna.lower()] = (coluna, 'sum')
+    return _registros(base.groupby(chave, sort=True).agg(**agg))
+
+
+def resumir(frames, por=AGRUPAMENTOS):
+    """Calcula o resumo de um resultado.
+
+    Args:
+        frames (FramesResultado): tabelas de `montar_frames`.
+        por (iterable[str]): agrupamentos desejados, entre 'status',
+            'data', 'natureza' e 'cfop'.
+
+    Returns:
+        dict: contagens e totais gerais (autorizadas x canceladas) e uma
+            lista de linhas para cada agrupamento pedido.
+    """
+    notas, itens = frames.notas, frames.itens
+    cancelada = (notas['Status'] == CANCELADO).to_numpy()
+    total = notas['Total'].to_numpy()
+    resumo = {
+        'notas': len(notas),
+        'itens': len(itens),
+        'notas_canceladas': int(cancelada.sum()),
+        'total_autorizadas': round(float(total[~cancelada].sum()), 2),
+        'total_canceladas': round(float(total[cancelada].sum()), 2),
+        'impostos_autorizadas': round(float(notas['Impostos'].to_numpy()[~cancelada].sum()), 2),
+        'frete_autorizadas': round(float(notas['Frete'].to_numpy()[~cancelada].sum()), 2),
+    }
+    por = [p for p in por if p in AGRUPAMENTOS]
+    if 'status' in por:
+        resumo['por_status'] = _registros(notas.groupby('Status', sort=True).agg(
+            quantidade=('Total', 'size'), total=('Total', 'sum'),
+            impostos=('Impostos', 'sum'), frete=('Frete', 'sum')))
+    if 'data' in por:
+        resumo['por_data'] = _por_chave(notas, 'Data', 'Total', ['Impostos'])
+    if 'natureza' in por:
+        resumo['por_natureza'] = _por_chave(notas, 'Natureza', 'Total', ['Impostos'])
+    if 'cfop' in por:
+        resumo['por_cfop'] = _por_chave(itens, 'cfop', 'vProd', ['imposto'])
+    return resumo
+
+
+class CacheFrames(CacheVersionado):
+    """Cache LRU de `FramesResultado` por id de resultado.
+
+    Args:
+        max_itens (int): quantidade de resultados mantidos.
+        versao (callable, opcional): `versao(key)` devolve a versão atual
+            do resultado no armazenamento (None se não existe mais),
+            conferida a cada acerto.
+    """
+
+    def __init__(self, max_itens=8, versao=None):
+        super().__init__(max_itens, montar_frames, versao)
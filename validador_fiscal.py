@@ -16,22 +16,154 @@ Responsável: Gustavo Andrade
 Última revisão: 2026-02-20
 """
 
+import io
+import os
+import traceback
 import xml.etree.ElementTree as ET
-import pandas as pd
-from fpdf import FPDF
+from array import array
 from datetime import datetime
 
+from eventos import (AUTORIZADA, CANCELADO, TAGS_CHAVE_EVENTO, IndiceEventos, RegistroEvento,
+                     decidir_status, registro_de_arvore, texto_indica_cancelamento)
+from extrator import extrator_da_raiz, extrator_do_documento, iterar_incremental, nome_local
+from cache_extracao import desempacotar_resultado, empacotar_resultado, hash_conteudo
+from metricas import SEM_METRICAS
+from modelo import ItensNota, Nota
+
+
+class DocumentoXML:
+    """Documento XML parseado uma única vez e já classificado.
+
+    Atributos:
+        origem (str): identificação do arquivo (caminho ou nome do upload).
+        root (xml.etree.ElementTree.Element): elemento raiz.
+        classe (str): 'nota' (contém a raiz de um documento conhecido:
+            infNFe, infCte, infMDFe, infNFSe), 'evento' (contém chNFe,
+            chCTe ou chMDFe, mas não uma nota) ou 'desconhecido'.
+        extrator (ExtratorCompilado|None): extrator do perfil da nota.
+    """
+
+    NOTA = 'nota'
+    EVENTO = 'evento'
+    DESCONHECIDO = 'desconhecido'
+
+    __slots__ = ('origem', 'root', 'classe', 'extrator')
+
+    def __init__(self, origem, root, classe, extrator=None):
+        self.origem = origem
+        self.root = root
+        self.classe = classe
+        self.extrator = extrator
+
+
+class ConteudoXML:
+    """XML ainda não parseado, já em memória (ex.: membro de um ZIP).
+
+    Atributos:
+        origem (str): identificação do documento (ex.: 'lote.zip:nfe1.xml').
+        dados (bytes): conteúdo do XML.
+    """
+
+    __slots__ = ('origem', 'dados')
+
+    def __init__(self, origem, dados):
+        self.origem = origem
+        self.dados = dados
+
+
+_BYTES = (bytes, bytearray, memoryview)
+
+
+def origem_da_fonte(fonte):
+    """Identificação de uma fonte XML (caminho, nome do upload...) para logs e resultados."""
+    if isinstance(fonte, (ConteudoXML, DocumentoXML)):
+        return fonte.origem
+    if isinstance(fonte, (str, os.PathLike)):
+        return os.fspath(fonte)
+    if isinstance(fonte, _BYTES):
+        return '<bytes>'
+    nome = getattr(fonte, 'filename', None) or getattr(fonte, 'name', None)
+    return nome if isinstance(nome, str) else '<stream>'
+
+
+def _para_parser(fonte):
+    # bytes e ConteudoXML viram BytesIO; caminhos e arquivos passam como estão
+    if isinstance(fonte, ConteudoXML):
+        return io.BytesIO(fonte.dados)
+    if isinstance(fonte, _BYTES):
+        return io.BytesIO(fonte)
+    if isinstance(fonte, os.PathLike):
+        return os.fspath(fonte)
+    return fonte
+
+
+def _tamanho_fonte(fonte):
+    # Bytes da fonte, quando sabidos sem lê-la (None para streams)
+    if isinstance(fonte, ConteudoXML):
+        return len(fonte.dados)
+    if isinstance(fonte, _BYTES):
+        return len(fonte)
+    if isinstance(fonte, (str, os.PathLike)):
+        try:
+            return os.path.getsize(fonte)
+        except OSError:
+            return None
+    return None
+
+
+def _ler_conteudo(fonte):
+    # Bytes do XML (lendo caminhos e arquivos); None para árvores já parseadas
+    if isinstance(fonte, ConteudoXML):
+        return fonte.dados
+    if isinstance(fonte, _BYTES):
+        return bytes(fonte)
+    if isinstance(fonte, (str, os.PathLike)):
+        with open(fonte, 'rb') as fh:
+            return fh.read()
+    if hasattr(fonte, 'read'):
+        return fonte.read()
+    return None
+
+
+class ResultadoArquivo:
+    """Resultado do processamento de um arquivo XML.
+
+    Atributos:
+        origem (str): identificação do arquivo.
+        notas (list[Nota]): notas extraídas (formato de `extrair_dados_xml`),
+            com status ainda não aplicado.
+        eventos (list[RegistroEvento]): eventos encontrados no arquivo.
+        erro (tuple[str, str]|None): (fase, traceback) quando o arquivo
+            falhou; fase é 'parse' ou 'extracao'.
+    """
+
+    __slots__ = ('origem', 'notas', 'eventos', 'erro')
+
+    def __init__(self, origem, notas=None, eventos=None, erro=None):
+        self.origem = origem
+        self.notas = notas if notas is not None else []
+        self.eventos = eventos if eventos is not None else []
+        self.erro = erro
+
+
 class ValidadorFiscal:
     """Classe principal para extração e formatação de informações fiscais.
 
     Atributos:
         dados_extracao (list|dict): resultado(s) da extração. Pode ser uma
             lista de dicionários (várias notas) ou um dicionário único.
+        cache (CacheExtracao|None): cache de extração por conteúdo; quando
+            presente, arquivos já vistos não são parseados novamente.
+        metricas (Metricas): instrumentação de `processar_arquivo` (tempo
+            por etapa, arquivos, notas, itens e bytes); por padrão
+            `SEM_METRICAS`, que não mede nada.
     """
 
-    def __init__(self):
+    def __init__(self, cache=None, metricas=None):
         # Pode armazenar um único dicionário (último arquivo) ou uma lista de dicionários (vários arquivos)
         self.dados_extracao = []
+        self.cache = cache
+        self.metricas = metricas if metricas is not None else SEM_METRICAS
 
     def limpar_tag(self, tag):
         """Remove namespace XML de uma tag e retorna apenas o nome.
@@ -66,6 +198,152 @@ class ValidadorFiscal:
                 return elemento.text or "0.00"
         return "0.00"
 
+    def classificar_documento(self, caminho):
+        """Parseia um arquivo XML uma única vez e classifica o documento.
+
+        O resultado pode ser passado tanto para `build_events_index`
+        quanto para `extrair_dados_xml`, evitando novos parses do mesmo
+        arquivo. Erros de parse são propagados ao chamador.
+
+        Args:
+            caminho (str|bytes|file-like|ConteudoXML): caminho, conteúdo
+                ou arquivo binário aberto (ex.: stream de um upload).
+
+        Returns:
+            DocumentoXML: documento parseado e classificado.
+        """
+        root = ET.parse(_para_parser(caminho)).getroot()
+        classe = DocumentoXML.DESCONHECIDO
+        for el in root.iter():
+            # a primeira raiz de documento conhecida escolhe o perfil
+            extrator = extrator_da_raiz(el.tag)
+            if extrator is not None:
+                return DocumentoXML(origem_da_fonte(caminho), root, DocumentoXML.NOTA, extrator)
+            if el.text and nome_local(el.tag) in TAGS_CHAVE_EVENTO:
+                classe = DocumentoXML.EVENTO
+        return DocumentoXML(origem_da_fonte(caminho), root, classe)
+
+    def _raiz(self, fonte):
+        # Aceita documento já classificado, elemento, caminho, bytes ou arquivo
+        if isinstance(fonte, DocumentoXML):
+            return fonte.root
+        if isinstance(fonte, ET.Element):
+            return fonte
+        return ET.parse(_para_parser(fonte)).getroot()
+
+    def processar_arquivo(self, caminho, tipo, streaming=False):
+        """Processa um arquivo inteiro: notas e eventos em uma leitura.
+
+        É a unidade de trabalho do processamento em lote (sequencial ou
+        em pool de processos): o arquivo é lido uma única vez, as notas
+        são extraídas sem status e os eventos reduzidos a registros. O
+        status é aplicado depois, com o índice de todo o lote, por
+        `aplicar_status`. Erros não são propagados; ficam em `erro`.
+
+        Com `cache`, o resultado de arquivos já vistos (mesmo conteúdo) é
+        lido do cache sem parse; resultados com erro não são guardados.
+
+        Args:
+            caminho (str|bytes|file-like|ConteudoXML): caminho para o
+                arquivo XML, conteúdo já em memória (ex.: membro de um ZIP)
+                ou arquivo binário aberto (ex.: stream de um upload).
+            tipo (str): tipo de nota (ex.: 'NF-e').
+            streaming (bool): usa leitura incremental (lotes com várias
+                notas, memória constante).
+
+        Returns:
+            ResultadoArquivo: notas, eventos e erro (se houver).
+        """
+        m = self.metricas
+        if not m.ativo:
+            return self._processar_arquivo(caminho, tipo, streaming)
+        tamanho = _tamanho_fonte(caminho)
+        resultado = self._processar_arquivo(caminho, tipo, streaming)
+        m.contar('arquivos')
+        if tamanho is not None:
+            m.contar('bytes', tamanho)
+        m.contar('notas', len(resultado.notas))
+        m.contar('itens', sum(len(d.get('Produtos') or ()) for d in resultado.notas))
+        m.contar('eventos', len(resultado.eventos))
+        if resultado.erro:
+            m.contar('erros_' + resultado.erro[0])
+        return resultado
+
+    def _processar_arquivo(self, caminho, tipo, streaming):
+        origem = origem_da_fonte(caminho)
+        if self.cache is None:
+            return self._processar_fonte(_para_parser(caminho), origem, tipo, streaming)
+        m = self.metricas
+        try:
+            with m.etapa('leitura'):
+                if streaming and isinstance(caminho, (str, os.PathLike)):
+                    # no streaming o arquivo não é carregado inteiro na memória
+                    fonte = os.fspath(caminho)
+                    digest = hash_conteudo(fonte)
+                else:
+                    conteudo = _ler_conteudo(caminho)
+                    digest, fonte = hash_conteudo(conteudo), io.BytesIO(conteudo)
+        except (OSError, TypeError):
+            return self._processar_fonte(_para_parser(caminho), origem, tipo, streaming)
+        chave = self.cache.chave(digest, 'streaming' if streaming else 'arquivo')
+        with m.etapa('cache'):
+            guardado = self.cache.obter(chave, lambda entrada: desempacotar_resultado(entrada, tipo))
+            if guardado is not None:
+                notas, eventos = guardado
+                return ResultadoArquivo(origem, notas, eventos)
+        resultado = self._processar_fonte(fonte, origem, tipo, streaming)
+        if resultado.erro is None:
+            with m.etapa('cache'):
+                self.cache.guardar(chave, empacotar_resultado(resultado.notas, resultado.eventos))
+        return resultado
+
+    def _processar_fonte(self, fonte, origem, tipo, streaming):
+        # Corpo de `processar_arquivo`: `fonte` é o que o parser lê e
+        # `origem` a identificação do arquivo no resultado
+        resultado = ResultadoArquivo(origem)
+        m = self.metricas
+        if streaming:
+            # leitura e extração se intercalam: 'parse' fica com o que não
+            # é montagem das notas
+            try:
+                with m.etapa('parse'):
+                    for classe, item in iterar_incremental(fonte):
+                        if classe == 'nota':
+                            with m.etapa('extracao'):
+                                resultado.notas.append(self._montar_dados(item, tipo))
+                        else:
+                            resultado.eventos.append(item)
+            except Exception:
+                resultado.erro = ('extracao', traceback.format_exc())
+            return resultado
+
+        try:
+            with m.etapa('parse'):
+                doc = self.classificar_documento(fonte)
+        except Exception:
+            resultado.erro = ('parse', traceback.format_exc())
+            return resultado
+        # só documentos de evento viram registro: o protocolo da própria
+        # nota (chNFe em infProt) não é evento
+        if doc.classe == DocumentoXML.EVENTO:
+            with m.etapa('eventos'):
+                registro = registro_de_arvore(doc.root)
+            if registro is not None:
+                resultado.eventos.append(registro)
+        elif doc.classe == DocumentoXML.NOTA:
+            try:
+                with m.etapa('extracao'):
+                    resultado.notas.append(self.extrair_dados_xml(doc, tipo))
+            except Exception:
+                resultado.erro = ('extracao', traceback.format_exc())
+        return resultado
+
+    def aplicar_status(self, notas, events_index):
+        """Atualiza o campo Status das notas a partir do índice de eventos."""
+        for dados in notas:
+            dados['Status'] = self._status_por_eventos(dados.get('Chave') or None, events_index)
+        return notas
+
     def processar_xml(self, caminho, tipo):
         """Processa um arquivo XML e retorna um relatório textual.
 
@@ -75,7 +353,8 @@ class ValidadorFiscal:
         erro, captura a exceção e retorna uma string de erro.
 
         Args:
-            caminho (str): caminho para o arquivo XML.
+            caminho (str|bytes|file-like): caminho, conteúdo ou arquivo
+                binário aberto.
             tipo (str): tipo de nota (ex.: 'NF-e').
 
         Returns:
@@ -95,68 +374,116 @@ class ValidadorFiscal:
 
         Analisa o XML em `caminho` e extrai número, data, totais,
         natureza, chave de acesso, status (usando opcionalmente
-        `events_index`) e lista de produtos. O retorno é um dicionário
-        pronto para uso pela camada de apresentação ou exportação.
+        `events_index`) e lista de produtos. Os campos vêm do perfil do
+        tipo de documento (NF-e/NFC-e, CT-e, MDF-e, NFS-e), escolhido pela
+        raiz do XML; o Tipo da nota é o do documento e `tipo` só vale
+        para XMLs sem raiz conhecida, extraídos pelo perfil genérico.
 
         Args:
-            caminho (str): caminho para o arquivo XML da nota.
-            tipo (str): tipo de nota (ex.: 'NF-e').
+            caminho (str|bytes|file-like|DocumentoXML): caminho para o
+                arquivo XML da nota, seu conteúdo, um arquivo binário aberto
+                ou documento já parseado por `classificar_documento`.
+            tipo (str): tipo de nota para documentos sem raiz conhecida
+                (ex.: 'NF-e').
             events_index (dict, opcional): índice de eventos para determinar
-                status (ex.: cancelamentos) no formato {chave: [eventos]}.
+                status (ex.: cancelamentos); normalmente o `IndiceEventos`
+                de `build_events_index`, ou um dict {chave: [eventos]}.
 
         Returns:
-            dict: dicionário com as chaves: Tipo, Número, Data, Frete (R$),
-                  Impostos (R$), Total (R$), Natureza, Chave, Status, Produtos.
+            Nota: nota compacta (`modelo.Nota`) que se comporta como um
+                  dicionário com as chaves: Tipo, Número, Data, Frete (R$),
+                  Impostos (R$), Total (R$), Natureza, Chave, Status,
+                  Produtos; `como_dict()` devolve o dicionário puro.
         """
         # Retorna um dicionário com os campos extraídos do XML (nota)
-        tree = ET.parse(caminho)
-        root = tree.getroot()
-
-        numero = self.buscar_valor(root, ['nNF', 'Numero', 'numNota', 'nCT', 'nMDF'])
-        data = self.buscar_valor(root, ['dhEmi', 'DataEmissao', 'dEmi', 'dhEmiS'])
-        v_nota = self.buscar_valor(root, ['vNF', 'vServ', 'vLiquido', 'vProd', 'vTPrest'])
-        v_frete = self.buscar_valor(root, ['vFrete', 'vFreteT'])
-        v_imp = self.buscar_valor(root, ['vTotTrib', 'vICMS', 'vISS', 'vTot'])
-        natureza = self.buscar_valor(root, ['natOp', 'natureza'])
-
-        # Extrair chave de acesso da tag infNFe/@Id se existir
-        chave = None
-        for elemento in root.iter():
-            if self.limpar_tag(elemento.tag).lower() == 'infnfe':
-                chave_attr = elemento.attrib.get('Id') or elemento.attrib.get('ID')
-                if chave_attr:
-                    chave = chave_attr.replace('NFe', '').strip()
-                    break
+        if self.cache is not None and not isinstance(caminho, (DocumentoXML, ET.Element)):
+            conteudo = _ler_conteudo(caminho)
+            # o tipo só altera o Tipo dos documentos sem raiz conhecida
+            chave = self.cache.chave(hash_conteudo(conteudo), 'nota-' + tipo)
+            dados = self.cache.obter(chave, lambda entrada: desempacotar_resultado(entrada, tipo)[0][0])
+            if dados is not None:
+                dados['Status'] = self._status_por_eventos(dados.get('Chave') or None, events_index)
+                return dados
+            root = ET.fromstring(conteudo)
+            dados = self._montar_dados(extrator_do_documento(root).extrair(root), tipo, events_index)
+            self.cache.guardar(chave, empacotar_resultado([dados], []))
+            return dados
+
+        root = self._raiz(caminho)
+        extrator = caminho.extrator if isinstance(caminho, DocumentoXML) else None
+
+        # Todos os campos (cabeçalho, produtos e impostos) em uma única passagem
+        extraido = (extrator or extrator_do_documento(root)).extrair(root)
+        return self._montar_dados(extraido, tipo, events_index)
+
+    def iterar_notas(self, caminho, tipo, events_index=None):
+        """Extrai notas de um XML em modo streaming (leitura incremental).
+
+        Cada nota é devolvida assim que a sua raiz (`infNFe`, `infCte`...)
+        termina de ser lida e os elementos já processados são descartados, mantendo a
+        memória constante mesmo em arquivos muito grandes. Aceita
+        documentos isolados e contêineres com várias notas (lotes
+        `enviNFe`, vários `nfeProc`, lotes de distribuição com `docZip`).
+
+        Para determinar o status, construa antes o índice com
+        `build_events_index(arquivos, streaming=True)`.
+
+        Args:
+            caminho (str|bytes|file-like): caminho, conteúdo ou arquivo
+                binário.
+            tipo (str): tipo de nota (ex.: 'NF-e').
+            events_index (dict, opcional): índice de eventos.
+
+        Yields:
+            Nota: mesmo formato de `extrair_dados_xml`.
+        """
+        for classe, item in iterar_incremental(_para_parser(caminho)):
+            if classe == 'nota':
+                yield self._montar_dados(item, tipo, events_index)
 
-        # Se não conseguiu, tenta buscar por tag 'chNFe' (algumas notas tem)
+    def _status_por_eventos(self, chave, events_index):
+        # Determinar status usando index de eventos (se fornecido)
+        if not events_index or not chave:
+            return AUTORIZADA
+        if isinstance(events_index, IndiceEventos):
+            # status já decidido na indexação: consulta O(1)
+            return events_index.status(chave)
+        # índice montado pelo chamador no formato antigo {chave: [eventos]}
+        for ev in events_index.get(chave, []):
+            if isinstance(ev, RegistroEvento):
+                if ev.status == CANCELADO:
+                    return CANCELADO
+                continue
+            # ev pode ser dict com tpEvento/xEvento/root ou o próprio root
+            tp = ev.get('tpEvento') if isinstance(ev, dict) else None
+            xev = ev.get('xEvento') if isinstance(ev, dict) else None
+            root_ev = ev.get('root') if isinstance(ev, dict) else ev
+            no_texto = root_ev is not None and any(
+                texto_indica_cancelamento((el.text or '').lower()) for el in root_ev.iter())
+            if decidir_status(tp, xev, no_texto) == CANCELADO:
+                return CANCELADO
+        return AUTORIZADA
+
+    def _montar_dados(self, extraido, tipo, events_index=None):
+        # Converte os valores brutos do extrator na `Nota`; o Tipo é o do
+        # perfil do documento, quando reconhecido
+        tipo = extraido.tipo or tipo
+        numero = extraido.valor('numero')
+        data = extraido.valor('data')
+        v_nota = extraido.valor('total')
+        v_frete = extraido.valor('frete')
+        v_imp = extraido.valor('impostos')
+        natureza = extraido.valor('natureza')
+
+        # Chave de acesso: atributo Id da raiz (infNFe, infCte...); na falta,
+        # a tag de chave do perfil (chNFe no protocolo...)
+        chave = extraido.chave_id
         if not chave:
-            ch = self.buscar_valor(root, ['chNFe', 'chave'])
+            ch = extraido.valor('chave')
             if ch and ch != '0.00':
                 chave = ch.strip()
 
-        # Determinar status usando index de eventos (se fornecido)
-        status = 'Autorizada'
-        if events_index and chave:
-            evs = events_index.get(chave, [])
-            if evs:
-                for ev in evs:
-                    # ev pode ser dict com tpEvento/xEvento/root
-                    tp = ev.get('tpEvento') if isinstance(ev, dict) else None
-                    xev = ev.get('xEvento') if isinstance(ev, dict) else None
-                    root_ev = ev.get('root') if isinstance(ev, dict) else ev
-                    # 1) checagem por tpEvento
-                    if tp and str(tp).strip() == '110111':
-                        status = 'Cancelado'
-                        break
-                    # 2) checagem por texto do evento (xEvento) ou conteúdo
-                    txt = ''
-                    if xev:
-                        txt += str(xev).lower()
-                    if root_ev is not None:
-                        txt += ''.join([(el.text or '').lower() for el in root_ev.iter()])
-                    if 'cancelamento' in txt or 'cancelado' in txt or 'cancel' in txt or '110111' in txt:
-                        status = 'Cancelado'
-                        break
+        status = self._status_por_eventos(chave, events_index)
 
         # converte valores numéricos com segurança
         def to_float_safe(v):
@@ -165,56 +492,22 @@ class ValidadorFiscal:
             except:
                 return 0.0
 
-        # Extrair lista de produtos (det/prod)
-        produtos = []
-        for det in root.iter():
-            # procurar elementos 'det' que contenham 'prod'
-            if self.limpar_tag(det.tag).lower() == 'det':
-                prod_el = None
-                for child in det:
-                    if self.limpar_tag(child.tag).lower() == 'prod':
-                        prod_el = child
-                        break
-                if prod_el is None:
-                    continue
-                # extrair descrição, CFOP, vProd
-                desc = self.buscar_valor(prod_el, ['xProd', 'descr', 'descricao'])
-                codigo = self.buscar_valor(prod_el, ['cProd', 'codigo', 'cProdItem'])
-                cfop = self.buscar_valor(prod_el, ['CFOP', 'cfop'])
-                vprod = self.buscar_valor(prod_el, ['vProd', 'vproduto', 'vProdItem'])
-                # calcular imposto do produto somando tags comuns dentro do det (vICMS, vIPI, vPIS, vCOFINS, vII)
-                imposto_tags = ['vICMS', 'vIPI', 'vPIS', 'vCOFINS', 'vII', 'vST']
-                imposto_total = 0.0
-                for tag in imposto_tags:
-                    val = None
-                    # busca no nó 'det' inteiro por essas tags
-                    for el in det.iter():
-                        if self.limpar_tag(el.tag).lower() == tag.lower() and el.text:
-                            try:
-                                imposto_total += float(el.text.replace(',', '.'))
-                            except:
-                                pass
-                produtos.append({
-                    'descricao': desc if desc and desc != '0.00' else '',
-                    'codigo': codigo if codigo and codigo != '0.00' else '',
-                    'cfop': cfop if cfop and cfop != '0.00' else '',
-                    'vProd': float(str(vprod).replace(',', '.')) if vprod and vprod != '0.00' else 0.0,
-                    'imposto': imposto_total
-                })
-
-        dados = {
-            "Tipo": tipo,
-            "Número": numero,
-            "Data": data[:10] if data and data != '0.00' else "N/A",
-            "Frete (R$)": to_float_safe(v_frete),
-            "Impostos (R$)": to_float_safe(v_imp),
-            "Total (R$)": to_float_safe(v_nota),
-            "Natureza": natureza,
-            "Chave": chave or '',
-            "Status": status,
-            "Produtos": produtos
-        }
-        return dados
+        # Produtos (det/prod) com imposto somado por det, direto em colunas
+        descricoes, codigos, cfops, valores = [], [], [], array('d')
+        for campos, imposto_total in extraido.itens:
+            desc = campos.get('descricao', '0.00')
+            codigo = campos.get('codigo', '0.00')
+            cfop = campos.get('cfop', '0.00')
+            vprod = campos.get('vProd', '0.00')
+            descricoes.append(desc if desc and desc != '0.00' else '')
+            codigos.append(codigo if codigo and codigo != '0.00' else '')
+            cfops.append(cfop if cfop and cfop != '0.00' else '')
+            valores.append(float(str(vprod).replace(',', '.')) if vprod and vprod != '0.00' else 0.0)
+            valores.append(imposto_total)
+
+        return Nota(tipo, numero, data[:10] if data and data != '0.00' else "N/A", to_float_safe(v_frete),
+                    to_float_safe(v_imp), to_float_safe(v_nota), natureza, chave or '', status,
+                    ItensNota(descricoes, codigos, cfops, valores))
 
     def formatar_relatorio_texto(self, d):
         return (f"RELATÓRIO GERADO\n{'='*20}\n"
@@ -222,34 +515,35 @@ class ValidadorFiscal:
                 f"Frete: R$ {d['Frete (R$)']:.2f}\nImpostos: R$ {d['Impostos (R$)']:.2f}\n"
                 f"Total: R$ {d['Total (R$)']:.2f}\nNatureza: {d.get('Natureza','')}\nStatus: {d.get('Status','')}")
 
-    def build_events_index(self, file_paths):
-        """Constroi um dicionário chave->lista de roots de eventos encontrados nos arquivos fornecidos."""
-        index = {}
+    def build_events_index(self, file_paths, streaming=False):
+        """Constroi o índice chave->eventos a partir dos arquivos fornecidos.
+
+        Aceita caminhos, conteúdos (bytes, `ConteudoXML`), arquivos
+        binários abertos ou documentos já parseados (`DocumentoXML`);
+        estes últimos não são lidos novamente. Cada documento é reduzido a um
+        `RegistroEvento` (chave, tipo, sequência, data do protocolo e
+        status já decidido) e nenhuma árvore XML fica retida no índice.
+
+        Com `streaming=True` os arquivos são lidos de forma incremental e
+        cada `procEvento*` (ou `infEvento` solto) gera um registro; arquivos
+        com vários eventos (lotes) geram um registro por evento.
+
+        Returns:
+            IndiceEventos: dicionário chave -> [RegistroEvento], com
+                `status(chave)` em O(1).
+        """
+        index = IndiceEventos()
         for f in file_paths:
             try:
-                tree = ET.parse(f)
-                root = tree.getroot()
-                # procura por tag chNFe e também tpEvento/xEvento quando presentes
-                chave = None
-                tpEvento = None
-                xEvento = None
-                for el in root.iter():
-                    tag = self.limpar_tag(el.tag).lower()
-                    if tag == 'chnfe' and el.text:
-                        chave = el.text.strip()
-                    if tag == 'tpevento' and el.text:
-                        tpEvento = el.text.strip()
-                    if tag == 'xevento' and el.text:
-                        xEvento = el.text.strip()
-                # heurística adicional: algumas estruturas usam 'chNFe' em diferentes níveis
-                if not chave:
-                    for el in root.iter():
-                        if self.limpar_tag(el.tag).lower() == 'chnfe' and el.text:
-                            chave = el.text.strip()
-                            break
-                # se encontrou chave, guarda um dict com informações relevantes
-                if chave:
-                    index.setdefault(chave, []).append({'tpEvento': tpEvento, 'xEvento': xEvento, 'root': root})
+                if streaming:
+                    for classe, registro in iterar_incremental(_para_parser(f)):
+                        if classe == 'evento':
+                            index.adicionar(registro)
+                    continue
+                # procura por chNFe, tpEvento/xEvento, nSeqEvento e dhRegEvento
+                registro = registro_de_arvore(self._raiz(f))
+                if registro is not None:
+                    index.adicionar(registro)
             except Exception:
                 continue
         return index
@@ -278,128 +572,13 @@ class ValidadorFiscal:
         if not caminho:
             return
 
-        # Preparar dados: construir linhas com notas e linhas de produtos abaixo
-        # Ordem de colunas requerida: Tipo, Data, Número, Natureza de Operação, Status, Frete, Impostos, Total
-        # Colunas de produto à direita: Produto, CFOP, Valor Produto, Imposto Produto
-        rows = []
+        # Uma linha por nota e, abaixo, as linhas de produtos agrupadas
+        # (outline); mesmo motor usado pelo /download da aplicação web
         notas = self.dados_extracao if isinstance(self.dados_extracao, list) else [self.dados_extracao]
-        for nota in notas:
-            row_note = {
-                'Tipo': nota.get('Tipo',''),
-                'Data': nota.get('Data',''),
-                'Número': nota.get('Número',''),
-                'Natureza de Operação': nota.get('Natureza',''),
-                'Status': nota.get('Status',''),
-                'Frete': nota.get('Frete (R$)',0.0),
-                'Impostos': nota.get('Impostos (R$)',0.0),
-                'Total': nota.get('Total (R$)',0.0),
-                'Produto': '',
-                'CFOP': '',
-                'Valor Produto': '',
-                'Imposto Produto': ''
-            }
-            rows.append({'row': row_note, 'level': 0})
-            # produtos
-            for p in nota.get('Produtos', []):
-                row_prod = {
-                    'Tipo': '',
-                    'Data': '',
-                    'Número': '',
-                    'Natureza de Operação': '',
-                    'Status': '',
-                    'Frete': '',
-                    'Impostos': '',
-                    'Total': '',
-                    'Código Produto': p.get('codigo',''),
-                    'Produto': p.get('descricao',''),
-                    'CFOP': p.get('cfop',''),
-                    'Valor Produto': p.get('vProd',0.0),
-                    'Imposto Produto': p.get('imposto',0.0)
-                }
-                rows.append({'row': row_prod, 'level': 1})
-
-        # Escrever Excel usando xlsxwriter para aplicar outline levels (grouping)
         try:
-            with pd.ExcelWriter(caminho, engine='xlsxwriter') as writer:
-                workbook = writer.book
-                worksheet = workbook.add_worksheet('Notas')
-                writer.sheets['Notas'] = worksheet
-
-                # cabeçalho
-                headers = ['Tipo','Data','Número','Natureza de Operação','Status','Frete','Impostos','Total','Código Produto','Produto','CFOP','Valor Produto','Imposto Produto']
-                header_format = workbook.add_format({'bold': True, 'bg_color': '#DCE6F1'})
-                for c, h in enumerate(headers):
-                    worksheet.write(0, c, h, header_format)
-
-                # escrever linhas manualmente para setar outline levels
-                row_idx = 1
-                money_fmt = workbook.add_format({'num_format': '#,##0.00'})
-                for item in rows:
-                    r = item['row']
-                    lvl = item['level']
-                    worksheet.write(row_idx, 0, r.get('Tipo',''))
-                    worksheet.write(row_idx, 1, r.get('Data',''))
-                    worksheet.write(row_idx, 2, r.get('Número',''))
-                    worksheet.write(row_idx, 3, r.get('Natureza de Operação',''))
-                    worksheet.write(row_idx, 4, r.get('Status',''))
-                    # numeric
-                    if r.get('Frete','') != '':
-                        worksheet.write_number(row_idx, 5, float(r.get('Frete',0.0)), money_fmt)
-                    else:
-                        worksheet.write(row_idx, 5, '')
-                    if r.get('Impostos','') != '':
-                        worksheet.write_number(row_idx, 6, float(r.get('Impostos',0.0)), money_fmt)
-                    else:
-                        worksheet.write(row_idx, 6, '')
-                    if r.get('Total','') != '':
-                        worksheet.write_number(row_idx, 7, float(r.get('Total',0.0)), money_fmt)
-                    else:
-                        worksheet.write(row_idx, 7, '')
-
-                    worksheet.write(row_idx, 8, r.get('Código Produto',''))
-                    worksheet.write(row_idx, 9, r.get('Produto',''))
-                    worksheet.write(row_idx, 10, r.get('CFOP',''))
-                    if r.get('Valor Produto','') != '':
-                        worksheet.write_number(row_idx, 11, float(r.get('Valor Produto',0.0)), money_fmt)
-                    else:
-                        worksheet.write(row_idx, 11, '')
-                    if r.get('Imposto Produto','') != '':
-                        worksheet.write_number(row_idx, 12, float(r.get('Imposto Produto',0.0)), money_fmt)
-                    else:
-                        worksheet.write(row_idx, 12, '')
-
-                    # aplicar outline level: level 1 para produtos, 0 para notas
-                    if lvl == 1:
-                        worksheet.set_row(row_idx, None, None, {'level': lvl, 'hidden': True})
-                    else:
-                        # marcar a linha da nota como colapsada para que filhos fiquem escondidos
-                        worksheet.set_row(row_idx, None, None, {'level': lvl, 'collapsed': True})
-                    row_idx += 1
-
-                # adicionar soma das notas autorizadas na coluna G (índice 6) abaixo das linhas
-                total_autorizadas = 0.0
-                for nota in notas:
-                    try:
-                        if nota.get('Status') != 'Cancelado':
-                            total_autorizadas += float(nota.get('Total (R$)', nota.get('Total', 0.0) or 0.0))
-                    except:
-                        pass
-                # escrever label e valor na linha atual (row_idx)
-                worksheet.write(row_idx, 6, 'TOTAL AUTORIZADAS', header_format)
-                worksheet.write_number(row_idx, 7, total_autorizadas, money_fmt)
-
-                # ajustar larguras
-                worksheet.set_column(0, 0, 12)
-                worksheet.set_column(1, 1, 12)
-                worksheet.set_column(2, 2, 12)
-                worksheet.set_column(3, 3, 30)
-                worksheet.set_column(4, 4, 12)
-                worksheet.set_column(5, 7, 12)
-                worksheet.set_column(8, 8, 14)
-                worksheet.set_column(9, 9, 40)
-                worksheet.set_column(10, 10, 10)
-                worksheet.set_column(11, 12, 14)
-
+            from exportacao import escrever_excel
+            from integridade import verificar_lote
+            escrever_excel(notas, caminho, integridade=verificar_lote(notas))
             show_msg("Sucesso", "Excel gerado com sucesso!")
         except Exception as e:
             show_err('Erro', f'Falha ao gerar Excel: {e}')
@@ -408,7 +587,8 @@ class ValidadorFiscal:
         """Exporta os dados atualmente carregados para PDF.
 
         Se `caminho` não for fornecido, a função tentará abrir um diálogo
-        GUI. Em ambientes sem GUI, forneça `caminho` explicitamente.
+        GUI. Em ambientes sem GUI, forneça `caminho` explicitamente (um
+        caminho ou arquivo binário aberto).
         """
         if not self.dados_extracao:
             return
@@ -426,25 +606,21 @@ class ValidadorFiscal:
         if not caminho:
             return
         try:
+            if isinstance(self.dados_extracao, list):
+                # mesmo relatório do /pdf: resumo do lote e tabela de itens por nota
+                from relatorio_pdf import gerar_pdf
+                gerar_pdf(self.dados_extracao, caminho)
+                show_msg("Sucesso", "PDF gerado com sucesso!")
+                return
+            from fpdf import FPDF
             pdf = FPDF()
             pdf.add_page()
             pdf.set_font("Arial", 'B', 16)
             pdf.cell(200, 10, txt="Relatório de Validação Fiscal", ln=True, align='C')
             pdf.set_font("Arial", size=12)
             pdf.ln(10)
-            # Se for lista de notas, inserir blocos para cada uma
-            if isinstance(self.dados_extracao, list):
-                for d in self.dados_extracao:
-                    pdf.set_font("Arial", 'B', 12)
-                    pdf.cell(0, 8, txt=f"Nota: {d.get('Número','')} - Chave: {d.get('Chave','')}", ln=True)
-                    pdf.set_font("Arial", size=11)
-                    pdf.cell(0, 6, txt=f"Tipo: {d.get('Tipo','')}  Data: {d.get('Data','')}", ln=True)
-                    pdf.cell(0, 6, txt=f"Status: {d.get('Status','')}  Natureza: {d.get('Natureza','')}", ln=True)
-                    pdf.cell(0, 6, txt=f"Total: R$ {d.get('Total (R$)',0):.2f}  Frete: R$ {d.get('Frete (R$)',0):.2f}", ln=True)
-                    pdf.ln(4)
-            else:
-                for chave, valor in self.dados_extracao.items():
-                    pdf.cell(200, 10, txt=f"{chave}: {valor}", ln=True)
+            for chave, valor in self.dados_extracao.items():
+                pdf.cell(200, 10, txt=f"{chave}: {valor}", ln=True)
             pdf.output(caminho)
             show_msg("Sucesso", "PDF gerado com sucesso!")
         except Exception as e: